@@ -0,0 +1,88 @@
+"""
+アノテーションのカラム定義のキャッシュの有無で、カラム定義の計算にかかる時間を計測する。
+dbtモデルの生成では、各ステップのカラム定義をもう一度計算しなおすので、2回目以降の計算（recalculate）も計測する。
+SQLのコンパイルの時間に埋もれないよう、カラム定義の計算だけを計測する。
+キャッシュのヒット数・ミス数と、計算したカラム定義が同じになることも確かめる。
+
+    $ python -m benchmarks.bench_annotation_cache
+"""
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.converters.annotations.columns_cache import (
+    ANNOTATION_COLUMNS_CACHE_META_KEY, ANNOTATION_COLUMNS_CACHE_SIZE,
+    AnnotationColumnsCache)
+from prep2dbt.converters.factory import ConverterFactory
+from prep2dbt.core_services import calculate_columns, convert_to_graph
+from prep2dbt.models.graph import DAG
+
+
+def __recalculate(graph: DAG, repeat: int) -> list[list[str]]:
+    """dbtモデルの生成と同じく、計算済みのグラフで各ステップのカラム定義を計算しなおす"""
+    result = []
+    for _ in range(repeat):
+        for node_id in graph.nodes:
+            node = graph.get_node_by_id(node_id)
+            converter = ConverterFactory.get_converter_by_type(node.node_type)
+            result.append(converter.calculate_columns(node_id, graph).names_list())
+    return result
+
+
+def __convert(
+    flow: dict, maxsize: int, repeat: int
+) -> tuple[float, float, list[list[str]], AnnotationColumnsCache]:
+    # 実行ごとに、指定された上限のキャッシュを使う
+    cache = AnnotationColumnsCache(maxsize)
+    ctx = click.Context(click.Command("convert"))
+    ctx.meta[ANNOTATION_COLUMNS_CACHE_META_KEY] = cache
+    with ctx:
+        graph = convert_to_graph(flow)
+        start = time.perf_counter()
+        calculate_columns(graph)
+        calculated = time.perf_counter()
+        columns = __recalculate(graph, repeat)
+        recalculated = time.perf_counter()
+    return calculated - start, recalculated - calculated, columns, cache
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[200, 1000],
+    help="合成フローのステップ数（複数指定可）",
+)
+@click.option("--annotations", default=4, help="クリーニングステップあたりの処理の数")
+@click.option("--repeat", "-r", default=2, help="計算しなおす回数")
+def main(nodes: tuple[int, ...], annotations: int, repeat: int) -> None:
+    click.echo(
+        "{0:>8}{1:>8}{2:>14}{3:>16}{4:>10}{5:>10}".format(
+            "nodes", "cache", "calculate [s]", "recalculate [s]", "hits", "misses"
+        )
+    )
+    for node_count in nodes:
+        flow = build_synthetic_flow(node_count, annotation_count=annotations)
+        expected = None
+        for label, maxsize in [("off", 0), ("on", ANNOTATION_COLUMNS_CACHE_SIZE)]:
+            calculate, recalculate, columns, cache = __convert(flow, maxsize, repeat)
+            # キャッシュの有無で、同じカラム定義になることを確かめる
+            if expected is None:
+                expected = columns
+            assert columns == expected
+            click.echo(
+                "{0:>8}{1:>8}{2:>14.3f}{3:>16.3f}{4:>10}{5:>10}".format(
+                    node_count,
+                    label,
+                    calculate,
+                    recalculate,
+                    cache.hits,
+                    cache.misses,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+カラム定義の計算で記録した各アノテーションのカラム定義を、dbtモデルの生成で使いまわすかどうかで、
+dbtモデルの生成にかかる時間と、アノテーションのカラム定義を計算した回数を比較する。
+計算した回数を数えるため、アノテーションのカラム定義のキャッシュは無効にする。
+使いまわしの有無で、同じSQLが生成されることも確かめる。
+
+    $ python -m benchmarks.bench_annotation_steps
+"""
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.converters.annotations.columns_cache import (
+    ANNOTATION_COLUMNS_CACHE_META_KEY, AnnotationColumnsCache)
+from prep2dbt.core_services import (build_model_name, calculate_columns,
+                                    convert_to_graph)
+from prep2dbt.dbt_services import generate_dbt_models
+from prep2dbt.models.graph import DAG
+from prep2dbt.models.node import AnnotationColumns
+
+
+def __forget_annotation_columns(graph: DAG) -> None:
+    """以前の実装と同じく、dbtモデルの生成で各ステップのカラム定義を計算しなおすようにする"""
+    for node_id in graph.nodes:
+        node = graph.get_node_by_id(node_id)
+        graph.add_node(
+            node.copy_with_annotation_columns(AnnotationColumns.initialized())
+        )
+
+
+def __generate(flow: dict, reuse: bool) -> tuple[float, int, list[str]]:
+    ctx = click.Context(click.Command("convert"))
+    ctx.params.update(
+        {"dialect": "snowflake", "source_name": "SOURCE", "tags": "", "prefix": ""}
+    )
+    # 計算した回数を数えるため、キャッシュは無効にする
+    cache = AnnotationColumnsCache(maxsize=0)
+    ctx.meta[ANNOTATION_COLUMNS_CACHE_META_KEY] = cache
+    with ctx:
+        graph = convert_to_graph(flow)
+        calculate_columns(graph)
+        build_model_name(graph)
+        if not reuse:
+            __forget_annotation_columns(graph)
+
+        calculated = cache.misses
+        start = time.perf_counter()
+        models = generate_dbt_models(graph)
+        elapsed = time.perf_counter() - start
+        sqls = [model.sql.dbt_sql if model.sql else "" for model in models]
+        return elapsed, cache.misses - calculated, sqls
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[200, 1000],
+    help="合成フローのステップ数（複数指定可）",
+)
+@click.option("--annotations", default=4, help="クリーニングステップあたりの処理の数")
+def main(nodes: tuple[int, ...], annotations: int) -> None:
+    click.echo(
+        "{0:>8}{1:>8}{2:>13}{3:>14}".format(
+            "nodes", "reuse", "generate [s]", "calculations"
+        )
+    )
+    for node_count in nodes:
+        flow = build_synthetic_flow(node_count, annotation_count=annotations)
+        expected = None
+        for label, reuse in [("off", False), ("on", True)]:
+            elapsed, calculations, sqls = __generate(flow, reuse)
+            # 使いまわしの有無で、同じSQLになることを確かめる
+            if expected is None:
+                expected = sqls
+            assert sqls == expected
+            click.echo(
+                "{0:>8}{1:>8}{2:>13.3f}{3:>14}".format(
+                    node_count, label, elapsed, calculations
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+並列に計算するプロセス数（--jobs）ごとに、カラム定義の計算にかかる時間を計測する。
+合成フローは10ステップごとの直列なので、1世代あたりステップ数の1/10のステップが並ぶ。
+並列に計算した結果が、直列（jobs=1）と同じになることも確かめる。
+
+ワーカープロセスとのやりとり（サブグラフと結果のpickle）の分だけ、1ステップあたりの計算が
+軽いフローでは遅くなる。列数と処理の数を増やすと、1ステップあたりの計算が重いフローを計測できる。
+
+    $ python -m benchmarks.bench_calculate_columns
+    $ python -m benchmarks.bench_calculate_columns -n 1000 --fields 500 --annotations 40
+"""
+import os
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.core_services import calculate_columns, convert_to_graph
+from prep2dbt.models.graph import DAG
+
+
+def __calculate(flow: dict, jobs: int) -> tuple[float, DAG]:
+    graph = convert_to_graph(flow)
+    ctx = click.Context(click.Command("convert"))
+    ctx.params["jobs"] = jobs
+    with ctx:
+        start = time.perf_counter()
+        calculate_columns(graph)
+        return time.perf_counter() - start, graph
+
+
+def __columns(graph: DAG) -> dict[str, list[str]]:
+    return {
+        node_id: graph.get_node_by_id(node_id).model_columns.names_list()
+        for node_id in graph.nodes
+    }
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[1000, 5000],
+    help="合成フローのステップ数（複数指定可）",
+)
+@click.option("--fields", default=50, help="入力ステップの列数")
+@click.option("--annotations", default=4, help="クリーニングステップあたりの処理の数")
+@click.option(
+    "--jobs",
+    "-j",
+    multiple=True,
+    default=[2, 4],
+    help="並列に計算するプロセス数（複数指定可）",
+)
+def main(
+    nodes: tuple[int, ...], fields: int, annotations: int, jobs: tuple[int, ...]
+) -> None:
+    click.echo("cpu count: {}".format(os.cpu_count()))
+    click.echo(
+        "{0:>8}{1:>8}{2:>14}{3:>10}".format("nodes", "jobs", "calculate [s]", "speedup")
+    )
+    for node_count in nodes:
+        flow = build_synthetic_flow(node_count, fields, annotations)
+        serial, expected = __calculate(flow, 1)
+        click.echo("{0:>8}{1:>8}{2:>14.3f}{3:>10.2f}".format(node_count, 1, serial, 1))
+        for job_count in jobs:
+            elapsed, graph = __calculate(flow, job_count)
+            # 直列で計算した結果と同じになることを確かめる
+            assert __columns(graph) == __columns(expected)
+            click.echo(
+                "{0:>8}{1:>8}{2:>14.3f}{3:>10.2f}".format(
+                    node_count, job_count, elapsed, serial / elapsed
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
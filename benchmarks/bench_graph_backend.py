@@ -0,0 +1,87 @@
+"""
+フローのステップ数ごとに、グラフの実装（networkx / compact）の性能を比較する。
+構築、ノードの参照、親の参照、世代ごとのソートにかかる時間と、構築後のグラフのメモリ使用量を計測する。
+
+    $ python -m benchmarks.bench_graph_backend
+"""
+import time
+import tracemalloc
+from typing import Callable
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.converters.factory import ConverterFactory
+from prep2dbt.models.compact_graph import CompactDAG
+from prep2dbt.models.graph import DAG
+
+BACKENDS: dict[str, Callable[[], DAG]] = {
+    "networkx": DAG,
+    "compact": CompactDAG,
+}
+
+
+def __build(factory: Callable[[], DAG], node_dicts: list[dict]) -> DAG:
+    graph = factory()
+    for node_dict in node_dicts:
+        converter = ConverterFactory.get_converter_by_type(node_dict["nodeType"])
+        graph.add_subgraph(converter.generate_graph(node_dict))
+    return graph
+
+
+def __measure(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def __measure_memory(factory: Callable[[], DAG], node_dicts: list[dict]) -> float:
+    tracemalloc.start()
+    graph = __build(factory, node_dicts)
+    graph.nodes_per_generation()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 1024 / 1024
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[1000, 10000, 50000],
+    help="合成フローのステップ数（複数指定可）",
+)
+def main(nodes: tuple[int, ...]) -> None:
+    click.echo(
+        "{0:>8}{1:>10}{2:>12}{3:>12}{4:>13}{5:>17}{6:>13}".format(
+            "nodes",
+            "backend",
+            "build [ms]",
+            "node [ms]",
+            "parent [ms]",
+            "generation [ms]",
+            "memory [MB]",
+        )
+    )
+    for node_count in nodes:
+        node_dicts = list(build_synthetic_flow(node_count)["nodes"].values())
+        for name, factory in BACKENDS.items():
+            graph = __build(factory, node_dicts)
+            node_ids = list(graph.nodes)
+            # compactの親子関係（CSR）は初回の参照時に作られるため、計測前に作っておく
+            graph.nodes_per_generation()
+            build = __measure(lambda: __build(factory, node_dicts))
+            node = __measure(lambda: [graph.get_node_by_id(i) for i in node_ids])
+            parent = __measure(lambda: [graph.get_parent_ids(i) for i in node_ids])
+            generation = __measure(graph.nodes_per_generation)
+            memory = __measure_memory(factory, node_dicts)
+            click.echo(
+                "{0:>8}{1:>10}{2:>12.1f}{3:>12.1f}{4:>13.1f}{5:>17.1f}{6:>13.1f}".format(
+                    node_count, name, build, node, parent, generation, memory
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+フローのステップ数ごとに、グラフの構築にかかる時間を計測する。
+サブグラフをmergeで結合していく方法と、add_subgraphで直接追加していく方法を比較する。
+
+    $ python -m benchmarks.bench_graph_build
+"""
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.converters.factory import ConverterFactory
+from prep2dbt.core_services import convert_nodes_to_graph
+from prep2dbt.models.graph import DAG
+
+
+def __build_by_merge(node_dicts: list[dict]) -> DAG:
+    graph = DAG()
+    for node_dict in node_dicts:
+        converter = ConverterFactory.get_converter_by_type(node_dict["nodeType"])
+        graph = graph.merge(converter.generate_graph(node_dict))
+    return graph
+
+
+def __measure(func, node_dicts: list[dict]) -> float:
+    start = time.perf_counter()
+    func(node_dicts)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[500, 1000, 2000],
+    help="合成フローのステップ数（複数指定可）",
+)
+def main(nodes: tuple[int, ...]) -> None:
+    click.echo("{0:>8}{1:>14}{2:>18}".format("nodes", "merge [s]", "add_subgraph [s]"))
+    for node_count in nodes:
+        node_dicts = list(build_synthetic_flow(node_count)["nodes"].values())
+        merge = __measure(__build_by_merge, node_dicts)
+        bulk = __measure(convert_nodes_to_graph, node_dicts)
+        click.echo("{0:>8}{1:>14.3f}{2:>18.3f}".format(node_count, merge, bulk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+ステップを1つ変更したフローを、すべて変換しなおす場合と、差分変換（--incremental）する場合とで、
+変換にかかる時間を計測する。
+合成フローは10ステップごとの直列なので、変更したステップの下流は最大9ステップになる。
+差分変換の結果が、すべて変換しなおした結果と同じになることも確かめる。
+
+    $ python -m benchmarks.bench_incremental
+"""
+import copy
+import os
+import tempfile
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow, write_flow_file
+from prep2dbt.cli import convert
+
+
+def __convert(flow_file: str, work_dir: str, incremental: bool) -> float:
+    args = ["-f", flow_file, "-w", work_dir]
+    if incremental:
+        args.append("--incremental")
+    start = time.perf_counter()
+    convert.main(args, standalone_mode=False)
+    return time.perf_counter() - start
+
+
+def __read_outputs(work_dir: str) -> dict[str, str]:
+    outputs = os.path.join(work_dir, "outputs")
+    result = {}
+    for file_name in os.listdir(outputs):
+        with open(os.path.join(outputs, file_name), encoding="UTF-8") as f:
+            result[file_name] = f.read()
+    return result
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[200, 1000],
+    help="合成フローのステップ数（複数指定可）",
+)
+def main(nodes: tuple[int, ...]) -> None:
+    rows = []
+    for node_count in nodes:
+        flow = build_synthetic_flow(node_count)
+        changed = copy.deepcopy(flow)
+        # 直列の先頭のクリーニングステップを変更する
+        annotation = changed["nodes"]["node_1"]["beforeActionAnnotations"][0]
+        annotation["annotationNode"]["expression"] = "[col_0] + 2"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            flow_file = os.path.join(tmp_dir, "flow.tfl")
+            changed_file = os.path.join(tmp_dir, "changed.tfl")
+            write_flow_file(flow, flow_file)
+            write_flow_file(changed, changed_file)
+
+            full_dir = os.path.join(tmp_dir, "full")
+            full = __convert(changed_file, full_dir, False)
+
+            incremental_dir = os.path.join(tmp_dir, "incremental")
+            initial = __convert(flow_file, incremental_dir, True)
+            incremental = __convert(changed_file, incremental_dir, True)
+
+            # すべて変換しなおした結果と同じになることを確かめる
+            assert __read_outputs(incremental_dir) == __read_outputs(full_dir)
+        rows.append((node_count, full, initial, incremental))
+
+    click.echo(
+        "{0:>8}{1:>10}{2:>13}{3:>17}{4:>10}".format(
+            "nodes", "full [s]", "initial [s]", "incremental [s]", "speedup"
+        )
+    )
+    for node_count, full, initial, incremental in rows:
+        click.echo(
+            "{0:>8}{1:>10.3f}{2:>13.3f}{3:>17.3f}{4:>10.2f}".format(
+                node_count, full, initial, incremental, full / incremental
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+jsonのbackendごとに、フロー定義の読み込み・書き出しにかかる時間を計測する。
+
+    $ python -m benchmarks.bench_json_backend
+    $ python -m benchmarks.bench_json_backend /path/to/big_flow.tfl
+"""
+import io
+import json
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow, read_flow_bytes
+from prep2dbt.json_utils import (FlowNodeReader, JsonBackendRegistry,
+                                 StdlibJsonBackend)
+
+
+def __best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def __bench(label: str, data: bytes, repeat: int) -> None:
+    size_mb = len(data) / 1024 / 1024
+    nodes = list(json.loads(data)["nodes"].values())
+    click.echo("{0} ({1:.1f} MB, {2} nodes)".format(label, size_mb, len(nodes)))
+    click.echo("  {0:<24}{1:>14}{2:>14}".format("backend", "load ms/MB", "dump ms/MB"))
+
+    for backend in JsonBackendRegistry.backends.values():
+        if not backend.is_available():
+            click.echo("  {0:<24}{1:>14}".format(backend.name, "not installed"))
+            continue
+        load = __best_of(lambda: backend.loads(data), repeat)
+        # YmlMixinと同じく、ノードごとにdescription用のjsonを作成する
+        dump = __best_of(
+            lambda: [
+                backend.dumps(node, indent=4, ensure_ascii=False) for node in nodes
+            ],
+            repeat,
+        )
+        click.echo(
+            "  {0:<24}{1:>14.1f}{2:>14.1f}".format(
+                backend.name, load * 1000 / size_mb, dump * 1000 / size_mb
+            )
+        )
+
+    stream = __best_of(
+        lambda: list(FlowNodeReader(io.BytesIO(data)).iter_nodes()), repeat
+    )
+    click.echo(
+        "  {0:<24}{1:>14.1f}{2:>14}".format(
+            "stream (FlowNodeReader)", stream * 1000 / size_mb, "-"
+        )
+    )
+
+
+@click.command()
+@click.argument("flow_files", nargs=-1, type=click.Path(exists=True))
+@click.option("--nodes", default=2000, help="合成フローのステップ数")
+@click.option("--repeat", default=3, help="計測の繰り返し回数（最速値を採用）")
+def main(flow_files: tuple[str, ...], nodes: int, repeat: int) -> None:
+    if flow_files:
+        for flow_file in flow_files:
+            __bench(flow_file, read_flow_bytes(flow_file), repeat)
+    else:
+        flow = build_synthetic_flow(nodes)
+        data = StdlibJsonBackend.dumps(flow, indent=2, ensure_ascii=False).encode(
+            "UTF-8"
+        )
+        __bench("synthetic", data, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+カラム数ごとに、ModelColumnsの各操作にかかる時間と、結果が保持しているメモリブロック数を計測する。
+以前のsetによる実装と、現在の差分を共有する実装を比較する。
+
+    $ python -m benchmarks.bench_model_columns
+"""
+from __future__ import annotations
+
+import time
+import tracemalloc
+from typing import Callable
+
+import click
+
+from prep2dbt.models.node import ModelColumn, ModelColumns
+
+
+class LegacyModelColumns:
+    """setによる以前の実装（比較に必要な操作のみ）"""
+
+    def __init__(self, value: set[ModelColumn]) -> None:
+        self.value = value
+
+    def names_list(self) -> list[str]:
+        return [column.name for column in self.value]
+
+    def add(self, col: ModelColumn) -> LegacyModelColumns:
+        if col.name in self.names_list():
+            new_cols = self.value
+            for new_col in new_cols:
+                if new_col.name == col.name:
+                    remove_target = new_col
+            new_cols.remove(remove_target)
+            new_cols.add(col)
+            return LegacyModelColumns(new_cols)
+        return LegacyModelColumns(self.value | set([col]))
+
+    def merge(self, other: LegacyModelColumns) -> LegacyModelColumns:
+        new = self
+        for new_col in other.value:
+            new = new.add(new_col)
+        return new
+
+    def get_column_by_name(self, name: str) -> ModelColumn:
+        for column in self.value:
+            if name == column.name:
+                return column
+        raise KeyError(name)
+
+    def remove_column_by_name(self, name: str) -> LegacyModelColumns:
+        new_cols = self.value
+        new_cols.remove(self.get_column_by_name(name))
+        return LegacyModelColumns(new_cols)
+
+    def flush_values(self) -> LegacyModelColumns:
+        return LegacyModelColumns(
+            set([ModelColumn(col.name, col.data_type) for col in self.value])
+        )
+
+
+def __columns(count: int, prefix: str = "col") -> list[ModelColumn]:
+    return [
+        ModelColumn("{0}_{1}".format(prefix, idx), "string", "'{0}'".format(idx))
+        for idx in range(count)
+    ]
+
+
+def __operations(
+    columns: int, repeat: int
+) -> list[tuple[str, Callable[[], object], Callable[[], object]]]:
+    """(操作名, 以前の実装, 現在の実装)のリスト"""
+    cols = __columns(columns)
+    others = __columns(columns // 2, "other")
+    names = [col.name for col in cols]
+    targets = [names[(idx * 7919) % columns] for idx in range(repeat)]
+
+    legacy_base = LegacyModelColumns(set(cols))
+    current_base = ModelColumns.calculated(cols)
+
+    def legacy() -> LegacyModelColumns:
+        # 以前の実装は置き換えと削除で元のsetを書き換えるため、都度コピーする
+        return LegacyModelColumns(set(legacy_base.value))
+
+    legacy_other = LegacyModelColumns(set(others))
+    current_other = ModelColumns.calculated(others)
+
+    return [
+        (
+            "add",
+            lambda: [legacy_base.add(col) for col in others[:repeat]],
+            lambda: [current_base.add(col) for col in others[:repeat]],
+        ),
+        (
+            "add(replace)",
+            lambda: [legacy().add(ModelColumn(name, "int")) for name in targets],
+            lambda: [current_base.add(ModelColumn(name, "int")) for name in targets],
+        ),
+        (
+            "get",
+            lambda: [legacy_base.get_column_by_name(name) for name in targets],
+            lambda: [current_base.get_column_by_name(name) for name in targets],
+        ),
+        (
+            "remove",
+            lambda: [legacy().remove_column_by_name(name) for name in targets],
+            lambda: [current_base.remove_column_by_name(name) for name in targets],
+        ),
+        (
+            "names_list",
+            lambda: [legacy_base.names_list() for _ in range(repeat)],
+            lambda: [current_base.names_list() for _ in range(repeat)],
+        ),
+        (
+            "merge",
+            lambda: legacy().merge(legacy_other),
+            lambda: current_base.merge(current_other),
+        ),
+        (
+            "flush_values",
+            lambda: [legacy_base.flush_values() for _ in range(repeat)],
+            lambda: [current_base.flush_values() for _ in range(repeat)],
+        ),
+        (
+            "annotations",
+            lambda: __apply_annotations(legacy_base, others[:repeat]),
+            lambda: __apply_annotations(current_base, others[:repeat]),
+        ),
+    ]
+
+
+def __apply_annotations(cols, new_cols: list[ModelColumn]) -> list:
+    """アノテーションごとにflush_valuesしてから1列追加する処理（AnnotationMixin相当）を繰り返す"""
+    results = []
+    for col in new_cols:
+        cols = cols.flush_values().add(col)
+        results.append(cols)
+    return results
+
+
+def __measure(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def __count_allocations(func: Callable[[], object]) -> tuple[int, float]:
+    """結果が保持しているメモリ（確保したまま解放されていないもの）のブロック数とKiB"""
+    tracemalloc.start()
+    result = func()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+    stats = snapshot.statistics("filename")
+    return sum(stat.count for stat in stats), sum(stat.size for stat in stats) / 1024
+
+
+@click.command()
+@click.option(
+    "--columns",
+    "-c",
+    multiple=True,
+    default=[100, 1500],
+    help="カラム数（複数指定可）",
+)
+@click.option("--repeat", "-r", default=50, help="各操作の繰り返し回数")
+def main(columns: tuple[int, ...], repeat: int) -> None:
+    click.echo(
+        "{0:>8}{1:>14}{2:>12}{3:>13}{4:>10}{5:>10}{6:>12}{7:>12}".format(
+            "columns",
+            "operation",
+            "legacy [s]",
+            "current [s]",
+            "legacy",
+            "current",
+            "legacy",
+            "current",
+        )
+    )
+    click.echo("{0:>59}{1:>24}".format("[blocks]", "[KiB]"))
+    for column_count in columns:
+        for name, legacy, current in __operations(column_count, repeat):
+            legacy_blocks, legacy_kib = __count_allocations(legacy)
+            current_blocks, current_kib = __count_allocations(current)
+            click.echo(
+                "{0:>8}{1:>14}{2:>12.4f}{3:>13.4f}{4:>10}{5:>10}"
+                "{6:>12.1f}{7:>12.1f}".format(
+                    column_count,
+                    name,
+                    __measure(legacy),
+                    __measure(current),
+                    legacy_blocks,
+                    current_blocks,
+                    legacy_kib,
+                    current_kib,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+フローのステップ数ごとに、モデル名の採番にかかる時間を計測する。
+以前のpandasによる実装（pandasがインストールされている場合のみ）と、現在の実装を比較する。
+
+    $ python -m benchmarks.bench_model_name
+"""
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.core_services import build_model_name, convert_nodes_to_graph
+from prep2dbt.models.graph import DAG
+from prep2dbt.models.node import ModelName
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def __build_model_name_by_pandas(graph: DAG) -> None:
+    """pandasによる以前の実装"""
+    df = pd.DataFrame()
+    for node_id in graph.nodes:
+        node = graph.get_node_by_id(node_id)
+        df = pd.concat([df, pd.DataFrame({"name": [node.name], "id": [node_id]})])
+
+    df["unique_id"] = df.groupby(["name"])["id"].transform(
+        lambda x: pd.CategoricalIndex(x).codes + 1
+    )
+    df["model_name"] = (
+        df["name"].apply(lambda x: str(x).replace(" ", "").replace("/", ""))
+        + "_"
+        + df["unique_id"].apply(lambda x: str(x))
+    )
+
+    for node_id in graph.nodes:
+        model_name = df[df["id"] == node_id].iloc[0]["model_name"]
+        node = graph.get_node_by_id(node_id)
+        graph.add_node(node.copy_with_model_name(ModelName.calculated(model_name)))
+
+
+def __measure(func, graph: DAG) -> float:
+    start = time.perf_counter()
+    func(graph)
+    return time.perf_counter() - start
+
+
+def __model_names(graph: DAG) -> list[str]:
+    return [graph.get_node_by_id(node_id).model_name.value for node_id in graph.nodes]
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[1000, 10000],
+    help="合成フローのステップ数（複数指定可）",
+)
+@click.pass_context
+def main(ctx, nodes: tuple[int, ...]) -> None:
+    ctx.params["prefix"] = ""
+    click.echo("{0:>8}{1:>12}{2:>14}".format("nodes", "pandas [s]", "current [s]"))
+    for node_count in nodes:
+        node_dicts = build_synthetic_flow(node_count)["nodes"].values()
+        graph = convert_nodes_to_graph(node_dicts)
+        current = __measure(build_model_name, graph)
+        expected = __model_names(graph)
+
+        if pd is None:
+            click.echo("{0:>8}{1:>12}{2:>14.3f}".format(node_count, "-", current))
+            continue
+
+        legacy = __measure(__build_model_name_by_pandas, graph)
+        # 同じモデル名になることを確かめる
+        assert __model_names(graph) == expected
+        click.echo("{0:>8}{1:>12.3f}{2:>14.3f}".format(node_count, legacy, current))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+ステップ単位の変換結果のキャッシュ（--cache）を使わない場合と、使う場合（空のキャッシュ、キャッシュ済み）とで、
+変換にかかる時間を計測する。
+キャッシュ済みの変換は、別の作業ディレクトリに出力して、キャッシュが作業ディレクトリによらず使いまわせることも確かめる。
+キャッシュを使った結果が、使わない結果と同じになることも確かめる。
+
+    $ python -m benchmarks.bench_node_cache
+"""
+import os
+import tempfile
+import time
+
+import click
+
+from benchmarks.flows import build_synthetic_flow, write_flow_file
+from prep2dbt.cli import convert
+
+
+def __convert(flow_file: str, work_dir: str, cache_dir: str | None) -> float:
+    args = ["-f", flow_file, "-w", work_dir]
+    if cache_dir is not None:
+        args += ["--cache", "--cache-dir", cache_dir]
+    start = time.perf_counter()
+    convert.main(args, standalone_mode=False)
+    return time.perf_counter() - start
+
+
+def __read_outputs(work_dir: str) -> dict[str, str]:
+    outputs = os.path.join(work_dir, "outputs")
+    result = {}
+    for file_name in os.listdir(outputs):
+        with open(os.path.join(outputs, file_name), encoding="UTF-8") as f:
+            result[file_name] = f.read()
+    return result
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[200, 1000],
+    help="合成フローのステップ数（複数指定可）",
+)
+def main(nodes: tuple[int, ...]) -> None:
+    rows = []
+    for node_count in nodes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            flow_file = os.path.join(tmp_dir, "flow.tfl")
+            cache_dir = os.path.join(tmp_dir, "cache")
+            write_flow_file(build_synthetic_flow(node_count), flow_file)
+
+            plain_dir = os.path.join(tmp_dir, "plain")
+            plain = __convert(flow_file, plain_dir, None)
+            cold_dir = os.path.join(tmp_dir, "cold")
+            cold = __convert(flow_file, cold_dir, cache_dir)
+            warm_dir = os.path.join(tmp_dir, "warm")
+            warm = __convert(flow_file, warm_dir, cache_dir)
+
+            # キャッシュを使わない結果と同じになることを確かめる
+            assert __read_outputs(cold_dir) == __read_outputs(plain_dir)
+            assert __read_outputs(warm_dir) == __read_outputs(plain_dir)
+        rows.append((node_count, plain, cold, warm))
+
+    click.echo(
+        "{0:>8}{1:>14}{2:>11}{3:>11}{4:>10}".format(
+            "nodes", "no cache [s]", "cold [s]", "warm [s]", "speedup"
+        )
+    )
+    for node_count, plain, cold, warm in rows:
+        click.echo(
+            "{0:>8}{1:>14.3f}{2:>11.3f}{3:>11.3f}{4:>10.2f}".format(
+                node_count, plain, cold, warm, plain / warm
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+ノードの定義の持ち方ごとに、グラフの構築とカラムの計算にかかる時間と、保持し続けるメモリ量を計測する。
+全体をデコードした辞書（dict）と、要素ごとに遅延デコードするLazyRawDict（lazy）を比較する。
+
+    $ python -m benchmarks.bench_raw_dict
+"""
+import gc
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+import click
+
+from benchmarks.flows import build_synthetic_flow, flow_to_stream
+from prep2dbt.core_services import calculate_columns, convert_nodes_to_graph
+from prep2dbt.json_utils import FlowNodeReader
+from prep2dbt.models.node import NodeDict
+
+READERS: dict[str, Callable[[FlowNodeReader], Iterator[NodeDict]]] = {
+    "dict": FlowNodeReader.iter_nodes,
+    "lazy": FlowNodeReader.iter_lazy_nodes,
+}
+
+
+@click.command()
+@click.option(
+    "--nodes",
+    "-n",
+    multiple=True,
+    default=[500, 1000],
+    help="合成フローのステップ数（複数指定可）",
+)
+@click.option("--fields", default=200, help="入力ステップ1つあたりの列数")
+def main(nodes: tuple[int, ...], fields: int) -> None:
+    click.echo(
+        "{0:>8}{1:>8}{2:>12}{3:>14}{4:>14}".format(
+            "nodes", "raw", "time [s]", "graph [MB]", "columns [MB]"
+        )
+    )
+    for node_count in nodes:
+        flow = build_synthetic_flow(node_count, field_count=fields)
+        for name, read in READERS.items():
+            stream = flow_to_stream(flow)
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+
+            graph = convert_nodes_to_graph(read(FlowNodeReader(stream)))
+            built, _ = tracemalloc.get_traced_memory()
+            calculate_columns(graph)
+            calculated, _ = tracemalloc.get_traced_memory()
+
+            elapsed = time.perf_counter() - start
+            tracemalloc.stop()
+            del graph
+            click.echo(
+                "{0:>8}{1:>8}{2:>12.2f}{3:>14.1f}{4:>14.1f}".format(
+                    node_count,
+                    name,
+                    elapsed,
+                    built / 1024 / 1024,
+                    calculated / 1024 / 1024,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+ベンチマーク用の、合成フローを作成する共通処理
+"""
+import io
+import json
+import zipfile
+from typing import Any
+
+
+def build_synthetic_flow(
+    node_count: int, field_count: int = 50, annotation_count: int = 4
+) -> dict:
+    """
+    合成フローの定義（flowエントリの中身）を作成する。
+
+    10ステップごとに入力ステップ（LoadSql）を置き、それ以外はひとつ前のステップを親にもつ
+    クリーニングステップ（SuperTransform）とする。ステップ名は50種類を使いまわすので、
+    モデル名の連番も発生する。
+
+    Args:
+        node_count (int): ステップ数
+        field_count (int): 入力ステップの列数
+        annotation_count (int): クリーニングステップあたりの処理の数
+    """
+    nodes = {}
+    for i in range(node_count):
+        node_id = "node_{}".format(i)
+        next_nodes = []
+        if i + 1 < node_count and (i + 1) % 10 != 0:
+            next_nodes.append(
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "node_{}".format(i + 1),
+                    "nextNamespace": "Default",
+                }
+            )
+
+        if i % 10 == 0:
+            nodes[node_id] = {
+                "nodeType": ".v1.LoadSql",
+                "name": "入力 {}".format(i % 50),
+                "id": node_id,
+                "baseType": "input",
+                "nextNodes": next_nodes,
+                "serialize": False,
+                "description": None,
+                "connectionAttributes": {
+                    "schema": "PUBLIC",
+                    "dbname": "SAMPLE_DB",
+                    "warehouse": "SAMPLE_WH",
+                },
+                "fields": [
+                    {
+                        "name": "col_{}".format(j),
+                        "type": "string",
+                        "collation": None,
+                        "caption": "",
+                        "ordinal": j + 1,
+                        "isGenerated": False,
+                    }
+                    for j in range(field_count)
+                ],
+                "relation": {
+                    "type": "table",
+                    "table": "[SAMPLE_DB].[PUBLIC].[TABLE_{}]".format(i),
+                },
+            }
+        else:
+            annotations = []
+            for j in range(annotation_count):
+                if j % 2 == 0:
+                    annotation_node: dict[str, Any] = {
+                        "nodeType": ".v1.AddColumn",
+                        "columnName": "calc_{}_{}".format(i, j),
+                        "expression": "[col_{}] + 1".format(j % field_count),
+                    }
+                else:
+                    annotation_node = {
+                        "nodeType": ".v1.RenameColumn",
+                        "columnName": "calc_{}_{}".format(i, j - 1),
+                        "rename": "renamed_{}_{}".format(i, j - 1),
+                    }
+                annotation_node.update(
+                    {
+                        "name": "処理 {}".format(j),
+                        "id": "annotation_{}_{}".format(i, j),
+                        "baseType": "transform",
+                        "nextNodes": [],
+                        "serialize": False,
+                        "description": None,
+                    }
+                )
+                annotations.append(
+                    {"namespace": "Default", "annotationNode": annotation_node}
+                )
+            nodes[node_id] = {
+                "nodeType": ".v2018_2_3.SuperTransform",
+                "name": "クリーニング {}".format(i % 50),
+                "id": node_id,
+                "baseType": "superNode",
+                "nextNodes": next_nodes,
+                "serialize": False,
+                "description": None,
+                "beforeActionAnnotations": annotations,
+                "afterActionAnnotations": [],
+            }
+
+    return {
+        "parameters": {"parameters": {}},
+        "initialNodes": [
+            "node_{}".format(i) for i in range(node_count) if i % 10 == 0
+        ],
+        "nodes": nodes,
+        "connections": {},
+        "majorVersion": 1,
+        "minorVersion": 8,
+    }
+
+
+def read_flow_bytes(flow_file: str) -> bytes:
+    """フローファイル（.tfl/.tflx）から、flowエントリの中身を読み込む"""
+    with zipfile.ZipFile(flow_file) as archive:
+        return archive.read("flow")
+
+
+def write_flow_file(flow: dict, path: str) -> None:
+    """フローの定義を、フローファイル（.tfl）として書き出す"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("flow", json.dumps(flow, indent=2, ensure_ascii=False))
+
+
+def flow_to_stream(flow: dict) -> io.BytesIO:
+    """フローの定義を、flowエントリと同じ形式のバイトストリームにする"""
+    return io.BytesIO(json.dumps(flow, indent=2, ensure_ascii=False).encode("UTF-8"))
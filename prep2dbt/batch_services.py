@@ -0,0 +1,222 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+import click
+
+from prep2dbt.core_services import (before_execute_action, build_model_name,
+                                    calculate_columns, convert_nodes_to_graph)
+from prep2dbt.dbt_services import (count_results, generate_dbt_models,
+                                   output_dbt_files)
+from prep2dbt.exceptions import (BatchConvertFailedException,
+                                 IllegAlargumentException)
+from prep2dbt.incremental_services import convert_incrementally
+from prep2dbt.models.batch_result import BatchResult, FlowResult
+from prep2dbt.pruning_services import (output_pruning_result,
+                                       prune_unused_columns)
+from prep2dbt.utils import center, flex
+
+# フローファイルの拡張子
+FLOW_FILE_EXTENSIONS = (".tfl", ".tflx")
+# 一括変換の結果をまとめたファイル名
+SUMMARY_FILE_NAME = "summary.csv"
+
+
+def find_flow_files(flows: str) -> list[str]:
+    """
+    変換対象のフローファイルを探します。
+    ディレクトリが指定されたら配下のフローファイルを再帰的に、それ以外はglobのパターンとして探します。
+
+    Raises:
+        IllegAlargumentException: フローファイルが1件も見つからない場合
+    """
+    if os.path.isdir(flows):
+        pattern = os.path.join(glob.escape(flows), "**", "*")
+    else:
+        pattern = flows
+
+    flow_files = sorted(
+        path
+        for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path) and path.endswith(FLOW_FILE_EXTENSIONS)
+    )
+    if len(flow_files) == 0:
+        raise IllegAlargumentException("{}にフローファイルが見つかりません。".format(flows))
+    return flow_files
+
+
+def assign_work_dirs(flow_files: list[str], work_dir: str) -> dict[str, str]:
+    """
+    フローファイルごとに、出力先のサブディレクトリを決めます。
+    サブディレクトリは、フローファイルの共通の親ディレクトリからの相対パス（拡張子なし）です。
+    同じ名前になる場合は、後ろに連番をつけます。
+    """
+    base_dir = os.path.commonpath(
+        [os.path.dirname(os.path.abspath(path)) for path in flow_files]
+    )
+
+    result = {}
+    used: set[str] = set()
+    for flow_file in flow_files:
+        relative = os.path.relpath(os.path.abspath(flow_file), base_dir)
+        name = os.path.splitext(relative)[0]
+        unique_name = name
+        seq = 2
+        while unique_name in used:
+            unique_name = "{}_{}".format(name, seq)
+            seq += 1
+        used.add(unique_name)
+        result[flow_file] = os.path.join(work_dir, unique_name)
+    return result
+
+
+def convert_flow(params: dict) -> FlowResult:
+    """
+    フローファイルを1つ変換します。ワーカープロセスで実行されます。
+    convertコマンドと同じ処理を、与えられたオプションのクリックコンテキストの中で行います。
+    jobsが2以上なら、このワーカープロセスの中で、さらにカラム定義の計算を並列に実行します。
+    incrementalが有効なら、フローファイルごとの作業ディレクトリに保存した前回の変換結果を使いまわします。
+    """
+    flow_file = params["flow_file"]
+    work_dir = params["work_dir"]
+    start = time.perf_counter()
+
+    ctx = click.Context(click.Command("convert"))
+    ctx.params = params
+    try:
+        with ctx:
+            node_dicts = before_execute_action()
+            graph = convert_nodes_to_graph(node_dicts)
+            build_model_name(graph)
+            if params.get("incremental", False):
+                # 変換しなおしたステップのdbtモデルは、書き出し済み
+                convert_incrementally(graph)
+            else:
+                calculate_columns(graph)
+                if params.get("prune_columns", False):
+                    output_pruning_result(prune_unused_columns(graph))
+                models = generate_dbt_models(graph)
+                output_dbt_files(models)
+            passed, warning, failed = count_results(graph)
+    except click.ClickException as e:
+        return FlowResult(
+            flow_file,
+            work_dir,
+            elapsed=time.perf_counter() - start,
+            error=e.format_message(),
+        )
+    except Exception as e:
+        # 1つのフローの失敗で、一括変換全体を止めない
+        return FlowResult(
+            flow_file,
+            work_dir,
+            elapsed=time.perf_counter() - start,
+            error="{}: {}".format(type(e).__name__, e),
+        )
+
+    return FlowResult(
+        flow_file, work_dir, passed, warning, failed, time.perf_counter() - start
+    )
+
+
+def __iter_results(params_list: list[dict], workers: int) -> Iterator[FlowResult]:
+    """変換が終わった順に、結果を返す。ワーカーが1つなら、プロセスを起動せずに順番に変換する。"""
+    if workers <= 1:
+        for params in params_list:
+            yield convert_flow(params)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert_flow, params) for params in params_list]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def convert_flows(flow_files: list[str], workers: int) -> BatchResult:
+    """
+    フローファイルをまとめて変換します。
+    フローファイルごとに、work_dir配下のサブディレクトリへ出力します。
+    変換オプションは、実行中のコマンドのオプションを引き継ぎます。
+
+    Returns:
+        BatchResult: フローファイルの順に並べた変換結果
+    """
+    c = click.get_current_context()
+    work_dirs = assign_work_dirs(flow_files, c.params["work_dir"])
+    common_params = {
+        key: value
+        for key, value in c.params.items()
+        if key not in ("flows", "work_dir", "workers")
+    }
+    params_list = [
+        dict(common_params, flow_file=flow_file, work_dir=work_dirs[flow_file])
+        for flow_file in flow_files
+    ]
+
+    results = {}
+    for idx, result in enumerate(__iter_results(params_list, workers), start=1):
+        status = "[完了]" if result.is_succeeded else "[失敗]"
+        click.echo(
+            "({}/{}) {} {}".format(idx, len(flow_files), result.flow_file, status)
+        )
+        results[result.flow_file] = result
+
+    return BatchResult([results[flow_file] for flow_file in flow_files])
+
+
+def output_batch_result(result: BatchResult) -> None:
+    """
+    一括変換の結果を集計して出力します。
+    いずれかのフローの変換に失敗した場合は、集計を出力したあとでエラーにします。
+
+    Raises:
+        BatchConvertFailedException: 変換に失敗したフローがある場合
+    """
+    import shutil
+
+    c = click.get_current_context()
+    work_dir = c.params["work_dir"]
+    width, _ = shutil.get_terminal_size()
+
+    click.echo(center(" 処理したフロー ", "=", width))
+    for flow in result.flows:
+        if not flow.is_succeeded:
+            click.echo(click.style(flex(flow.flow_file, "[失敗]", " ", width), fg="red"))
+            click.echo(click.style("  " + flow.error, fg="red"))
+            continue
+
+        summary = "[{0} 成功, {1} 警告, {2} 失敗]".format(
+            flow.passed, flow.warning, flow.failed
+        )
+        color = "red" if flow.failed > 0 else "yellow" if flow.warning > 0 else "green"
+        click.echo(click.style(flex(flow.flow_file, summary, " ", width), fg=color))
+
+    passed, warning, failed = result.total()
+    end_str = center(
+        " {0} フロー, {1} 成功, {2} 警告, {3} 失敗 ".format(
+            len(result.flows), passed, warning, failed
+        ),
+        "=",
+        width,
+    )
+    if result.error_count > 0 or failed > 0:
+        click.echo(click.style(end_str, fg="red"))
+    elif warning > 0:
+        click.echo(click.style(end_str, fg="yellow"))
+    else:
+        click.echo(click.style(end_str, fg="green"))
+
+    with click.open_file(
+        os.path.join(work_dir, SUMMARY_FILE_NAME), mode="w", encoding="UTF-8"
+    ) as f:
+        click.echo(result.to_csv(), file=f)
+
+    if result.error_count > 0:
+        raise BatchConvertFailedException(
+            "{}件のフローの変換に失敗しました。詳細は{}を確認してください。".format(
+                result.error_count, SUMMARY_FILE_NAME
+            )
+        )
+    click.echo("🎉{}件のフローのdbtモデルへの変換が完了しました。".format(len(result.flows)))
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import click
+
+from prep2dbt.__version__ import __version__
+from prep2dbt.converters.annotations.filter_pushdown import (
+    FILTER_PUSHDOWN_META_KEY, get_filter_pushdown_stats)
+from prep2dbt.converters.annotations.projection_fusion import (
+    PROJECTION_FUSION_META_KEY, get_projection_fusion_stats)
+from prep2dbt.converters.mixins.split_model_mixin import (
+    MODEL_SPLIT_META_KEY, get_model_split_stats)
+from prep2dbt.models.cache_stats import CacheStats
+from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql, Yml
+from prep2dbt.models.graph import DAG
+from prep2dbt.protocols.converter import Converter
+
+# 出力に影響する実行時オプション
+OUTPUT_OPTION_NAMES = (
+    "dialect",
+    "source_name",
+    "tags",
+    "prefix",
+    "prune_columns",
+    "push_down_filters",
+    "fuse_projections",
+    "max_cte_depth",
+    "split_materialized",
+)
+# キャッシュのエントリの形式のバージョン。形式を変えたら上げる
+NODE_CACHE_VERSION = 3
+# キャッシュのディレクトリの中で、エントリを置くディレクトリ名
+NODE_CACHE_ENTRIES_DIR_NAME = "nodes"
+NODE_CACHE_ENTRY_SUFFIX = ".json"
+# ステップの変換で数える最適化の件数。click.Context.metaのキー -> 件数を取得する関数
+NODE_STATS_GETTERS = {
+    FILTER_PUSHDOWN_META_KEY: get_filter_pushdown_stats,
+    PROJECTION_FUSION_META_KEY: get_projection_fusion_stats,
+    MODEL_SPLIT_META_KEY: get_model_split_stats,
+}
+# キャッシュのディレクトリのデフォルト
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "prep2dbt",
+)
+# キャッシュのサイズの上限のデフォルト（MB）
+DEFAULT_CACHE_MAX_SIZE = 1024
+
+
+def output_options() -> dict[str, str]:
+    """出力に影響する実行時オプションを取得する"""
+    ctx = click.get_current_context()
+    return {name: ctx.params.get(name, "") for name in OUTPUT_OPTION_NAMES}
+
+
+def collect_node_stats() -> dict[str, dict[str, int]]:
+    """実行中の最適化の件数を、metaのキー -> 件数の名前 -> 件数の辞書にする"""
+    return {key: dict(vars(getter())) for key, getter in NODE_STATS_GETTERS.items()}
+
+
+def subtract_node_stats(
+    after: dict[str, dict[str, int]], before: dict[str, dict[str, int]]
+) -> dict[str, dict[str, int]]:
+    """collect_node_statsで取得した件数の差から、ステップ1つ分の件数を計算する"""
+    return {
+        key: {name: count - before[key].get(name, 0) for name, count in counts.items()}
+        for key, counts in after.items()
+    }
+
+
+def add_node_stats(stats: dict[str, dict[str, int]]) -> None:
+    """変換せずに使いまわしたステップの件数を、実行中の最適化の件数に足す"""
+    for key, counts in stats.items():
+        getter = NODE_STATS_GETTERS.get(key)
+        if getter is None:
+            continue
+        target = getter()
+        for name, count in counts.items():
+            if hasattr(target, name):
+                setattr(target, name, getattr(target, name) + count)
+
+
+def dump_dbt_models(models: DbtModels) -> list[dict]:
+    """
+    DbtModels.renderedで変換したdbtモデルを、JSONにできる辞書のリストにする。
+    SQLとYAMLのテキストだけを保存し、pickleのように任意のオブジェクトを復元しない。
+    """
+    return [
+        {
+            "model_name": model.model_name,
+            "resource_type": model.resource_type,
+            "sql": model.sql.dbt_sql if model.sql is not None else None,
+            "yml_raw": model.yml.raw,
+            "yml_text": str(model.yml),
+        }
+        for model in models
+    ]
+
+
+def load_dbt_models(data: list[dict]) -> DbtModels:
+    """dump_dbt_modelsでつくった辞書のリストから、dbtモデルを復元する"""
+    return DbtModels(
+        [
+            DbtModel(
+                Sql(None, item["sql"]) if item["sql"] is not None else None,
+                Yml(item["yml_raw"], item["yml_text"]),
+                item["model_name"],
+                item["resource_type"],
+            )
+            for item in data
+        ]
+    )
+
+
+class NodeCache:
+    """
+    ステップ単位の変換結果（コンパイル済みのSQLとYAML）の、ディスク上のキャッシュ
+
+    キーは、変換仕様のクラス、ツールのバージョン、出力に影響する実行時オプション、
+    ステップの定義のハッシュ値、ステップと親のカラム定義の内容のハッシュ値（content_digest）から計算する。
+    カラム定義の作られ方で変わるfingerprintは使わないので、並列に計算したカラム定義でも同じキーになる。
+    内容から計算したキーで引くので、別のフローや別の作業ディレクトリの変換でも、同じステップなら結果を使いまわせる。
+
+    - エントリは、SQLとYAMLのテキストと、変換で数えた最適化の件数を、1件ずつJSONファイルに保存する。
+      キャッシュのディレクトリは共有されることがあるので、読み込むときに任意のコードが動くpickleは使わない。
+    - 複数のプロセスから同時に使われても壊れないよう、書き込みはアトミックに行う。
+    - 使うたびにファイルの更新日時を更新し、上限を超えたら、最も長く使われていないエントリから消す（LRU）。
+    """
+
+    def __init__(self, cache_dir: str, max_size: int, options: dict[str, str]) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size  # バイト数
+        self.hits = 0
+        self.misses = 0
+        self._options_key = json.dumps(
+            [NODE_CACHE_VERSION, __version__, options], sort_keys=True
+        )
+
+    def key(self, converter: Converter, node_id: str, graph: DAG) -> str:
+        """ステップの変換結果に影響するものから、キーを計算する"""
+        node = graph.get_node_by_id(node_id)
+        namespaces = {
+            parent_id: namespace
+            for namespace, parent_id in graph.get_parent_ids_by_namespace(
+                node_id
+            ).items()
+        }
+        # 親を参照する順番もSQLに影響するので、並べ替えない
+        parents = []
+        for parent_id in graph.get_parent_ids(node_id):
+            parent = graph.get_node_by_id(parent_id)
+            parents.append(
+                [
+                    namespaces.get(parent_id, ""),
+                    parent.model_name.value,
+                    parent.model_columns.content_digest,
+                ]
+            )
+        content = json.dumps(
+            [
+                self._options_key,
+                str(converter),
+                node.digest(),
+                node.is_unknown,
+                node.model_columns.content_digest,
+                parents,
+            ]
+        )
+        return hashlib.blake2b(content.encode("UTF-8"), digest_size=20).hexdigest()
+
+    def __entry_path(self, key: str) -> str:
+        return os.path.join(
+            self.cache_dir,
+            NODE_CACHE_ENTRIES_DIR_NAME,
+            key[:2],
+            key + NODE_CACHE_ENTRY_SUFFIX,
+        )
+
+    def get(self, key: str) -> tuple[DbtModels, dict[str, dict[str, int]]] | None:
+        """キャッシュから、変換結果と最適化の件数を取得する。なければNone"""
+        path = self.__entry_path(key)
+        try:
+            with open(path, encoding="UTF-8") as f:
+                entry = json.load(f)
+            models = load_dbt_models(entry["models"])
+            stats = entry["stats"]
+            # 最終利用日時を更新する
+            os.utime(path)
+        except Exception:
+            # ないエントリ、壊れたエントリ、他のプロセスが消したエントリは、なかったことにする
+            return None
+        if not isinstance(stats, dict):
+            return None
+        return models, stats
+
+    def put(
+        self, key: str, models: DbtModels, stats: dict[str, dict[str, int]]
+    ) -> None:
+        """変換結果と最適化の件数をキャッシュに保存する"""
+        path = self.__entry_path(key)
+        try:
+            content = json.dumps(
+                {"models": dump_dbt_models(models), "stats": stats}, ensure_ascii=False
+            )
+        except TypeError as e:
+            # JSONにできない値がYAMLに含まれていれば、キャッシュしない
+            click.echo("キャッシュに保存できませんでした。{}".format(e))
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                mode="w", encoding="UTF-8", dir=os.path.dirname(path), delete=False
+            ) as f:
+                f.write(content)
+            os.replace(f.name, path)
+        except OSError as e:
+            # キャッシュに保存できなくても、変換は続ける
+            click.echo("キャッシュに保存できませんでした。{}".format(e))
+
+    def get_or_generate(
+        self, converter: Converter, node_id: str, graph: DAG
+    ) -> DbtModels:
+        """
+        キャッシュに変換結果があれば返し、なければ変換してキャッシュする。
+        キャッシュする変換結果は、DbtModels.renderedで書き出しに必要なものだけにする。
+        キャッシュから返すときは、変換したときに数えた最適化の件数を、実行中の件数に足す。
+        """
+        key = self.key(converter, node_id, graph)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            models, stats = cached
+            add_node_stats(stats)
+            return models
+
+        self.misses += 1
+        before = collect_node_stats()
+        models = converter.generate_dbt_models(node_id, graph).rendered()
+        self.put(key, models, subtract_node_stats(collect_node_stats(), before))
+        return models
+
+    def evict(self) -> int:
+        """上限を超えていれば、最も長く使われていないエントリから消す。消した件数を返す"""
+        entries = list_cache_entries(self.cache_dir)
+        total_size = sum(entry[2] for entry in entries)
+        removed = 0
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # 他のプロセスが消した
+                pass
+            total_size -= size
+            removed += 1
+        return removed
+
+
+def list_cache_entries(cache_dir: str) -> list[tuple[str, float, int]]:
+    """キャッシュのエントリを、(パス, 最終利用日時, バイト数)のリストにする"""
+    entries_dir = os.path.join(cache_dir, NODE_CACHE_ENTRIES_DIR_NAME)
+    if not os.path.isdir(entries_dir):
+        return []
+
+    entries = []
+    for sub_dir in os.scandir(entries_dir):
+        if not sub_dir.is_dir():
+            continue
+        for entry in os.scandir(sub_dir.path):
+            if not entry.name.endswith(NODE_CACHE_ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_mtime, stat.st_size))
+    return entries
+
+
+def open_node_cache() -> NodeCache | None:
+    """
+    実行時オプションでキャッシュが有効になっていれば、キャッシュを開く。無効ならNone
+    """
+    ctx = click.get_current_context()
+    if not ctx.params.get("use_cache", False):
+        return None
+    return NodeCache(
+        ctx.params.get("cache_dir", DEFAULT_CACHE_DIR),
+        ctx.params.get("cache_max_size", DEFAULT_CACHE_MAX_SIZE) * 1024 * 1024,
+        output_options(),
+    )
+
+
+def close_node_cache(node_cache: NodeCache) -> None:
+    """上限を超えたエントリを消し、ヒット数とミス数を出力する"""
+    removed = node_cache.evict()
+    click.echo(
+        "キャッシュ: {0}件ヒット、{1}件ミス、{2}件を削除しました。".format(
+            node_cache.hits, node_cache.misses, removed
+        )
+    )
+
+
+def calculate_cache_stats(cache_dir: str) -> CacheStats:
+    """キャッシュの統計情報を計算する"""
+    entries = list_cache_entries(cache_dir)
+    if len(entries) == 0:
+        return CacheStats(cache_dir)
+    used = [entry[1] for entry in entries]
+    return CacheStats(
+        cache_dir,
+        len(entries),
+        sum(entry[2] for entry in entries),
+        min(used),
+        max(used),
+    )
+
+
+def output_cache_stats(stats: CacheStats) -> None:
+    """キャッシュの統計情報を出力する"""
+
+    def format_time(timestamp: float) -> str:
+        if timestamp == 0.0:
+            return "-"
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+    click.echo("ディレクトリ : " + stats.cache_dir)
+    click.echo("エントリ数　 : " + str(stats.entries))
+    click.echo("サイズ　　　 : " + format(stats.size / 1024 / 1024, ".1f") + " MB")
+    click.echo("最古の利用　 : " + format_time(stats.oldest_used))
+    click.echo("最新の利用　 : " + format_time(stats.newest_used))
+
+
+def clear_cache(cache_dir: str) -> int:
+    """キャッシュのエントリをすべて消し、消した件数を返す"""
+    count = len(list_cache_entries(cache_dir))
+    entries_dir = os.path.join(cache_dir, NODE_CACHE_ENTRIES_DIR_NAME)
+    if os.path.isdir(entries_dir):
+        shutil.rmtree(entries_dir)
+    return count
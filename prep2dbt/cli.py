@@ -1,10 +1,19 @@
 import click
 
+from .batch_services import convert_flows, find_flow_files, output_batch_result
+from .cache_services import (calculate_cache_stats, clear_cache,
+                             output_cache_stats)
 from .core_services import (before_execute_action, build_model_name,
-                            calculate_columns, convert_to_graph)
+                            calculate_columns, convert_nodes_to_graph)
 from .dbt_services import generate_dbt_models, output_dbt_files, print_results
 from .describe_services import calculate_metrics, output_metrics
-from .options import dialect, flow_file, prefix, source_name, tags, work_dir
+from .incremental_services import convert_incrementally
+from .options import (cache_dir, cache_max_size, dialect, flow_file, flows,
+                      fuse_projections, graph_backend, incremental, jobs,
+                      max_cte_depth, naming, prefix, prune_columns,
+                      push_down_filters, source_name, split_materialized, tags,
+                      use_cache, work_dir, workers)
+from .pruning_services import output_pruning_result, prune_unused_columns
 
 
 @click.group(
@@ -27,6 +36,18 @@ def cli():
 @source_name
 @tags
 @prefix
+@graph_backend
+@naming
+@jobs
+@incremental
+@prune_columns
+@push_down_filters
+@fuse_projections
+@max_cte_depth
+@split_materialized
+@use_cache
+@cache_dir
+@cache_max_size
 def convert(
     ctx,
     flow_file: str,
@@ -35,34 +56,132 @@ def convert(
     source_name: str,
     tags: str,
     prefix: str,
+    graph_backend: str,
+    naming: str,
+    jobs: int,
+    incremental: bool,
+    prune_columns: bool,
+    push_down_filters: bool,
+    fuse_projections: bool,
+    max_cte_depth: int | None,
+    split_materialized: str,
+    use_cache: bool,
+    cache_dir: str,
+    cache_max_size: int,
 ) -> None:
     """
     dbtモデルファイルを生成します
     """
-    file = before_execute_action()
-    graph = convert_to_graph(file)
+    node_dicts = before_execute_action()
+    graph = convert_nodes_to_graph(node_dicts)
     build_model_name(graph)
-    calculate_columns(graph)
-    models = generate_dbt_models(graph)
-    output_dbt_files(models)
+    if incremental:
+        # 変換しなおしたステップのdbtモデルは、書き出し済み
+        models = convert_incrementally(graph)
+    else:
+        calculate_columns(graph)
+        if prune_columns:
+            output_pruning_result(prune_unused_columns(graph))
+        models = generate_dbt_models(graph)
+        output_dbt_files(models)
     print_results(graph, models)
 
 
+@click.command("convert-batch")
+@click.pass_context
+@flows
+@work_dir
+@dialect
+@source_name
+@tags
+@prefix
+@graph_backend
+@naming
+@jobs
+@incremental
+@prune_columns
+@push_down_filters
+@fuse_projections
+@max_cte_depth
+@split_materialized
+@use_cache
+@cache_dir
+@cache_max_size
+@workers
+def convert_batch(
+    ctx,
+    flows: str,
+    work_dir: str,
+    dialect: str,
+    source_name: str,
+    tags: str,
+    prefix: str,
+    graph_backend: str,
+    naming: str,
+    jobs: int,
+    incremental: bool,
+    prune_columns: bool,
+    push_down_filters: bool,
+    fuse_projections: bool,
+    max_cte_depth: int | None,
+    split_materialized: str,
+    use_cache: bool,
+    cache_dir: str,
+    cache_max_size: int,
+    workers: int,
+) -> None:
+    """
+    ディレクトリ配下のフローファイルを、まとめてdbtモデルファイルに変換します
+    """
+    flow_files = find_flow_files(flows)
+    result = convert_flows(flow_files, workers)
+    output_batch_result(result)
+
+
 @click.command("describe")
 @click.pass_context
 @flow_file
 @work_dir
-def describe(ctx, flow_file: str, work_dir: str) -> None:
+@graph_backend
+def describe(ctx, flow_file: str, work_dir: str, graph_backend: str) -> None:
     """
     フローファイルの内容を解析し、統計情報を出力します
     """
-    file = before_execute_action()
-    graph = convert_to_graph(file)
+    node_dicts = before_execute_action()
+    graph = convert_nodes_to_graph(node_dicts)
     build_model_name(graph)
     calculate_columns(graph)
     metrics = calculate_metrics(graph)
     output_metrics(metrics)
 
 
+@click.group("cache")
+def cache():
+    """
+    ステップ単位の変換結果のキャッシュ（--cache）を管理します
+    """
+
+
+@cache.command("stats")
+@cache_dir
+def cache_stats(cache_dir: str) -> None:
+    """
+    キャッシュのエントリ数とサイズを出力します
+    """
+    output_cache_stats(calculate_cache_stats(cache_dir))
+
+
+@cache.command("clear")
+@cache_dir
+def cache_clear(cache_dir: str) -> None:
+    """
+    キャッシュをすべて削除します
+    """
+    count = clear_cache(cache_dir)
+    click.echo("キャッシュを{}件削除しました。".format(count))
+
+
 cli.add_command(convert)
+cli.add_command(convert_batch)
 cli.add_command(describe)
+cli.add_command(cache)
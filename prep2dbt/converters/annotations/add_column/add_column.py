@@ -5,6 +5,7 @@ from prep2dbt.converters.annotations.mixins.unknown_annotation_mixin import \
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.node import ModelColumn, ModelColumns
 from prep2dbt.sqlalchemy_utils import patched_select as select
+from prep2dbt.utils import is_row_local_expression, referenced_names
 
 
 class AddColumnAnnotationConverter(UnknownAnnotationMixin):
@@ -42,6 +43,24 @@ class AddColumnAnnotationConverter(UnknownAnnotationMixin):
             )
         )
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        # 追加するカラムが不要でも、式は評価されるので、式が参照するカラムは必要
+        return (required - {annotation_node["columnName"]}) | referenced_names(
+            annotation_node["expression"], cols.names_list()
+        )
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        # 式がほかの行の値によるなら（LOD式、集計、表計算）、行を絞りこむと値が変わるので、行を変える処理とみなす
+        if not is_row_local_expression(annotation_node["expression"]):
+            return None
+        return {annotation_node["columnName"]}
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -42,10 +42,23 @@ class ChangeColumnTypeAnnotationConverter(UnknownAnnotationMixin):
         cls, annotation_node: dict, cols: ModelColumns
     ) -> ModelColumns:
         for field_name in annotation_node["fields"].keys():
-            if cols.is_applicable and (not field_name in cols.names_list()):
+            if cols.is_applicable and (not cols.has_column_by_name(field_name)):
                 cols = cols.add(ModelColumn(field_name, "string"))
         return cols
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        # 型変換するカラムは、不要でもCASTで参照する
+        return required | set(annotation_node["fields"].keys())
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return set(annotation_node["fields"].keys())
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable
+
+import click
+
+from prep2dbt.models.node import ModelColumns
+
+# キャッシュするアノテーションの計算結果の上限
+ANNOTATION_COLUMNS_CACHE_SIZE = 65536
+
+# 実行中のアノテーションの計算結果のキャッシュを保存する、click.Context.metaのキー
+ANNOTATION_COLUMNS_CACHE_META_KEY = "prep2dbt.annotation_columns_cache"
+
+
+class AnnotationColumnsCache:
+    """
+    アノテーションによるカラム定義の計算結果のキャッシュ
+
+    同じアノテーションのカラム定義は、カラム定義の計算、SQLの生成の前後処理などで何度も計算される。
+    (アノテーションのID, 変換仕様, 入力のカラム定義の内容のハッシュ値)をキーにして、
+    計算結果を使いまわす。ModelColumnsは変更できないので、結果はそのまま共有してよい。
+    入力のカラム定義は、作られ方によらないcontent_digestで比べる（fingerprintでは、同じ内容でもヒットしないことがある）。
+
+    - 別のフローで同じIDが使われることがあるので、ヒットしたらアノテーションの内容も同じか確かめる。
+    - 上限を超えたら、最も長く使われていない結果から捨てる（LRU）。
+    """
+
+    def __init__(self, maxsize: int = ANNOTATION_COLUMNS_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # キー -> (アノテーション, 計算結果)
+        self._entries: OrderedDict[
+            tuple[str, str, str], tuple[dict, ModelColumns]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_calculate(
+        self,
+        converter_name: str,
+        annotation_node: dict,
+        cols: ModelColumns,
+        calculate: Callable[[], ModelColumns],
+    ) -> ModelColumns:
+        """キャッシュに計算結果があれば返し、なければ計算してキャッシュする"""
+        if self.maxsize <= 0:
+            self.misses += 1
+            return calculate()
+
+        key = (
+            str(annotation_node.get("id", "")),
+            converter_name,
+            cols.content_digest,
+        )
+        entry = self._entries.get(key)
+        if entry is not None and (
+            entry[0] is annotation_node or entry[0] == annotation_node
+        ):
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        result = calculate()
+        self._entries[key] = (annotation_node, result)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        """キャッシュと、ヒット数・ミス数を消す"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# クリックコンテキストの外で使うキャッシュ
+_process_annotation_columns_cache = AnnotationColumnsCache()
+
+
+def get_annotation_columns_cache() -> AnnotationColumnsCache:
+    """
+    実行中のアノテーションの計算結果のキャッシュを返す。
+    click.Contextごと（1回の実行ごと）につくり、metaに保存して使いまわす。
+    一括変換でも、フローごとの変換が終われば、キャッシュも一緒に捨てられる。
+    クリックコンテキストの外（並列計算のワーカープロセスなど）では、プロセスで共有するキャッシュを使う。
+    """
+    c = click.get_current_context(silent=True)
+    if c is None:
+        return _process_annotation_columns_cache
+    cache = c.meta.get(ANNOTATION_COLUMNS_CACHE_META_KEY)
+    if cache is None:
+        cache = AnnotationColumnsCache()
+        c.meta[ANNOTATION_COLUMNS_CACHE_META_KEY] = cache
+    return cache
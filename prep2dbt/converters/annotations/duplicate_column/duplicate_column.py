@@ -5,6 +5,7 @@ from prep2dbt.converters.annotations.mixins.unknown_annotation_mixin import \
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.node import ModelColumn, ModelColumns
 from prep2dbt.sqlalchemy_utils import patched_select as select
+from prep2dbt.utils import is_row_local_expression
 
 
 class DuplicateColumnAnnotationConverter(UnknownAnnotationMixin):
@@ -41,6 +42,22 @@ class DuplicateColumnAnnotationConverter(UnknownAnnotationMixin):
 
         return cols.add(ModelColumn(new_column_name, "string", source_column_name))
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        source_column_name = annotation_node["expression"].strip("[]")
+        return (required - {annotation_node["columnName"]}) | {source_column_name}
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        # 式がほかの行の値によるなら（LOD式、集計、表計算）、行を絞りこむと値が変わるので、行を変える処理とみなす
+        if not is_row_local_expression(annotation_node["expression"]):
+            return None
+        return {annotation_node["columnName"]}
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -6,6 +6,7 @@ from prep2dbt.converters.annotations.mixins.unknown_annotation_mixin import \
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.node import ModelColumns
 from prep2dbt.sqlalchemy_utils import patched_select as select
+from prep2dbt.utils import referenced_names
 
 
 class FilterOperationAnnotationConverter(UnknownAnnotationMixin):
@@ -38,6 +39,15 @@ class FilterOperationAnnotationConverter(UnknownAnnotationMixin):
     ) -> ModelColumns:
         return cols
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        # フィルターの条件式が参照するカラムは、処理後に不要でも必要
+        return required | referenced_names(
+            annotation_node["filterExpression"], cols.names_list()
+        )
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
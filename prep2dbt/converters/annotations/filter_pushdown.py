@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import click
+
+from prep2dbt.converters.annotations.factory import AnnotationConverterFactory
+from prep2dbt.converters.annotations.filter_operation.filter_operation import \
+    FilterOperationAnnotationConverter
+from prep2dbt.models.node import ModelColumns
+from prep2dbt.utils import referenced_names
+
+# 実行中のフィルターの押し下げの件数を保存する、click.Context.metaのキー
+FILTER_PUSHDOWN_META_KEY = "prep2dbt.filter_pushdown"
+
+
+class FilterPushdownStats:
+    """
+    フィルターの押し下げの件数。1回の実行の中で数える。
+    """
+
+    def __init__(self) -> None:
+        self.filters = 0  # アノテーションのフィルターの数
+        self.pushed_filters = 0  # 前に移したフィルターの数
+
+
+def is_filter_pushdown_enabled() -> bool:
+    """実行時オプションで、フィルターの押し下げが有効か"""
+    return click.get_current_context().params.get("push_down_filters", False)
+
+
+def get_filter_pushdown_stats() -> FilterPushdownStats:
+    """
+    実行中のフィルターの押し下げの件数を返す。
+    click.Contextごと（1回の実行ごと）につくり、metaに保存して使いまわす。
+    """
+    c = click.get_current_context()
+    stats = c.meta.get(FILTER_PUSHDOWN_META_KEY)
+    if stats is None:
+        stats = FilterPushdownStats()
+        c.meta[FILTER_PUSHDOWN_META_KEY] = stats
+    return stats
+
+
+def is_filter(annotation_node: dict) -> bool:
+    """アノテーションが、変換できるフィルターか"""
+    converter = AnnotationConverterFactory.get_annotation_converter_by_type(
+        annotation_node["nodeType"]
+    )
+    return (
+        converter is FilterOperationAnnotationConverter
+        and "filterExpression" in annotation_node
+    )
+
+
+def filter_referenced_names(annotation_node: dict, cols: ModelColumns) -> set[str]:
+    """フィルターの条件式が参照するカラム名"""
+    return referenced_names(annotation_node["filterExpression"], cols.names_list())
+
+
+def can_push_down_filter(
+    annotation_node: dict,
+    cols: ModelColumns,
+    filter_node: dict,
+    filter_cols: ModelColumns,
+) -> bool:
+    """
+    アノテーションのあとのフィルターを、アノテーションの前に移せるか。
+    フィルターが参照するカラムが、アノテーションの前にもあり、アノテーションで変わらない場合だけ移せる。
+
+    Args:
+        annotation_node (dict): フィルターの直前のアノテーション（annotationNode）
+        cols (ModelColumns): 直前のアノテーションへ入力するカラム定義
+        filter_node (dict): フィルター（annotationNode）
+        filter_cols (ModelColumns): フィルターへ入力するカラム定義
+    """
+    # カラム定義が不明なら、参照するカラムがわからないので移さない
+    if not (cols.is_applicable and filter_cols.is_applicable):
+        return False
+    converter = AnnotationConverterFactory.get_annotation_converter_by_type(
+        annotation_node["nodeType"]
+    )
+    changed = converter.calculate_changed_columns(annotation_node, cols)
+    if changed is None:
+        return False
+    # 前後どちらかにしかないカラム名も参照とみなし、前後で意味が変わらないことを確かめる
+    referenced = referenced_names(
+        filter_node["filterExpression"],
+        set(cols.names_list()) | set(filter_cols.names_list()),
+    )
+    return referenced.isdisjoint(changed) and referenced <= set(cols.names_list())
+
+
+def push_down_filters(
+    annotations: list[tuple[dict, ModelColumns]]
+) -> list[tuple[dict, ModelColumns]]:
+    """
+    一連のアノテーションの中で、フィルターをできるだけ前（ソースの近く）へ移す。
+    フィルター同士や、行を変えるアノテーションの順番は変えない。
+
+    Args:
+        annotations (list[tuple[dict, ModelColumns]]): (アノテーション（annotationNode）, 入力するカラム定義)の並び
+
+    Returns:
+        list[tuple[dict, ModelColumns]]: フィルターを移したあとの、(アノテーション, 入力するカラム定義)の並び
+    """
+    result = list(annotations)
+    for i in range(len(result)):
+        if not is_filter(result[i][0]):
+            continue
+        j = i
+        while j > 0 and can_push_down_filter(*result[j - 1], *result[j]):
+            # フィルターはカラムを変えないので、入れ替えても、前のアノテーションへ入力するカラム定義は変わらない
+            previous, cols = result[j - 1]
+            result[j - 1] = (result[j][0], cols)
+            result[j] = (previous, cols)
+            j -= 1
+    return result
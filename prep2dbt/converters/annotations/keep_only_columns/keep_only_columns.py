@@ -42,6 +42,19 @@ class KeepOnlyColumnAnnotationConverter(UnknownAnnotationMixin):
 
         return new_cols
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        # 残すカラムは、処理後に不要でもすべて選択する
+        return set(annotation_node["columnNames"])
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return set(cols.names_list()) - set(annotation_node["columnNames"])
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -52,7 +65,7 @@ class KeepOnlyColumnAnnotationConverter(UnknownAnnotationMixin):
                 new_cols = new_cols.remove_column_by_name(col)
 
         for col in annotation_node["columnNames"]:
-            if not col in new_cols.names_list():
+            if not new_cols.has_column_by_name(col):
                 # Keep対象だが、あたえられたカラム定義になかった　⇨ もとの定義計算が間違っている。ここでは、カラム追加する。
                 new_cols = new_cols.add(ModelColumn(col, "string"))
 
@@ -1,5 +1,7 @@
 from sqlalchemy.sql.selectable import CTE
 
+from prep2dbt.converters.annotations.columns_cache import \
+    get_annotation_columns_cache
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.node import ModelColumns
 from prep2dbt.protocols.converter import AnnotationConverter
@@ -16,6 +18,8 @@ class UnknownAnnotationMixin(AnnotationConverter):
     - perform_generate_statements
 
     を実装してください。
+    perform_calculate_required_columnsを実装しない場合、処理前のすべてのカラムが必要とみなします。
+    perform_calculate_changed_columnsを実装しない場合、行を変える処理とみなします（フィルターの押し下げで、前に移せない）。
     """
 
     @classmethod
@@ -31,6 +35,18 @@ class UnknownAnnotationMixin(AnnotationConverter):
     @classmethod
     def calculate_columns(
         cls, annotation_node: dict, cols: ModelColumns
+    ) -> ModelColumns:
+        # 同じアノテーションと入力のカラム定義の組は、一度だけ計算する
+        return get_annotation_columns_cache().get_or_calculate(
+            cls.__qualname__,
+            annotation_node,
+            cols,
+            lambda: cls.__calculate_columns(annotation_node, cols),
+        )
+
+    @classmethod
+    def __calculate_columns(
+        cls, annotation_node: dict, cols: ModelColumns
     ) -> ModelColumns:
         try:
             cls.validate(annotation_node)
@@ -38,6 +54,43 @@ class UnknownAnnotationMixin(AnnotationConverter):
         except UnknownNodeException:
             return ModelColumns.unknown()
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        return set(cols.names_list())
+
+    @classmethod
+    def calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        try:
+            cls.validate(annotation_node)
+            required = cls.perform_calculate_required_columns(
+                annotation_node, cols, required
+            )
+        except UnknownNodeException:
+            # 変換できないアノテーションは、すべてのカラムをそのまま選択する
+            return set(cols.names_list())
+        # 処理前に存在しないカラムは、親に求めない
+        return required & set(cols.names_list())
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return None
+
+    @classmethod
+    def calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        try:
+            cls.validate(annotation_node)
+            return cls.perform_calculate_changed_columns(annotation_node, cols)
+        except UnknownNodeException:
+            return None
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
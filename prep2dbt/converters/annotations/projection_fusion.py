@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import click
+from sqlalchemy import Column, String
+from sqlalchemy.sql.elements import Label
+from sqlalchemy.sql.selectable import CTE, FromClause, Select
+
+from prep2dbt.converters.annotations.factory import AnnotationConverterFactory
+from prep2dbt.models.node import ModelColumns
+from prep2dbt.sqlalchemy_utils import patched_select as select
+from prep2dbt.utils import referenced_names
+
+# 実行中の射影の統合の件数を保存する、click.Context.metaのキー
+PROJECTION_FUSION_META_KEY = "prep2dbt.projection_fusion"
+
+
+class ProjectionFusionStats:
+    """
+    射影の統合の件数。1回の実行の中で数える。
+    """
+
+    def __init__(self) -> None:
+        self.annotation_ctes = 0  # アノテーションで作ったCTEの数
+        self.fused_ctes = 0  # 統合して取り除いたCTEの数
+
+
+def is_projection_fusion_enabled() -> bool:
+    """実行時オプションで、射影の統合が有効か"""
+    return click.get_current_context().params.get("fuse_projections", False)
+
+
+def get_projection_fusion_stats() -> ProjectionFusionStats:
+    """
+    実行中の射影の統合の件数を返す。
+    click.Contextごと（1回の実行ごと）につくり、metaに保存して使いまわす。
+    """
+    c = click.get_current_context()
+    stats = c.meta.get(PROJECTION_FUSION_META_KEY)
+    if stats is None:
+        stats = ProjectionFusionStats()
+        c.meta[PROJECTION_FUSION_META_KEY] = stats
+    return stats
+
+
+def __projection_of(
+    cte: FromClause,
+) -> tuple[FromClause, dict[str, tuple[str, str | None]]] | None:
+    """
+    CTEが、1つのFROMから列を選ぶだけの射影なら、(FROM, 列名 -> (値, ラベル))を返す。射影でなければNone。
+    値は、FROMの列名か、アノテーションの計算式（AddColumnやQuickCalcColumnの式）。
+    ラベルは、ラベルをつけて選んだ列のラベル名で、クォートの有無もそのまま保つ。ラベルのない列はNone。
+    """
+    if not isinstance(cte, CTE) or cte.recursive:
+        return None
+    stmt = cte.element
+    if not isinstance(stmt, Select):
+        return None
+    if (
+        stmt._where_criteria
+        or stmt._having_criteria
+        or stmt._group_by_clauses
+        or stmt._order_by_clauses
+        or stmt._limit_clause is not None
+        or stmt._offset_clause is not None
+        or stmt._fetch_clause is not None
+        or stmt._distinct
+        or stmt._setup_joins
+        or len(stmt._from_obj) != 1
+    ):
+        return None
+
+    columns: dict[str, tuple[str, str | None]] = {}
+    for raw_column in stmt._raw_columns:
+        label: str | None
+        if isinstance(raw_column, Label) and isinstance(raw_column.element, Column):
+            name, source, label = raw_column.name, raw_column.element, raw_column.name
+        elif isinstance(raw_column, Column):
+            name, source, label = raw_column.name, raw_column, None
+        else:
+            return None
+        # テーブルに結びついた列や、starは置き換えられない
+        if source.table is not None or source.name == "*" or name in columns:
+            return None
+        columns[name] = (source.name, label)
+    return stmt._from_obj[0], columns
+
+
+def __fused_value(
+    value: str, inner_columns: dict[str, tuple[str, str | None]]
+) -> str | None:
+    """
+    outerの列の値を、innerのFROMから直接選ぶときの値にする。置き換えられなければNone。
+    innerの列の参照は、innerでの値に置き換える。
+    計算式は、参照する列がすべてinnerで名前も値も変わらずに選ばれているときだけ、そのまま使える。
+    式の中の列名は書き換えないので、innerで名前を変えた列や計算した列を参照する式は統合しない。
+    """
+    if value in inner_columns:
+        return inner_columns[value][0]
+    for name in referenced_names(value, inner_columns):
+        if inner_columns[name][0] != name:
+            return None
+    return value
+
+
+def fuse_projections(outer: CTE, inner: CTE) -> CTE | None:
+    """
+    innerから列を選ぶ射影のouterと、射影のinnerを、1つのCTEに統合する。
+    outerの列が参照するinnerの列を、innerでの値（式）に置き換え、innerのFROMから直接選ぶ。
+    outerの計算式（AddColumnなど）は、参照する列がinnerをそのまま通るなら、式のまま統合する。
+    そのため、計算と射影（名前の変更、列の削除など）が続くアノテーションは、まとめて1つのCTEになる。
+    どちらかが射影でない場合や、outerの計算式がinnerで名前を変えた列・計算した列を参照する場合は、
+    統合できないのでNoneを返す。
+    """
+    outer_projection = __projection_of(outer)
+    inner_projection = __projection_of(inner)
+    if outer_projection is None or inner_projection is None:
+        return None
+    outer_from, outer_columns = outer_projection
+    inner_from, inner_columns = inner_projection
+    if outer_from is not inner:
+        return None
+
+    columns = []
+    for name, (value, label) in outer_columns.items():
+        fused_value = __fused_value(value, inner_columns)
+        if fused_value is None:
+            return None
+        column = Column(fused_value, String, quote=True)
+        if label is None and column.name == name:
+            columns.append(column)
+        else:
+            # 統合しない場合と同じ列名になるよう、outerのラベル（ラベルがなければ列名）をそのまま使う
+            columns.append(column.label(name if label is None else label))
+    comments = [
+        stmt.element._added_comment
+        for stmt in [inner, outer]
+        if stmt.element._added_comment
+    ]
+    return (
+        select(*columns)
+        .comment(", ".join(comments))
+        .select_from(inner_from)
+        .cte(outer.name)
+    )
+
+
+def generate_annotation_statements(
+    annotation_node: dict, cols: ModelColumns, stmts: CTE, fusable: bool
+) -> CTE:
+    """
+    アノテーションのCTEをつくる。
+    実行時オプションで射影の統合が有効で、stmtsもアノテーションのCTEなら（fusable）、1つのCTEへの統合を試みる。
+
+    Args:
+        annotation_node (dict): アノテーション（annotationNode）
+        cols (ModelColumns): アノテーションへ入力するカラム定義
+        stmts (CTE): アノテーションへ入力するCTE
+        fusable (bool): stmtsが、同じステップのアノテーションのCTEか
+    """
+    converter = AnnotationConverterFactory.get_annotation_converter_by_type(
+        annotation_node["nodeType"]
+    )
+    new_stmts = converter.generate_statements(annotation_node, cols, stmts)
+    if not is_projection_fusion_enabled():
+        return new_stmts
+
+    stats = get_projection_fusion_stats()
+    stats.annotation_ctes += 1
+    if not fusable:
+        return new_stmts
+    fused = fuse_projections(new_stmts, stmts)
+    if fused is None:
+        return new_stmts
+    stats.fused_ctes += 1
+    return fused
@@ -45,6 +45,19 @@ class RemapAnnotationConverter(UnknownAnnotationMixin):
     ) -> ModelColumns:
         return cols
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        # 値を置き換えるカラムは、処理後に不要でもCASE式で参照する
+        return required | {annotation_node["columnName"]}
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return {annotation_node["columnName"]}
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -40,6 +40,18 @@ class RemoveColumnsAnnotationConverter(UnknownAnnotationMixin):
             new = new.remove_column_by_name(remove_target_name)
         return new
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        return required - set(annotation_node["columnNames"])
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return set(annotation_node["columnNames"])
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -45,6 +45,21 @@ class RenameColumnAnnotationConverter(UnknownAnnotationMixin):
         new_cols = new_cols.remove_column_by_name(annotation_node["columnName"])
         return new_cols
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        # 名前を変えるカラムは、処理後に不要でも選択する
+        return (required - {annotation_node["rename"]}) | {
+            annotation_node["columnName"]
+        }
+
+    @classmethod
+    def perform_calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return {annotation_node["columnName"], annotation_node["rename"]}
+
     @classmethod
     def perform_generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
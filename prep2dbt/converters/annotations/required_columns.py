@@ -0,0 +1,25 @@
+from typing import Iterable
+
+from prep2dbt.converters.annotations.factory import AnnotationConverterFactory
+from prep2dbt.models.node import ModelColumns
+
+
+def calculate_annotations_required_columns(
+    annotations: Iterable[dict],
+    inputs: Iterable[ModelColumns],
+    required: set[str],
+) -> set[str]:
+    """
+    一連のアノテーションのあとに必要なカラム名から、最初のアノテーションの前に必要なカラム名を計算する。
+
+    Args:
+        annotations (Iterable[dict]): アノテーション（annotationNode）の並び
+        inputs (Iterable[ModelColumns]): 各アノテーションへ入力するカラム定義の並び
+        required (set[str]): 最後のアノテーションのあとに必要なカラム名
+    """
+    for annotation, cols in reversed(list(zip(annotations, inputs))):
+        converter = AnnotationConverterFactory.get_annotation_converter_by_type(
+            annotation["nodeType"]
+        )
+        required = converter.calculate_required_columns(annotation, cols, required)
+    return required
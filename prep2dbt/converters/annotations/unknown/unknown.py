@@ -16,6 +16,18 @@ class UnknownAnnotationConverter(AnnotationConverter):
     ) -> ModelColumns:
         return ModelColumns.unknown()
 
+    @classmethod
+    def calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        return set(cols.names_list())
+
+    @classmethod
+    def calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        return None
+
     @classmethod
     def generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
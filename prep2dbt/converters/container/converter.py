@@ -1,13 +1,21 @@
 from prep2dbt.converters.annotations.factory import AnnotationConverterFactory
+from prep2dbt.converters.annotations.filter_pushdown import (
+    get_filter_pushdown_stats, is_filter, is_filter_pushdown_enabled,
+    push_down_filters)
+from prep2dbt.converters.annotations.projection_fusion import \
+    generate_annotation_statements
+from prep2dbt.converters.annotations.required_columns import \
+    calculate_annotations_required_columns
+from prep2dbt.converters.mixins.split_model_mixin import SplitModelMixin
 from prep2dbt.converters.mixins.unknown_node_mixin import UnknownNodeMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumns, ModelName, Node
+from prep2dbt.models.node import ModelColumns, ModelName, Node, NodeDict
 from prep2dbt.sqlalchemy_utils import patched_select as select
 
 
-class ContainerConverter(UnknownNodeMixin):
+class ContainerConverter(SplitModelMixin, UnknownNodeMixin):
     """
     Containerの変換仕様
     ```
@@ -60,7 +68,7 @@ class ContainerConverter(UnknownNodeMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         """ノードが変換可能かどうかチェックします。"""
         if "loomContainer" in node_dict:
             if "nodes" in node_dict["loomContainer"]:
@@ -69,7 +77,7 @@ class ContainerConverter(UnknownNodeMixin):
         raise UnknownNodeException("未知のノードです。ID:{}".format(node_dict["id"]))
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         node = Node(
             id=node_dict["id"],
             name=node_dict["name"],
@@ -108,6 +116,39 @@ class ContainerConverter(UnknownNodeMixin):
 
         return new_cols
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls,
+        node_id: str,
+        graph: DAG,
+        required: set[str],
+        parent_columns: dict[str, ModelColumns] | None = None,
+    ) -> dict[str, set[str]]:
+        node = graph.get_node_by_id(node_id)
+
+        parent_columns = graph.get_all_parent_columns(node_id)
+        if not "Default" in parent_columns.keys():
+            # 親はからなずひとつ。Defaultネームスペースのみ。
+            raise UnknownNodeException("未知のノード")
+
+        # 各アノテーションへ入力するカラム定義を計算し、後ろからさかのぼる
+        annotations = list(node.raw_dict["loomContainer"]["nodes"].values())
+        inputs = []
+        new_cols = parent_columns["Default"]
+        for annotation in annotations:
+            converter = AnnotationConverterFactory.get_annotation_converter_by_type(
+                annotation["nodeType"]
+            )
+            flushed_new_cols = new_cols.flush_values()
+            inputs.append(flushed_new_cols)
+            new_cols = converter.calculate_columns(annotation, flushed_new_cols)
+
+        return {
+            "Default": calculate_annotations_required_columns(
+                annotations, inputs, required
+            )
+        }
+
     @classmethod
     def __model_sql(cls, node_id: str, graph: DAG) -> Sql:
         node = graph.get_node_by_id(node_id)
@@ -126,17 +167,33 @@ class ContainerConverter(UnknownNodeMixin):
             raise UnknownNodeException("未知のノード")
         new_cols = parent_columns["Default"]
 
-        # annotationの処理を各親テーブルに適用する。
+        # 各アノテーションへ入力するカラム定義を計算する
+        annotations: list[tuple[dict, ModelColumns]] = []
         for annotation in node.raw_dict["loomContainer"]["nodes"].values():
             converter = AnnotationConverterFactory.get_annotation_converter_by_type(
                 annotation["nodeType"]
             )
             flushed_new_cols = new_cols.flush_values()
+            annotations.append((annotation, flushed_new_cols))
             new_cols = converter.calculate_columns(annotation, flushed_new_cols)
-            new_stmts = converter.generate_statements(
+
+        if is_filter_pushdown_enabled():
+            pushed = push_down_filters(annotations)
+            stats = get_filter_pushdown_stats()
+            for i, (annotation, _) in enumerate(annotations):
+                if is_filter(annotation):
+                    stats.filters += 1
+                    if pushed[i][0] is not annotation:
+                        stats.pushed_filters += 1
+            annotations = pushed
+
+        # annotationの処理を各親テーブルに適用する。
+        for i, (annotation, flushed_new_cols) in enumerate(annotations):
+            new_stmts = generate_annotation_statements(
                 annotation,
                 flushed_new_cols,
                 new_stmts,
+                i > 0,
             )
 
         result = Sql.create_model_reference_model_sql_by_statements(
@@ -159,4 +216,4 @@ class ContainerConverter(UnknownNodeMixin):
             "model",
         )
 
-        return DbtModels([model])
+        return cls.split_dbt_model(node_id, graph, model)
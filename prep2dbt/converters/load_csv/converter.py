@@ -2,7 +2,8 @@ from prep2dbt.converters.mixins.unknown_node_mixin import UnknownNodeMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+from prep2dbt.models.node import (ModelColumn, ModelColumns, ModelName, Node,
+                                  NodeDict)
 from prep2dbt.sqlalchemy_utils import patched_select as select
 
 
@@ -55,7 +56,7 @@ class LoadCsvConverter(UnknownNodeMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         """ノードが変換可能かどうかチェックします。"""
         if "fields" in node_dict:
             return
@@ -63,7 +64,7 @@ class LoadCsvConverter(UnknownNodeMixin):
         raise UnknownNodeException("未知のノードです。ID:{}".format(node_dict["id"]))
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         node = Node(
             id=node_dict["id"],
             name=node_dict["name"],
@@ -86,13 +87,12 @@ class LoadCsvConverter(UnknownNodeMixin):
     ) -> ModelColumns:
         node = graph.get_node_by_id(node_id)
 
-        cols_set = set(
-            [
-                ModelColumn(field["name"], field["type"])
-                for field in node.raw_dict["fields"]
-            ]
-        )
-        return ModelColumns.calculated(cols_set)
+        # フィールドの並び順のまま、カラムにする
+        cols = [
+            ModelColumn(field["name"], field["type"])
+            for field in node.raw_dict["fields"]
+        ]
+        return ModelColumns.calculated(cols)
 
     @classmethod
     def __model_sql(cls, node_id: str, graph: DAG) -> Sql:
@@ -2,7 +2,8 @@ from prep2dbt.converters.mixins.unknown_node_mixin import UnknownNodeMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+from prep2dbt.models.node import (ModelColumn, ModelColumns, ModelName, Node,
+                                  NodeDict)
 from prep2dbt.sqlalchemy_utils import patched_select as select
 
 
@@ -42,7 +43,7 @@ class LoadSqlConverter(UnknownNodeMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         """ノードが変換可能かどうかチェックします。想定外のフォーマットだった場合、UnknownNodeException"""
         if (
             "name" in node_dict
@@ -56,7 +57,7 @@ class LoadSqlConverter(UnknownNodeMixin):
         raise UnknownNodeException("未知のノードです。ID:{}".format(node_dict["id"]))
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         node = Node(
             id=node_dict["id"],
             name=node_dict["name"],
@@ -79,13 +80,12 @@ class LoadSqlConverter(UnknownNodeMixin):
     ) -> ModelColumns:
         node = graph.get_node_by_id(node_id)
 
-        cols_set = set(
-            [
-                ModelColumn(field["name"], field["type"])
-                for field in node.raw_dict["fields"]
-            ]
-        )
-        return ModelColumns.calculated(cols_set)
+        # フィールドの並び順のまま、カラムにする
+        cols = [
+            ModelColumn(field["name"], field["type"])
+            for field in node.raw_dict["fields"]
+        ]
+        return ModelColumns.calculated(cols)
 
     @classmethod
     def __model_sql(cls, node_id: str, graph: DAG) -> Sql:
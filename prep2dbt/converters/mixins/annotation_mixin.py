@@ -4,14 +4,22 @@ from sqlalchemy import select
 from sqlalchemy.sql.selectable import CTE
 
 from prep2dbt.converters.annotations.factory import AnnotationConverterFactory
+from prep2dbt.converters.annotations.filter_pushdown import (
+    filter_referenced_names, get_filter_pushdown_stats, is_filter,
+    is_filter_pushdown_enabled, push_down_filters)
+from prep2dbt.converters.annotations.projection_fusion import \
+    generate_annotation_statements
+from prep2dbt.converters.annotations.required_columns import \
+    calculate_annotations_required_columns
+from prep2dbt.converters.mixins.split_model_mixin import SplitModelMixin
 from prep2dbt.converters.mixins.unknown_node_mixin import UnknownNodeMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumns
+from prep2dbt.models.node import AnnotationColumns, ModelColumns, Node
 
 
-class AnnotationMixin(UnknownNodeMixin):
+class AnnotationMixin(SplitModelMixin, UnknownNodeMixin):
     """
     beforeActionAnnotationとafterActionAnnotationの変換機能を提供します。
 
@@ -29,65 +37,337 @@ class AnnotationMixin(UnknownNodeMixin):
     前処理を追加したものに対してユーザ定義の処理を実施します。
     beforeActionAnnotationが存在し、前処理が含まれていたとき、ユーザ定義の処理結果に対して後処理を追加します。
 
+    カラムの削減では、afterActionAnnotation、ユーザ定義の処理（perform_calculate_required_columns）、
+    beforeActionAnnotationの順にさかのぼって、親に必要なカラムを計算します。
+
+    フィルターの押し下げが有効なとき、フィルターをできるだけ前（ソースの近く）へ移してから、SQLを生成します。
+    afterActionAnnotationの先頭に移ったフィルターを、ユーザ定義の処理の前へ移せるかは、
+    perform_calculate_pushdown_namespaceで判定します（実装しない場合は移しません）。
+
+    CTEの深さの上限が指定されていれば、上限を超えるモデルを中間モデルに分割します。
+    詳細はSplitModelMixinを参照してください。
+
     また、validateで想定外のフォーマットを検知したり、変換に失敗した場合、未知のノードとしての変換にフォールバックします。
     詳細はUnknownNodeMixinを参照してください。
     """
 
     @classmethod
-    def pre_calculate_column(cls, node_id: str, graph: DAG) -> dict[str, ModelColumns]:
+    def __calculate_before_annotations(
+        cls, node_id: str, graph: DAG
+    ) -> tuple[dict[str, ModelColumns], list[ModelColumns]]:
         """
-        カラム定義の計算前にbeforeActionAnnotationsの処理を計算する。
+        beforeActionAnnotationsの処理を計算し、処理後の親のカラム定義と、各アノテーションへ入力したカラム定義を返す。
         """
         node = graph.get_node_by_id(node_id)
         parent_columns = graph.get_all_parent_columns(node_id)
+        inputs: list[ModelColumns] = []
 
         if not "beforeActionAnnotations" in node.raw_dict:
-            return parent_columns
+            return parent_columns, inputs
 
         for annotation in node.raw_dict["beforeActionAnnotations"]:
             converter = AnnotationConverterFactory.get_annotation_converter_by_type(
                 annotation["annotationNode"]["nodeType"]
             )
             flushed_new_cols = parent_columns[annotation["namespace"]].flush_values()
+            inputs.append(flushed_new_cols)
             parent_columns[annotation["namespace"]] = converter.calculate_columns(
                 annotation["annotationNode"], flushed_new_cols
             )
-        return parent_columns
+        return parent_columns, inputs
 
     @classmethod
-    def post_calculate_column(
+    def __calculate_after_annotations(
         cls, node_id: str, graph: DAG, calculated_columns: ModelColumns
-    ) -> ModelColumns:
+    ) -> tuple[ModelColumns, list[ModelColumns]]:
         """
-        カラム定義の計算あとにafterActionAnnotationsの処理を追加する。
+        afterActionAnnotationsの処理を計算し、処理後のカラム定義と、各アノテーションへ入力したカラム定義を返す。
         """
         new_cols = calculated_columns
         node = graph.get_node_by_id(node_id)
+        inputs: list[ModelColumns] = []
 
         if not "afterActionAnnotations" in node.raw_dict:
-            return new_cols
+            return new_cols, inputs
 
         for annotation in node.raw_dict["afterActionAnnotations"]:
             converter = AnnotationConverterFactory.get_annotation_converter_by_type(
                 annotation["annotationNode"]["nodeType"]
             )
             flushed_new_cols = new_cols.flush_values()
+            inputs.append(flushed_new_cols)
             new_cols = converter.calculate_columns(
                 annotation["annotationNode"], flushed_new_cols
             )
-        return new_cols
+        return new_cols, inputs
+
+    @classmethod
+    def pre_calculate_column(cls, node_id: str, graph: DAG) -> dict[str, ModelColumns]:
+        """
+        カラム定義の計算前にbeforeActionAnnotationsの処理を計算する。
+        """
+        return cls.__calculate_before_annotations(node_id, graph)[0]
+
+    @classmethod
+    def post_calculate_column(
+        cls, node_id: str, graph: DAG, calculated_columns: ModelColumns
+    ) -> ModelColumns:
+        """
+        カラム定義の計算あとにafterActionAnnotationsの処理を追加する。
+        """
+        return cls.__calculate_after_annotations(node_id, graph, calculated_columns)[0]
 
     @classmethod
     def calculate_columns(cls, node_id: str, graph: DAG) -> ModelColumns:
+        return cls.calculate_node(node_id, graph).model_columns
+
+    @classmethod
+    def calculate_node(cls, node_id: str, graph: DAG) -> Node:
+        """
+        カラム定義を計算する。
+        各アノテーションへ入力したカラム定義も記録し、SQLの生成で計算しなおさずに使いまわす。
+        """
+        node = graph.get_node_by_id(node_id)
         try:
-            cls.validate(graph.get_node_by_id(node_id).raw_dict)
-            pre_columns = cls.pre_calculate_column(node_id, graph)
+            cls.validate(node.raw_dict)
+            pre_columns, before_inputs = cls.__calculate_before_annotations(
+                node_id, graph
+            )
             calculated_columns = cls.perform_calculate_columns(
-                node_id, graph, pre_columns
+                node_id, graph, dict(pre_columns)
+            )
+            new_cols, after_inputs = cls.__calculate_after_annotations(
+                node_id, graph, calculated_columns
             )
-            return cls.post_calculate_column(node_id, graph, calculated_columns)
         except UnknownNodeException:
-            return cls.calculate_unknown_columns(node_id, graph)
+            return node.copy_with_model_columns(
+                cls.calculate_unknown_columns(node_id, graph)
+            )
+
+        annotation_columns = AnnotationColumns.calculated(
+            pre_columns, calculated_columns, before_inputs, after_inputs
+        )
+        return node.copy_with_model_columns(new_cols).copy_with_annotation_columns(
+            annotation_columns
+        )
+
+    @classmethod
+    def calculate_required_columns(
+        cls, node_id: str, graph: DAG, required: set[str]
+    ) -> dict[str, set[str]]:
+        """
+        ノードに必要なカラム名から、ネームスペースごとに親に必要なカラム名を計算する。
+        各アノテーションへ入力したカラム定義は、カラム定義の計算で記録したものを使う。
+        """
+        node = graph.get_node_by_id(node_id)
+        annotation_columns = node.annotation_columns
+        if not (node.model_columns.is_applicable and annotation_columns.is_applicable):
+            return cls.calculate_unknown_required_columns(node_id, graph)
+
+        try:
+            cls.validate(node.raw_dict)
+            performed_required = calculate_annotations_required_columns(
+                [
+                    annotation["annotationNode"]
+                    for annotation in node.raw_dict.get("afterActionAnnotations", [])
+                ],
+                annotation_columns.after_inputs,
+                required,
+            )
+            pre_required = cls.perform_calculate_required_columns(
+                node_id,
+                graph,
+                performed_required,
+                dict(annotation_columns.parent_columns),
+            )
+        except UnknownNodeException:
+            return cls.calculate_unknown_required_columns(node_id, graph)
+
+        for namespace, cols in annotation_columns.parent_columns.items():
+            pre_required.setdefault(namespace, set(cols.names_list()))
+
+        # beforeActionAnnotationsは、ネームスペースごとに後ろからさかのぼる
+        before_annotations = list(
+            zip(
+                node.raw_dict.get("beforeActionAnnotations", []),
+                annotation_columns.before_inputs,
+            )
+        )
+        for annotation, cols in reversed(before_annotations):
+            namespace = annotation["namespace"]
+            pre_required[namespace] = calculate_annotations_required_columns(
+                [annotation["annotationNode"]], [cols], pre_required[namespace]
+            )
+
+        parent_columns = graph.get_all_parent_columns(node_id)
+        return {
+            namespace: pre_required.get(namespace, set(cols.names_list()))
+            & set(cols.names_list())
+            for namespace, cols in parent_columns.items()
+        }
+
+    @classmethod
+    def __before_annotations(
+        cls, node_id: str, graph: DAG
+    ) -> list[tuple[str, dict, ModelColumns]]:
+        """
+        beforeActionAnnotationsの順に、(ネームスペース, アノテーション, 入力するカラム定義)を返す。
+        """
+        node = graph.get_node_by_id(node_id)
+        if not "beforeActionAnnotations" in node.raw_dict:
+            return []
+
+        # 各アノテーションへ入力するカラム定義は、計算済みなら使いまわす
+        if node.annotation_columns.is_applicable:
+            inputs = list(node.annotation_columns.before_inputs)
+        else:
+            inputs = cls.__calculate_before_annotations(node_id, graph)[1]
+        return [
+            (annotation["namespace"], annotation["annotationNode"], cols)
+            for annotation, cols in zip(
+                node.raw_dict["beforeActionAnnotations"], inputs
+            )
+        ]
+
+    @classmethod
+    def __after_annotations(
+        cls, node_id: str, graph: DAG, calculated_columns: ModelColumns
+    ) -> list[tuple[dict, ModelColumns]]:
+        """
+        afterActionAnnotationsの順に、(アノテーション, 入力するカラム定義)を返す。
+        """
+        node = graph.get_node_by_id(node_id)
+        if not "afterActionAnnotations" in node.raw_dict:
+            return []
+
+        # 各アノテーションへ入力するカラム定義は、計算済みなら使いまわす
+        if node.annotation_columns.is_applicable:
+            inputs = list(node.annotation_columns.after_inputs)
+        else:
+            inputs = cls.__calculate_after_annotations(
+                node_id, graph, calculated_columns
+            )[1]
+        return [
+            (annotation["annotationNode"], cols)
+            for annotation, cols in zip(node.raw_dict["afterActionAnnotations"], inputs)
+        ]
+
+    @classmethod
+    def perform_calculate_pushdown_namespace(
+        cls,
+        node_id: str,
+        graph: DAG,
+        referenced: set[str],
+        parent_columns: dict[str, ModelColumns],
+    ) -> str | None:
+        """
+        afterActionAnnotationsの先頭のフィルターを、処理の前へ移せるなら、移す先のネームスペースを返す。
+        移すと結果が変わる場合はNone。
+
+        Args:
+            referenced (set[str]): フィルターが参照する、処理後のカラム名
+            parent_columns (dict[str, ModelColumns]): beforeActionAnnotationsを処理したあとの、ネームスペースごとの親のカラム定義
+        """
+        return None
+
+    @classmethod
+    def __annotation_positions(
+        cls,
+        before_annotations: list[tuple[str, dict, ModelColumns]],
+        after_annotations: list[tuple[dict, ModelColumns]],
+    ) -> dict[int, tuple[str | None, int]]:
+        """
+        各アノテーションの、(ネームスペース, 前にあるフィルター以外のアノテーションの数)を返す。
+        afterActionAnnotationsのネームスペースはNoneとする。
+        """
+        positions: dict[int, tuple[str | None, int]] = {}
+        counts: dict[str | None, int] = {}
+        annotations = [
+            (namespace, annotation_node)
+            for namespace, annotation_node, _ in before_annotations
+        ] + [(None, annotation_node) for annotation_node, _ in after_annotations]
+        for namespace, annotation_node in annotations:
+            positions[id(annotation_node)] = (namespace, counts.get(namespace, 0))
+            if not is_filter(annotation_node):
+                counts[namespace] = counts.get(namespace, 0) + 1
+        return positions
+
+    @classmethod
+    def __push_down_filters(
+        cls, node_id: str, graph: DAG, calculated_columns: ModelColumns | None = None
+    ) -> tuple[
+        list[tuple[str, dict, ModelColumns]], list[tuple[dict, ModelColumns]], int, int
+    ]:
+        """
+        フィルターをできるだけ前（ソースの近く）へ移し、適用する順のbeforeActionAnnotationsと
+        afterActionAnnotations、フィルターの数、前に移したフィルターの数を返す。
+
+        1. afterActionAnnotationsの中で、フィルターを前に移す
+        2. 先頭に移ったフィルターを、処理の前へ移せるなら、移す先のネームスペースのbeforeActionAnnotationsの最後へ移す
+        3. beforeActionAnnotationsの中で、ネームスペースごとにフィルターを前に移す
+        """
+        node = graph.get_node_by_id(node_id)
+        if node.annotation_columns.is_applicable:
+            parent_columns = dict(node.annotation_columns.parent_columns)
+            performed_columns = node.annotation_columns.performed_columns
+        else:
+            parent_columns = cls.pre_calculate_column(node_id, graph)
+            performed_columns = cls.perform_calculate_columns(
+                node_id, graph, dict(parent_columns)
+            )
+        if calculated_columns is not None:
+            performed_columns = calculated_columns
+        before_annotations = cls.__before_annotations(node_id, graph)
+        after_annotations = cls.__after_annotations(node_id, graph, performed_columns)
+
+        after_pushed: list[tuple[dict, ModelColumns]] = []
+        # 処理の前へ移すフィルター（ネームスペース -> (アノテーション, 入力するカラム定義)の並び）
+        crossed: dict[str, list[tuple[dict, ModelColumns]]] = {}
+        for annotation_node, cols in push_down_filters(after_annotations):
+            # 前にフィルターしかなければ、処理の直後にある
+            leading = all(is_filter(pushed) for pushed, _ in after_pushed)
+            if leading and is_filter(annotation_node) and cols.is_applicable:
+                namespace = cls.perform_calculate_pushdown_namespace(
+                    node_id,
+                    graph,
+                    filter_referenced_names(annotation_node, cols),
+                    parent_columns,
+                )
+                if namespace is not None and parent_columns[namespace].is_applicable:
+                    crossed.setdefault(namespace, []).append(
+                        (annotation_node, parent_columns[namespace].flush_values())
+                    )
+                    continue
+            after_pushed.append((annotation_node, cols))
+
+        before_pushed: list[tuple[str, dict, ModelColumns]] = []
+        namespaces = dict.fromkeys(
+            [namespace for namespace, _, _ in before_annotations] + list(crossed)
+        )
+        for namespace in namespaces:
+            annotations = [
+                (annotation_node, cols)
+                for annotation_namespace, annotation_node, cols in before_annotations
+                if annotation_namespace == namespace
+            ] + crossed.get(namespace, [])
+            before_pushed += [
+                (namespace, annotation_node, cols)
+                for annotation_node, cols in push_down_filters(annotations)
+            ]
+
+        original = cls.__annotation_positions(before_annotations, after_annotations)
+        pushed = cls.__annotation_positions(before_pushed, after_pushed)
+        filters = [
+            id(annotation_node)
+            for _, annotation_node, _ in before_annotations
+            if is_filter(annotation_node)
+        ] + [
+            id(annotation_node)
+            for annotation_node, _ in after_annotations
+            if is_filter(annotation_node)
+        ]
+        pushed_filters = sum(1 for key in filters if original[key] != pushed[key])
+        return before_pushed, after_pushed, len(filters), pushed_filters
 
     @classmethod
     def pre_generate_sql(cls, node_id: str, graph: DAG) -> dict[str, CTE]:
@@ -99,28 +379,26 @@ class AnnotationMixin(UnknownNodeMixin):
         for namespace, tbl in parent_tables.items():
             parent_stmts[namespace] = select(tbl).cte("source_" + namespace)
 
-        # 親のカラム定義を取得する
-        parent_columns = graph.get_all_parent_columns(node_id)
-
-        if not "beforeActionAnnotations" in node.raw_dict:
+        if is_filter_pushdown_enabled():
+            # afterActionAnnotationsから移ってくるフィルターがあるので、beforeActionAnnotationsがなくても計算する
+            before_annotations = cls.__push_down_filters(node_id, graph)[0]
+        elif not "beforeActionAnnotations" in node.raw_dict:
             return parent_stmts
+        else:
+            before_annotations = cls.__before_annotations(node_id, graph)
 
         # annotationの処理を各親テーブルに適用する。
         new_stmts = parent_stmts
-        new_cols = parent_columns
-        for annotation in node.raw_dict["beforeActionAnnotations"]:
-            converter = AnnotationConverterFactory.get_annotation_converter_by_type(
-                annotation["annotationNode"]["nodeType"]
-            )
-            flushed_new_cols = new_cols[annotation["namespace"]].flush_values()
-            new_cols[annotation["namespace"]] = converter.calculate_columns(
-                annotation["annotationNode"], flushed_new_cols
-            )
-            new_stmts[annotation["namespace"]] = converter.generate_statements(
-                annotation["annotationNode"],
+        # アノテーションのCTEをつくったネームスペース
+        annotated: set[str] = set()
+        for namespace, annotation_node, flushed_new_cols in before_annotations:
+            new_stmts[namespace] = generate_annotation_statements(
+                annotation_node,
                 flushed_new_cols,
-                new_stmts[annotation["namespace"]],
+                new_stmts[namespace],
+                namespace in annotated,
             )
+            annotated.add(namespace)
 
         return new_stmts
 
@@ -145,20 +423,34 @@ class AnnotationMixin(UnknownNodeMixin):
         node = graph.get_node_by_id(node_id)
         parent_tables = graph.get_parent_model_names(node_id)
 
-        if "afterActionAnnotations" in node.raw_dict:
-            for annotation in node.raw_dict["afterActionAnnotations"]:
-                converter = AnnotationConverterFactory.get_annotation_converter_by_type(
-                    annotation["annotationNode"]["nodeType"]
-                )
-                flushed_new_cols = calculated_columns.flush_values()
-                calculated_columns = converter.calculate_columns(
-                    annotation["annotationNode"], flushed_new_cols
-                )
-                generated_stmts = converter.generate_statements(
-                    annotation["annotationNode"], flushed_new_cols, generated_stmts
-                )
+        if is_filter_pushdown_enabled():
+            _, after_annotations, filters, pushed_filters = cls.__push_down_filters(
+                node_id, graph, calculated_columns
+            )
+            # pre_generate_sqlと同じ計算なので、件数はここでだけ数える
+            stats = get_filter_pushdown_stats()
+            stats.filters += filters
+            stats.pushed_filters += pushed_filters
+        else:
+            after_annotations = cls.__after_annotations(
+                node_id, graph, calculated_columns
+            )
+
+        for i, (annotation_node, flushed_new_cols) in enumerate(after_annotations):
+            generated_stmts = generate_annotation_statements(
+                annotation_node,
+                flushed_new_cols,
+                generated_stmts,
+                i > 0,
+            )
 
-        final_cte = select(generated_stmts).cte("final")
+        if node.pruned_columns:
+            # カラムを削減したステップは、必要なカラムだけを選択する
+            final_cte = select(
+                *[generated_stmts.c[name] for name in node.model_columns.names_list()]
+            ).cte("final")
+        else:
+            final_cte = select(generated_stmts).cte("final")
 
         return Sql.create_model_reference_model_sql_by_statements(
             final_cte, parent_tables
@@ -167,8 +459,15 @@ class AnnotationMixin(UnknownNodeMixin):
     @classmethod
     def perform_generate_dbt_models(cls, node_id: str, graph: DAG) -> DbtModels:
         node = graph.get_node_by_id(node_id)
-        pre_columns = cls.pre_calculate_column(node_id, graph)
-        calculated_columns = cls.perform_calculate_columns(node_id, graph, pre_columns)
+        # カラム定義の計算で記録した各ステップのカラム定義があれば、計算しなおさずに使いまわす
+        if node.annotation_columns.is_applicable:
+            pre_columns = dict(node.annotation_columns.parent_columns)
+            calculated_columns = node.annotation_columns.performed_columns
+        else:
+            pre_columns = cls.pre_calculate_column(node_id, graph)
+            calculated_columns = cls.perform_calculate_columns(
+                node_id, graph, pre_columns
+            )
 
         pre_stmts = cls.pre_generate_sql(node_id, graph)
         stmts = cls.perform_generate_sql(node_id, graph, pre_stmts, pre_columns)
@@ -176,4 +475,6 @@ class AnnotationMixin(UnknownNodeMixin):
 
         yml = cls.generate_model_yml(node_id, graph)
 
-        return DbtModels([DbtModel(sql, yml, node.model_name.value, "model")])
+        return cls.split_dbt_model(
+            node_id, graph, DbtModel(sql, yml, node.model_name.value, "model")
+        )
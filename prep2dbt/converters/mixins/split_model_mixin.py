@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import click
+from sqlalchemy.sql.selectable import CTE
+
+from prep2dbt.converters.mixins.yml_mixin import YmlMixin
+from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql
+from prep2dbt.models.graph import DAG
+
+# 実行中のモデルの分割の件数を保存する、click.Context.metaのキー
+MODEL_SPLIT_META_KEY = "prep2dbt.model_split"
+
+
+class ModelSplitStats:
+    """
+    モデルの分割の件数。1回の実行の中で数える。
+    """
+
+    def __init__(self) -> None:
+        self.split_models = 0  # 分割したモデルの数
+        self.intermediate_models = 0  # 切り出した中間モデルの数
+
+
+def get_max_cte_depth() -> int | None:
+    """実行時オプションの、モデルのCTEの深さの上限。分割しないならNone"""
+    return click.get_current_context().params.get("max_cte_depth")
+
+
+def get_model_split_stats() -> ModelSplitStats:
+    """
+    実行中のモデルの分割の件数を返す。
+    click.Contextごと（1回の実行ごと）につくり、metaに保存して使いまわす。
+    """
+    c = click.get_current_context()
+    stats = c.meta.get(MODEL_SPLIT_META_KEY)
+    if stats is None:
+        stats = ModelSplitStats()
+        c.meta[MODEL_SPLIT_META_KEY] = stats
+    return stats
+
+
+def calculate_cte_dependencies(cte: CTE) -> list[CTE]:
+    """CTEの中で直接参照するCTEを返す。参照先のCTEの中まではたどらない"""
+    dependencies: list[CTE] = []
+    visited: set[int] = set()
+    stack = list(cte.element.get_children())
+    while stack:
+        element = stack.pop()
+        if id(element) in visited:
+            continue
+        visited.add(id(element))
+        if isinstance(element, CTE):
+            dependencies.append(element)
+            continue
+        stack.extend(element.get_children())
+    return dependencies
+
+
+def calculate_split_ctes(root: CTE, max_depth: int) -> list[CTE]:
+    """
+    CTEの深さ（参照をたどったときに続くCTEの数）がmax_depthを超えないよう、別のモデルに切り出すCTEを計算する。
+    参照される側のCTEから順に深さを計算し、上限を超えるCTEでは、参照先のうち最も深いCTEから切り出す。
+    切り出したCTEは、別のモデルへの参照になるので、深さに数えない。rootは切り出さない。
+
+    Args:
+        root (CTE): モデルの最後のCTE
+        max_depth (int): CTEの深さの上限（2以上）
+
+    Returns:
+        list[CTE]: 切り出すCTE。参照される側のCTEから順に並べる
+    """
+    # 参照される側のCTEから順に並べる
+    dependencies: dict[CTE, list[CTE]] = {}
+    order: list[CTE] = []
+    stack: list[tuple[CTE, bool]] = [(root, False)]
+    while stack:
+        cte, visited = stack.pop()
+        if visited:
+            order.append(cte)
+            continue
+        if cte in dependencies:
+            continue
+        dependencies[cte] = calculate_cte_dependencies(cte)
+        stack.append((cte, True))
+        stack.extend((d, False) for d in dependencies[cte] if d not in dependencies)
+
+    depths: dict[CTE, int] = {}
+    split: set[CTE] = set()
+    for cte in order:
+        kept = [d for d in dependencies[cte] if d not in split]
+        while kept and 1 + max(depths[d] for d in kept) > max_depth:
+            deepest = max(kept, key=lambda d: depths[d])
+            split.add(deepest)
+            kept.remove(deepest)
+        depths[cte] = 1 + max((depths[d] for d in kept), default=0)
+    return [cte for cte in order if cte in split]
+
+
+class SplitModelMixin(YmlMixin):
+    """
+    CTEの深いモデルを、中間モデルに分割する機能を提供します。
+
+    ### Mixinの動作
+
+    実行時オプションでCTEの深さの上限（max_cte_depth）が指定され、モデルのCTEの深さが上限を超えるとき、
+    一部のCTEを中間モデルに切り出し、refタグで参照するようにします。
+    中間モデルの名前は、モデル名に「__split_連番」をつけたものです。連番は、参照される側の中間モデルから順にふります。
+    中間モデルのマテリアライズ（ephemeralかview）は、実行時オプション（split_materialized）で指定します。
+    """
+
+    @classmethod
+    def split_dbt_model(cls, node_id: str, graph: DAG, model: DbtModel) -> DbtModels:
+        """
+        モデルのCTEの深さが上限を超えていれば、中間モデルに分割する。
+        分割しないときは、モデルだけを返す。
+
+        Returns:
+            DbtModels: 中間モデルと、中間モデルを参照するように作りなおしたモデル
+        """
+        max_depth = get_max_cte_depth()
+        if (
+            max_depth is None
+            or model.sql is None
+            or not isinstance(model.sql.alchemy_statements, CTE)
+        ):
+            return DbtModels([model])
+        root = model.sql.alchemy_statements
+        split_ctes = calculate_split_ctes(root, max_depth)
+        if len(split_ctes) == 0:
+            return DbtModels([model])
+
+        ctx = click.get_current_context()
+        materialized = ctx.params.get("split_materialized", "ephemeral")
+        parent_tables = graph.get_parent_model_names(node_id)
+        cte_models = {
+            cte: "{0}__split_{1}".format(model.model_name, i + 1)
+            for i, cte in enumerate(split_ctes)
+        }
+
+        models = []
+        for cte in split_ctes:
+            model_name = cte_models[cte]
+            # 中間モデルは、切り出したCTEを最後のCTEにして、ほかの中間モデルを参照する
+            sql = Sql.create_model_reference_model_sql_by_statements(
+                cte,
+                parent_tables,
+                {c: name for c, name in cte_models.items() if c is not cte},
+            )
+            yml = cls.generate_intermediate_model_yml(
+                node_id, graph, model_name, list(cte.c.keys()), materialized
+            )
+            models.append(DbtModel(sql, yml, model_name, "model"))
+        sql = Sql.create_model_reference_model_sql_by_statements(
+            root, parent_tables, cte_models
+        )
+        models.append(replace(model, sql=sql))
+
+        stats = get_model_split_stats()
+        stats.split_models += 1
+        stats.intermediate_models += len(split_ctes)
+        return DbtModels(models)
@@ -4,12 +4,11 @@ from prep2dbt.converters.mixins.yml_mixin import YmlMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModel, DbtModels, Sql
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumns, ModelName, Node
+from prep2dbt.models.node import ModelColumns, ModelName, Node, NodeDict
 from prep2dbt.protocols.converter import Converter
-from prep2dbt.sqlalchemy_utils import compile_sql_statements
+from prep2dbt.sqlalchemy_utils import build_dbt_tags, compile_sql_statements
 from prep2dbt.sqlalchemy_utils import patched_select as select
 from prep2dbt.sqlalchemy_utils import patched_union_all as union_all
-from prep2dbt.sqlalchemy_utils import replace_table_name_to_jinja_tags
 
 
 class UnknownNodeMixin(YmlMixin, Converter):
@@ -42,7 +41,7 @@ class UnknownNodeMixin(YmlMixin, Converter):
     """
 
     @classmethod
-    def generate_unknown_graph(cls, node_dict: dict) -> DAG:
+    def generate_unknown_graph(cls, node_dict: NodeDict) -> DAG:
         """Unknown nodeからグラフを作成する。"""
         graph = DAG()
 
@@ -60,7 +59,7 @@ class UnknownNodeMixin(YmlMixin, Converter):
         return graph
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         """
         ノードをグラフに変換します。
 
@@ -76,7 +75,7 @@ class UnknownNodeMixin(YmlMixin, Converter):
         raise NotImplementedError()
 
     @classmethod
-    def generate_graph(cls, node_dict: dict) -> DAG:
+    def generate_graph(cls, node_dict: NodeDict) -> DAG:
         """ユーザ定義の変換仕様を試してみて、もし失敗したらUnknownNodeとして変換する。"""
         try:
             cls.validate(node_dict)
@@ -105,6 +104,50 @@ class UnknownNodeMixin(YmlMixin, Converter):
         except UnknownNodeException:
             return cls.calculate_unknown_columns(node_id, graph)
 
+    @classmethod
+    def calculate_node(cls, node_id: str, graph: DAG) -> Node:
+        node = graph.get_node_by_id(node_id)
+        return node.copy_with_model_columns(cls.calculate_columns(node_id, graph))
+
+    @classmethod
+    def calculate_unknown_required_columns(
+        cls, node_id: str, graph: DAG
+    ) -> dict[str, set[str]]:
+        """親のすべてのカラムを必要とする"""
+        return {
+            namespace: set(cols.names_list())
+            for namespace, cols in graph.get_all_parent_columns(node_id).items()
+        }
+
+    @classmethod
+    def perform_calculate_required_columns(
+        cls,
+        node_id: str,
+        graph: DAG,
+        required: set[str],
+        parent_columns: dict[str, ModelColumns] | None = None,
+    ) -> dict[str, set[str]]:
+        """実装しない場合は、親のすべてのカラムを必要とする"""
+        if parent_columns is None:
+            parent_columns = graph.get_all_parent_columns(node_id)
+        return {
+            namespace: set(cols.names_list())
+            for namespace, cols in parent_columns.items()
+        }
+
+    @classmethod
+    def calculate_required_columns(
+        cls, node_id: str, graph: DAG, required: set[str]
+    ) -> dict[str, set[str]]:
+        node = graph.get_node_by_id(node_id)
+        if not node.model_columns.is_applicable:
+            return cls.calculate_unknown_required_columns(node_id, graph)
+        try:
+            cls.validate(node.raw_dict)
+            return cls.perform_calculate_required_columns(node_id, graph, required)
+        except UnknownNodeException:
+            return cls.calculate_unknown_required_columns(node_id, graph)
+
     @classmethod
     def __generate_no_parents_sql(cls, node_id: str, graph: DAG) -> Sql:
         """親がいない場合のSQLを生成"""
@@ -148,11 +191,10 @@ class UnknownNodeMixin(YmlMixin, Converter):
             .cte("final")
         )
 
-        raw_sql = compile_sql_statements(stmts)
-        sql_text = replace_table_name_to_jinja_tags(
-            raw_sql, [parent_node.model_name.value], tag_type="model"
+        sql_text = compile_sql_statements(
+            stmts, build_dbt_tags([parent_node.model_name.value], tag_type="model")
         )
-        return Sql(stmts, raw_sql, sql_text)
+        return Sql(stmts, sql_text)
 
     @classmethod
     def __generate_multi_parents_sql(
@@ -167,14 +209,14 @@ class UnknownNodeMixin(YmlMixin, Converter):
         # 全部ユニオンする
         cte_stmts = (
             union_all(*tables)
-            .comment("このステップは変換仕様が未実装です。 " + graph.nodes[node_id]["data"].name)
+            .comment("このステップは変換仕様が未実装です。 " + graph.get_node_by_id(node_id).name)
             .cte("final")
         )
 
-        raw_sql = compile_sql_statements(cte_stmts)
-        sql_text = replace_table_name_to_jinja_tags(raw_sql, table_names, "model")
-
-        return Sql(cte_stmts, raw_sql, sql_text)
+        sql_text = compile_sql_statements(
+            cte_stmts, build_dbt_tags(table_names, "model")
+        )
+        return Sql(cte_stmts, sql_text)
 
     @classmethod
     def generate_unknown_sql(cls, node_id: str, graph: DAG) -> Sql:
@@ -1,8 +1,8 @@
-import json
 import os
 
 import click
 
+from prep2dbt.json_utils import get_json_backend
 from prep2dbt.models.dbt_models import Yml
 from prep2dbt.models.graph import DAG
 
@@ -23,7 +23,7 @@ class YmlMixin:
         description = (
             "```"
             + os.linesep
-            + json.dumps(node.raw_dict, indent=4, ensure_ascii=False)
+            + get_json_backend().dumps(node.raw_dict, indent=4, ensure_ascii=False)
             + os.linesep
             + "```"
         )
@@ -31,39 +31,56 @@ class YmlMixin:
         # カラムの生成
         columns = []
         if node.model_columns.is_applicable:
-            if len(node.model_columns.value) > 0:
-                for column in node.model_columns.value:
+            if len(node.model_columns.columns) > 0:
+                for column in node.model_columns.columns.values():
                     columns.append(
                         {"name": column.name, "description": column.data_type}
                     )
 
-        # タグの生成
-        ctx = click.get_current_context()
-        tag_str = ctx.params["tags"]
-        tags = []
-        if tag_str != "":
-            tags = tag_str.split(",")
-
         # docs colorの生成
         if node.model_columns.is_applicable:
             color = ""  # defualtの色
         else:
             color = "red"
 
-        raw_yaml_dict = {
-            "version": 2,
-            "models": [
-                {
-                    "name": node.model_name.value,
-                    "description": description,
-                    "columns": columns,
-                    "config": {"tags": tags},
-                    "docs": {"node_color": color},
-                }
-            ],
-        }
+        return cls.__generate_models_yml(
+            {
+                "name": node.model_name.value,
+                "description": description,
+                "columns": columns,
+                "config": {"tags": cls.__generate_tags()},
+                "docs": {"node_color": color},
+            }
+        )
 
-        return Yml(raw_yaml_dict)
+    @classmethod
+    def generate_intermediate_model_yml(
+        cls,
+        node_id: str,
+        graph: DAG,
+        model_name: str,
+        column_names: list[str],
+        materialized: str,
+    ) -> Yml:
+        """
+        ステップのモデルから切り出した、中間モデルのymlの作成
+        """
+        node = graph.get_node_by_id(node_id)
+
+        # descriptionの生成
+        description = "{0}（{1}）から切り出した中間モデルです。".format(node.model_name.value, node.name)
+
+        # カラムの生成。中間モデルのカラムの型は計算しないので、名前だけにする
+        columns = [{"name": str(name)} for name in column_names if name != "*"]
+
+        return cls.__generate_models_yml(
+            {
+                "name": model_name,
+                "description": description,
+                "columns": columns,
+                "config": {"tags": cls.__generate_tags(), "materialized": materialized},
+            }
+        )
 
     @classmethod
     def generate_source_yml(cls, node_id: str, graph: DAG) -> Yml:
@@ -77,28 +94,24 @@ class YmlMixin:
         description = (
             "```"
             + os.linesep
-            + json.dumps(node.raw_dict, indent=4)
+            + get_json_backend().dumps(node.raw_dict, indent=4)
             + os.linesep
             + "```"
         )
         # カラムの生成
         columns = []
         if node.model_columns.is_applicable:
-            if len(node.model_columns.value) > 0:
-                for column in node.model_columns.value:
+            if len(node.model_columns.columns) > 0:
+                for column in node.model_columns.columns.values():
                     columns.append(
                         {"name": column.name, "description": column.data_type}
                     )
 
         # タグの生成
-        ctx = click.get_current_context()
-        tag_str = ctx.params["tags"]
-        tags = []
-        if tag_str != "":
-            tags = tag_str.split(",")
+        tags = cls.__generate_tags()
 
         # ソース名の作成
-        source_name = ctx.params["source_name"]
+        source_name = click.get_current_context().params["source_name"]
 
         raw_yaml_dict = {
             "version": 2,
@@ -118,3 +131,16 @@ class YmlMixin:
         }
 
         return Yml(raw_yaml_dict)
+
+    @classmethod
+    def __generate_tags(cls) -> list[str]:
+        """実行時オプションのタグ（カンマ区切り）から、モデルにつけるタグを生成する"""
+        tag_str = click.get_current_context().params["tags"]
+        if tag_str == "":
+            return []
+        return tag_str.split(",")
+
+    @classmethod
+    def __generate_models_yml(cls, model: dict) -> Yml:
+        """モデル1つ分の定義から、model ymlを作成する"""
+        return Yml({"version": 2, "models": [model]})
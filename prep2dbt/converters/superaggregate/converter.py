@@ -4,7 +4,8 @@ from sqlalchemy.sql.selectable import CTE
 from prep2dbt.converters.mixins.annotation_mixin import AnnotationMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+from prep2dbt.models.node import (ModelColumn, ModelColumns, ModelName, Node,
+                                  NodeDict)
 from prep2dbt.sqlalchemy_utils import patched_select as select
 
 
@@ -49,7 +50,7 @@ class SuperAggregateConverter(AnnotationMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         if not "actionNode" in node_dict:
             raise UnknownNodeException("未知のノード")
         if (not "groupByFields" in node_dict["actionNode"]) or (
@@ -58,7 +59,7 @@ class SuperAggregateConverter(AnnotationMixin):
             raise UnknownNodeException("未知のノード")
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         graph = DAG()
         graph.add_node_with_edge(
             Node(
@@ -136,7 +137,27 @@ class SuperAggregateConverter(AnnotationMixin):
                 )
             new_columns.append(column)
 
-        return ModelColumns.calculated(set(new_columns))
+        return ModelColumns.calculated(new_columns)
+
+    @classmethod
+    def perform_calculate_required_columns(
+        cls,
+        node_id: str,
+        graph: DAG,
+        required: set[str],
+        parent_columns: dict[str, ModelColumns] | None = None,
+    ) -> dict[str, set[str]]:
+        if parent_columns is None or len(parent_columns) != 1:
+            raise UnknownNodeException("未知のノード")
+        node = graph.get_node_by_id(node_id)
+
+        # 集計後に不要なカラムでも、グループ化と集計には使う
+        names = set()
+        for group_by_field in node.raw_dict["actionNode"]["groupByFields"]:
+            names.add(group_by_field["columnName"])
+        for aggregate_field in node.raw_dict["actionNode"]["aggregateFields"]:
+            names.add(aggregate_field["columnName"])
+        return {namespace: names for namespace in parent_columns.keys()}
 
     @classmethod
     def perform_generate_sql(
@@ -4,7 +4,9 @@ from sqlalchemy.sql.selectable import CTE
 from prep2dbt.converters.mixins.annotation_mixin import AnnotationMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+from prep2dbt.models.node import (ModelColumn, ModelColumns, ModelName, Node,
+                                  NodeDict)
+from prep2dbt.utils import referenced_names
 
 
 class SuperJoinConverter(AnnotationMixin):
@@ -119,7 +121,7 @@ class SuperJoinConverter(AnnotationMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         if not "actionNode" in node_dict:
             raise UnknownNodeException("未知のノード")
         if (not "conditions" in node_dict["actionNode"]) or (
@@ -128,7 +130,7 @@ class SuperJoinConverter(AnnotationMixin):
             raise UnknownNodeException("未知のノード")
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         graph = DAG()
         graph.add_node_with_edge(
             Node(
@@ -147,7 +149,7 @@ class SuperJoinConverter(AnnotationMixin):
         new_cols = left_columns
         # 右側テーブルの列ごとに、左側に同名があるか確かめ、もしあれば後ろに'-1'をつける
         for right_column_name in right_columns.names_list():
-            if not right_column_name in left_columns.names_list():
+            if not left_columns.has_column_by_name(right_column_name):
                 new_cols = new_cols.add(
                     right_columns.get_column_by_name(right_column_name)
                 )
@@ -181,6 +183,82 @@ class SuperJoinConverter(AnnotationMixin):
 
         return cls.__calculate_columns(left_columns, right_columns)
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls,
+        node_id: str,
+        graph: DAG,
+        required: set[str],
+        parent_columns: dict[str, ModelColumns] | None = None,
+    ) -> dict[str, set[str]]:
+        if parent_columns is None:
+            raise UnknownNodeException("未知のノード")
+        if (not "Left" in parent_columns.keys()) or (
+            not "Right" in parent_columns.keys()
+        ):
+            raise UnknownNodeException("未知のノード")
+
+        node = graph.get_node_by_id(node_id)
+        left_names = set(parent_columns["Left"].names_list())
+        right_names = set(parent_columns["Right"].names_list())
+
+        # 結合条件は列名を修飾しないので、参照している列名は両側で必要とみなす
+        referenced = set()
+        for condition in node.raw_dict["actionNode"]["conditions"]:
+            for expression in [
+                condition["leftExpression"],
+                condition["rightExpression"],
+            ]:
+                referenced |= referenced_names(expression, left_names | right_names)
+
+        left_required = (required | referenced) & left_names
+        right_required = referenced & right_names
+        for right_column_name in right_names:
+            if not right_column_name in left_names:
+                if right_column_name in required:
+                    right_required.add(right_column_name)
+            elif right_column_name + "-1" in required:
+                # 左側に同名のカラムが残らないと、'-1'がつかず列名が変わってしまう
+                right_required.add(right_column_name)
+                left_required.add(right_column_name)
+
+        return {"Left": left_required, "Right": right_required}
+
+    @classmethod
+    def perform_calculate_pushdown_namespace(
+        cls,
+        node_id: str,
+        graph: DAG,
+        referenced: set[str],
+        parent_columns: dict[str, ModelColumns],
+    ) -> str | None:
+        if (not "Left" in parent_columns.keys()) or (
+            not "Right" in parent_columns.keys()
+        ):
+            return None
+
+        node = graph.get_node_by_id(node_id)
+        join_type = node.raw_dict["actionNode"]["joinType"]
+        left_names = set(parent_columns["Left"].names_list())
+        right_names = set(parent_columns["Right"].names_list())
+        # 右側のカラムに'-1'をつけた列名は、左側と同名でも右側の値なので、左側の列名とはみなさない
+        renamed = {name + "-1" for name in left_names & right_names}
+        if len(referenced & renamed) > 0:
+            return None
+
+        # 結合で値がNULLで補われない側だけに、フィルターを移せる。
+        # 左側のカラムだけを参照するなら、内部・左・左（不一致のみ）結合で左側へ移せる
+        if referenced <= left_names and join_type in ["inner", "left", "leftOnly"]:
+            return "Left"
+        # 右側だけにあるカラムだけを参照するなら、内部・右・右（不一致のみ）結合で右側へ移せる
+        if referenced <= right_names - left_names and join_type in [
+            "inner",
+            "right",
+            "rightOnly",
+        ]:
+            return "Right"
+        return None
+
     @classmethod
     def __calculate_conditions(cls, conditions: list) -> list:
         results = []
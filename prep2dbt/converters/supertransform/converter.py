@@ -3,7 +3,7 @@ from sqlalchemy.sql.selectable import CTE
 from prep2dbt.converters.mixins.annotation_mixin import AnnotationMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumns, ModelName, Node
+from prep2dbt.models.node import ModelColumns, ModelName, Node, NodeDict
 
 
 class SuperTransformConverter(AnnotationMixin):
@@ -38,12 +38,12 @@ class SuperTransformConverter(AnnotationMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         if not "beforeActionAnnotations" in node_dict:
             raise UnknownNodeException("未知のノード")
 
     @classmethod
-    def perform_generate_graph(cls, node_dict: dict) -> DAG:
+    def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
         graph = DAG()
         graph.add_node_with_edge(
             Node(
@@ -72,6 +72,35 @@ class SuperTransformConverter(AnnotationMixin):
             raise UnknownNodeException("未知のノード")
         return list(parent_columns.values())[0]
 
+    @classmethod
+    def perform_calculate_required_columns(
+        cls,
+        node_id: str,
+        graph: DAG,
+        required: set[str],
+        parent_columns: dict[str, ModelColumns] | None = None,
+    ) -> dict[str, set[str]]:
+        if parent_columns is None or len(parent_columns) != 1:
+            raise UnknownNodeException("未知のノード")
+        # 親のカラムをそのまま引き継ぐので、必要なカラムも同じ
+        return {namespace: set(required) for namespace in parent_columns.keys()}
+
+    @classmethod
+    def perform_calculate_pushdown_namespace(
+        cls,
+        node_id: str,
+        graph: DAG,
+        referenced: set[str],
+        parent_columns: dict[str, ModelColumns],
+    ) -> str | None:
+        if len(parent_columns) != 1:
+            return None
+        # 親のカラムをそのまま引き継ぐので、afterActionAnnotationsのフィルターは、そのまま前へ移せる
+        namespace, cols = list(parent_columns.items())[0]
+        if not referenced <= set(cols.names_list()):
+            return None
+        return namespace
+
     @classmethod
     def perform_generate_sql(
         cls,
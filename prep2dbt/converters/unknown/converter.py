@@ -2,7 +2,7 @@ from prep2dbt.converters.mixins.unknown_node_mixin import UnknownNodeMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModels
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumns
+from prep2dbt.models.node import ModelColumns, NodeDict
 
 
 class UnknownConverter(UnknownNodeMixin):
@@ -12,17 +12,23 @@ class UnknownConverter(UnknownNodeMixin):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         raise UnknownNodeException("未知のノードです。")
 
     @classmethod
-    def generate_graph(cls, node_dict: dict) -> DAG:
+    def generate_graph(cls, node_dict: NodeDict) -> DAG:
         return cls.generate_unknown_graph(node_dict)
 
     @classmethod
     def calculate_columns(cls, node_id: str, graph: DAG) -> ModelColumns:
         return cls.calculate_unknown_columns(node_id, graph)
 
+    @classmethod
+    def calculate_required_columns(
+        cls, node_id: str, graph: DAG, required: set[str]
+    ) -> dict[str, set[str]]:
+        return cls.calculate_unknown_required_columns(node_id, graph)
+
     @classmethod
     def generate_dbt_models(cls, node_id: str, graph: DAG) -> DbtModels:
         return cls.generate_unknown_dbt_models(node_id, graph)
@@ -1,81 +1,157 @@
 import json
 import os
 import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
 
 import click
-import pandas as pd
 
 from prep2dbt.converters.factory import ConverterFactory
 from prep2dbt.exceptions import (NoFlowFileExistsException,
                                  UnknownJsonFormatException)
+from prep2dbt.json_utils import FlowNodeReader
+from prep2dbt.models.compact_graph import CompactDAG
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelName
+from prep2dbt.models.node import (AnnotationColumns, ModelColumns, ModelName,
+                                  NodeDict)
+
+# フローファイル（zip）内の、フロー定義ファイルのエントリ名
+FLOW_MEMBER_NAME = "flow"
+# フロー定義ファイル以外で、フローファイルに常に含まれるメタデータのエントリ名
+FLOW_METADATA_MEMBER_NAMES = [
+    "displaySettings",
+    "flowGraphImage.png",
+    "flowGraphThumbnail.svg",
+    "maestroMetadata",
+]
+
+# stableな採番で、採番したモデル名を保存するファイル名
+MODEL_NAME_MAP_FILE_NAME = "model_names.json"
 
 
 def __prepare_working_directories(work_dir: str) -> None:
     """
     作業ディレクトリの作成を行います。
-    - work_dir/tmp
     - work_dir/outputs
 
     もしすでにディレクトリがあれば、削除して新たに作成します。
     """
-    TMP_FOLDER_PATH = os.path.join(work_dir, "tmp")
     OUTPUTS_FOLDER_PATH = os.path.join(work_dir, "outputs")
-    if os.path.exists(TMP_FOLDER_PATH):
-        shutil.rmtree(TMP_FOLDER_PATH)
     if os.path.exists(OUTPUTS_FOLDER_PATH):
         shutil.rmtree(OUTPUTS_FOLDER_PATH)
-    os.makedirs(TMP_FOLDER_PATH)
     os.makedirs(OUTPUTS_FOLDER_PATH)
 
 
-def __copy_flow_file_to_working_dir(flow_file: str, work_dir: str) -> None:
-    """フローファイルをzip形式でコピーします。"""
-    shutil.copyfile(flow_file, os.path.join(work_dir, "tmp", "tmp.zip"))
-
-
-def __unzip_flow_file(work_dir: str) -> None:
-    """Zipを解凍します。"""
-    shutil.unpack_archive(
-        os.path.join(work_dir, "tmp", "tmp.zip"), os.path.join(work_dir, "tmp")
+def __collect_skipped_members(archive: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """
+    パッケージドフロー（.tflx）に同梱された、読み込まずにスキップするデータファイルの一覧を取得する。
+    フロー定義ファイルとメタデータ、ディレクトリのエントリは含まない。
+    """
+    return [
+        info
+        for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename != FLOW_MEMBER_NAME
+        and info.filename not in FLOW_METADATA_MEMBER_NAMES
+    ]
+
+
+def __report_skipped_members(skipped_members: list[zipfile.ZipInfo]) -> None:
+    """スキップしたデータファイルのサイズを出力する。"""
+    if len(skipped_members) == 0:
+        return
+
+    total_size = sum([info.file_size for info in skipped_members])
+    click.echo(
+        "パッケージされたデータファイル{0}件（{1:.1f} MB）は読み込まずにスキップしました。".format(
+            len(skipped_members), total_size / 1024 / 1024
+        )
     )
+    for info in skipped_members:
+        click.echo(
+            "  - {0} ({1:.1f} MB)".format(info.filename, info.file_size / 1024 / 1024)
+        )
 
 
-def __ensure_flow_internal_file_is_available(work_dir: str) -> None:
+def __inspect_flow_file(flow_file: str) -> None:
     """
-    解凍したファイルの中に、フロー定義ファイルが存在し、使えることを確認します。
+    フローファイル（zip形式）の中に、フロー定義ファイルが存在し、使えることを確認します。
+    同梱されたデータファイルは読み込まず、サイズだけを報告してスキップする。
     """
-    if not os.path.exists(os.path.join(work_dir, "tmp", "flow")):
-        raise NoFlowFileExistsException("指定されたフローファイルの内部に有効な定義ファイルを発見できませんでした。")
+    try:
+        with zipfile.ZipFile(flow_file) as archive:
+            if not FLOW_MEMBER_NAME in archive.namelist():
+                raise NoFlowFileExistsException("指定されたフローファイルの内部に有効な定義ファイルを発見できませんでした。")
+            __report_skipped_members(__collect_skipped_members(archive))
+    except zipfile.BadZipFile:
+        raise NoFlowFileExistsException("{}はzip形式として読み込めませんでした。".format(flow_file))
 
 
-def __read_flow_file(work_dir: str) -> dict:
-    """フローファイルを読み込む"""
-    with open(os.path.join(work_dir, "tmp", "flow"), encoding="UTF-8") as f:
-        res = json.load(f)
-
-    return res
+def __read_flow_file(flow_file: str) -> Iterator[NodeDict]:
+    """
+    フローファイル（zip形式）の"flow"エントリを、ディスクへ展開せずに先頭から少しずつ読み込み、
+    ノードの定義を1件ずつ返す。
+    ノードの定義は、要素にアクセスされるまでjsonのバイト列のまま保持する（LazyRawDict）。
+    """
+    with zipfile.ZipFile(flow_file) as archive:
+        with archive.open(FLOW_MEMBER_NAME) as f:
+            yield from FlowNodeReader(f).iter_lazy_nodes()
 
 
-def before_execute_action() -> dict:
+def before_execute_action() -> Iterator[NodeDict]:
     """
     実行前準備をします。ここで行う作業はすべて、以下を前提にして書いてあります。
-    1. ディレクトリは、一時ファイルを作成するtmpと、成果物を吐き出すoutputsの２つであり、それぞれオプションで指定されるwork_dirの配下にできる。
-    2. 与えられるフローファイルはtmp配下にzip形式でコピー、解凍される。
-    3. フローファイルを解凍すると、"flow"という名前のjsonファイルが取り出せる。
+    1. 成果物を吐き出すoutputsディレクトリが、オプションで指定されるwork_dirの配下にできる。
+    2. 与えられるフローファイルはzip形式であり、"flow"という名前のjsonファイルを含んでいる。
+    3. "flow"はアーカイブから直接読み込まれ、作業ディレクトリへの展開は行わない。
 
     Returns:
-        dict: フローファイルを解凍した結果えられるjsonの中身
+        Iterator[NodeDict]: フローファイルの"flow"エントリに含まれるノードの定義。読み込みながら1件ずつ返される。
     """
     c = click.get_current_context()
     work_dir = c.params["work_dir"]
     flow_file = c.params["flow_file"]
     __prepare_working_directories(work_dir)
-    __copy_flow_file_to_working_dir(flow_file, work_dir)
-    __unzip_flow_file(work_dir)
-    __ensure_flow_internal_file_is_available(work_dir)
-    return __read_flow_file(work_dir)
+    __inspect_flow_file(flow_file)
+    return __read_flow_file(flow_file)
+
+
+def __create_graph() -> DAG:
+    """
+    実行時オプションで指定された実装の、空のDAGを作成する。
+    指定がなければ、networkxによる実装を使う。
+    """
+    ctx = click.get_current_context(silent=True)
+    backend = ctx.params.get("graph_backend", "networkx") if ctx else "networkx"
+    if backend == "compact":
+        return CompactDAG()
+    return DAG()
+
+
+def convert_nodes_to_graph(node_dicts: Iterable[NodeDict]) -> DAG:
+    """
+    ノードの定義を1件ずつ受け取り、DAGへ変換します。
+    node_dictsにイテレータを渡すと、フロー定義ファイルを読み込みながらグラフを組み立てられます。
+
+    Args:
+        node_dicts (Iterable[NodeDict]): ノードの定義
+
+    Returns:
+        DAG: 変換された結果
+    """
+    graph = __create_graph()
+    for node_dict in node_dicts:
+        # 各ノードに対応した変換仕様を取得
+        converter = ConverterFactory.get_converter_by_type(node_dict["nodeType"])
+
+        # グラフに変換
+        subgraph = converter.generate_graph(node_dict)
+
+        # グラフをマージ（グラフ全体をコピーしないよう、直接追加する）
+        graph.add_subgraph(subgraph)
+
+    return graph
 
 
 def convert_to_graph(file_dict: dict) -> DAG:
@@ -97,18 +173,7 @@ def convert_to_graph(file_dict: dict) -> DAG:
             "変換に失敗しました。使用しているフローのバージョンが、変換ツールの対応済みバージョンかどうか確認してください。"
         )
 
-    graph = DAG()
-    for node_dict in file_dict["nodes"].values():
-        # 各ノードに対応した変換仕様を取得
-        converter = ConverterFactory.get_converter_by_type(node_dict["nodeType"])
-
-        # グラフに変換
-        subgraph = converter.generate_graph(node_dict)
-
-        # グラフをマージ
-        graph = graph.merge(subgraph)
-
-    return graph
+    return convert_nodes_to_graph(file_dict["nodes"].values())
 
 
 def calculate_columns(graph: DAG) -> None:
@@ -132,25 +197,146 @@ def calculate_columns(graph: DAG) -> None:
     child_model : 列の追加() first_name + last_name as full_name
     ```
 
+    同じ世代のノードは互いに依存しないため、世代ごとにまとめて計算してから、一度にグラフへ反映します。
+    実行時オプションのjobsが2以上なら、同じ世代のノードを複数のプロセスで並列に計算します。
+
     Args:
         graph (DAG): DAG
     """
-    # ルートからの深さ順にまとまったノードのセットをつくる
-    nodes_per_generation = graph.nodes_per_generation()
+    ctx = click.get_current_context(silent=True)
+    jobs = ctx.params.get("jobs", 1) if ctx else 1
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    try:
+        # ルートからの深さ順にまとまったノードのセットをつくる
+        for node_set in graph.nodes_per_generation():
+            # モデルのカラム定義が定義済みのノードは、スキップ
+            node_ids = [
+                node_id
+                for node_id in node_set
+                if not graph.get_node_by_id(node_id).model_columns.is_applicable
+            ]
+            results = list(__iter_calculated_columns(node_ids, graph, executor, jobs))
+
+            # 世代ごとに、カラム情報と各アノテーションのカラム定義を更新していく
+            for node_id, (cols, annotation_cols) in results:
+                node = graph.get_node_by_id(node_id)
+                graph.add_node(
+                    node.copy_with_model_columns(cols).copy_with_annotation_columns(
+                        annotation_cols
+                    )
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def calculate_node_columns(
+    params: tuple[str, DAG]
+) -> tuple[ModelColumns, AnnotationColumns]:
+    """
+    ノード1つのカラム定義と、SQLの生成で使いまわす各アノテーションのカラム定義を計算します。
+    並列に計算する場合は、ワーカープロセスで実行されます。
+    """
+    node_id, graph = params
+    node = graph.get_node_by_id(node_id)
+    converter = ConverterFactory.get_converter_by_type(node.node_type)
+    calculated_node = converter.calculate_node(node_id, graph)
+    return calculated_node.model_columns, calculated_node.annotation_columns
+
+
+def __iter_calculated_columns(
+    node_ids: list[str],
+    graph: DAG,
+    executor: ProcessPoolExecutor | None,
+    jobs: int,
+) -> Iterator[tuple[str, tuple[ModelColumns, AnnotationColumns]]]:
+    """
+    同じ世代のノードのカラム定義を計算し、ノードIDとの組にして返します。
+    ワーカープロセスには、グラフ全体ではなくノードと親だけのサブグラフを渡します。
+    """
+    if executor is None or len(node_ids) < 2:
+        for node_id in node_ids:
+            yield node_id, calculate_node_columns((node_id, graph))
+        return
+
+    tasks = [(node_id, graph.get_parent_subgraph(node_id)) for node_id in node_ids]
+    chunksize = max(1, len(tasks) // (jobs * 4))
+    yield from zip(
+        node_ids, executor.map(calculate_node_columns, tasks, chunksize=chunksize)
+    )
+
 
-    for node_set in nodes_per_generation:
-        # 世代ごとに、カラム情報を更新していく
-        for node_id in node_set:
-            node = graph.get_node_by_id(node_id)
-            if node.model_columns.is_applicable:
-                # モデルのカラム定義が定義済みだったら、スキップ
-                continue
+def __clean_name(name: str) -> str:
+    """ステップ名から、モデル名に使えない空白とスラッシュを取り除く"""
+    return name.replace(" ", "").replace("/", "")
 
-            converter = ConverterFactory.get_converter_by_type(node.node_type)
-            cols = converter.calculate_columns(node_id, graph)
 
-            new_node = node.copy_with_model_columns(cols)
-            graph.add_node(new_node)
+def __assign_sequential_names(
+    ids_per_name: dict[str, list[str]], prefix: str
+) -> dict[str, str]:
+    """
+    同じ名前のステップの中でのノードIDの昇順に、1から連番をふる。
+    これまでと同じモデル名になるよう、空白などを取り除く前のステップ名ごとに連番をふる。
+    """
+    result = {}
+    for name, node_ids in ids_per_name.items():
+        base_name = __clean_name(name)
+        for seq, node_id in enumerate(sorted(node_ids), start=1):
+            result[node_id] = "{}{}_{}".format(prefix, base_name, seq)
+    return result
+
+
+def __load_name_map(path: str) -> dict[str, str]:
+    """前回の変換で採番したモデル名（ノードID -> モデル名）を読み込む。なければ空"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="UTF-8") as f:
+            name_map = json.load(f)
+    except ValueError:
+        name_map = None
+    if not isinstance(name_map, dict):
+        # JSONとして読めても、オブジェクトでなければ（[]やnullなど）使えない
+        click.echo("{}が読み込めないため、モデル名を採番しなおします。".format(path))
+        return {}
+    return {str(node_id): str(name) for node_id, name in name_map.items()}
+
+
+def __assign_stable_names(
+    ids_per_name: dict[str, list[str]], prefix: str, name_map: dict[str, str]
+) -> dict[str, str]:
+    """
+    前回の変換で採番したモデル名を、ノードIDをキーにして引き継ぐ。
+    ステップ名が変わっていないノードは、前回と同じモデル名になる。
+    新しいノードと、ステップ名が変わったノードには、まだ使われていない最小の連番をふる。
+    空白などを取り除いたステップ名ごとに連番をふるので、「a b」と「ab」のモデル名は重ならない。
+    """
+    ids_per_base_name: dict[str, list[str]] = {}
+    for name, node_ids in ids_per_name.items():
+        ids_per_base_name.setdefault(__clean_name(name), []).extend(node_ids)
+
+    result = {}
+    for base_name, node_ids in ids_per_base_name.items():
+        head = "{}{}_".format(prefix, base_name)
+        used = set()
+        new_ids = []
+        for node_id in sorted(node_ids):
+            previous = name_map.get(node_id, "")
+            seq = previous[len(head) :]
+            if previous.startswith(head) and seq.isdigit() and previous not in used:
+                result[node_id] = previous
+                used.add(previous)
+            else:
+                new_ids.append(node_id)
+
+        seq_no = 1
+        for node_id in new_ids:
+            while "{}{}".format(head, seq_no) in used:
+                seq_no += 1
+            result[node_id] = "{}{}".format(head, seq_no)
+            used.add(result[node_id])
+    return result
 
 
 def build_model_name(graph: DAG) -> None:
@@ -160,33 +346,35 @@ def build_model_name(graph: DAG) -> None:
     ステップ名ごとに連番をふる（同じ名前のステップに対して、name_1,name_2,...と、連番で名前を分ける）。
     また、実行時オプションでprefixが付与されている時は、そのprefixを先頭に追加する。
 
+    連番のふり方は、実行時オプションのnamingで切り替える。
+    - sequential : 同じ名前のステップの中でのノードIDの昇順に、1から連番をふる。
+    - stable : 作業ディレクトリに保存したモデル名を、ノードIDをキーにして引き継ぐ。
+      ステップを追加・削除しても、変更のないステップのモデル名は変わらない。
+
     Args:
         graph (DAG): DAG
     """
-    df = pd.DataFrame()
+    # ステップ名ごとに、ノードIDをまとめる
+    ids_per_name: dict[str, list[str]] = {}
     for node_id in graph.nodes:
         node = graph.get_node_by_id(node_id)
-        df = pd.concat([df, pd.DataFrame({"name": [node.name], "id": [node_id]})])
-
-    # 同名のノード名ごとで集計して、連番をふる
-    df["unique_id"] = df.groupby(["name"])["id"].transform(
-        lambda x: pd.CategoricalIndex(x).codes + 1
-    )
-    # ノード名 + 連番をモデル名とする
-    df["model_name"] = (
-        df["name"].apply(lambda x: str(x).replace(" ", "").replace("/", ""))
-        + "_"
-        + df["unique_id"].apply(lambda x: str(x))
-    )
+        ids_per_name.setdefault(str(node.name), []).append(node_id)
 
     # prefixをつける
     ctx = click.get_current_context()
     prefix = ctx.params["prefix"] if "prefix" in ctx.params else ""
     if prefix != "":
-        df["model_name"] = prefix + "__" + df["model_name"]
+        prefix = prefix + "__"
 
-    for node_id in graph.nodes:
-        model_name = df[df["id"] == node_id].iloc[0]["model_name"]
+    if ctx.params.get("naming", "sequential") == "stable":
+        path = os.path.join(ctx.params["work_dir"], MODEL_NAME_MAP_FILE_NAME)
+        model_names = __assign_stable_names(ids_per_name, prefix, __load_name_map(path))
+        with open(path, mode="w", encoding="UTF-8") as f:
+            json.dump(model_names, f, indent=4, ensure_ascii=False)
+    else:
+        model_names = __assign_sequential_names(ids_per_name, prefix)
+
+    for node_id, model_name in model_names.items():
         node = graph.get_node_by_id(node_id)
         new_node = node.copy_with_model_name(ModelName.calculated(model_name))
         graph.add_node(new_node)
@@ -2,24 +2,86 @@ import os
 
 import click
 
+from prep2dbt.cache_services import (NodeCache, close_node_cache,
+                                     open_node_cache)
+from prep2dbt.converters.annotations.filter_pushdown import (
+    get_filter_pushdown_stats, is_filter_pushdown_enabled)
+from prep2dbt.converters.annotations.projection_fusion import (
+    get_projection_fusion_stats, is_projection_fusion_enabled)
 from prep2dbt.converters.factory import ConverterFactory
-from prep2dbt.models.dbt_models import DbtModels
+from prep2dbt.converters.mixins.split_model_mixin import (
+    get_max_cte_depth, get_model_split_stats)
+from prep2dbt.models.dbt_models import DbtModel, DbtModels
 from prep2dbt.models.graph import DAG
 from prep2dbt.utils import center, flex
 
 
+def generate_node_dbt_models(
+    node_id: str, graph: DAG, node_cache: NodeCache | None = None
+) -> DbtModels:
+    """
+    ノード1つをdbtモデルに変換する。キャッシュが渡されたら、キャッシュの変換結果を使いまわす。
+    """
+    node = graph.get_node_by_id(node_id)
+    converter = ConverterFactory.get_converter_by_type(node.node_type)
+    if node_cache is not None:
+        return node_cache.get_or_generate(converter, node_id, graph)
+    return converter.generate_dbt_models(node_id, graph)
+
+
 def generate_dbt_models(graph: DAG) -> DbtModels:
     """
-    グラフをdbtモデルに変換する
+    グラフをdbtモデルに変換する。
+    実行時オプションでキャッシュが有効なら、ステップ単位の変換結果のキャッシュを使う。
     """
+    node_cache = open_node_cache()
     models = DbtModels([])
     for node_id in graph.nodes:
-        node = graph.get_node_by_id(node_id)
-        converter = ConverterFactory.get_converter_by_type(node.node_type)
-        models = models.merge(converter.generate_dbt_models(node_id, graph))
+        models = models.merge(generate_node_dbt_models(node_id, graph, node_cache))
+    if node_cache is not None:
+        close_node_cache(node_cache)
+    output_filter_pushdown_stats()
+    output_projection_fusion_stats()
+    output_model_split_stats()
     return models
 
 
+def output_filter_pushdown_stats() -> None:
+    """フィルターの押し下げが有効なら、前に移したフィルターの数を出力する"""
+    if not is_filter_pushdown_enabled():
+        return
+    stats = get_filter_pushdown_stats()
+    click.echo(
+        "フィルターの押し下げ: {0}件のフィルターのうち、{1}件をソースの近くへ移しました。".format(
+            stats.filters, stats.pushed_filters
+        )
+    )
+
+
+def output_projection_fusion_stats() -> None:
+    """射影の統合が有効なら、統合して取り除いたCTEの数を出力する"""
+    if not is_projection_fusion_enabled():
+        return
+    stats = get_projection_fusion_stats()
+    click.echo(
+        "射影の統合: アノテーションの{0}件のCTEのうち、{1}件を統合して取り除きました。".format(
+            stats.annotation_ctes, stats.fused_ctes
+        )
+    )
+
+
+def output_model_split_stats() -> None:
+    """モデルの分割が有効なら、分割したモデルと切り出した中間モデルの数を出力する"""
+    if get_max_cte_depth() is None:
+        return
+    stats = get_model_split_stats()
+    click.echo(
+        "モデルの分割: {0}件のモデルを分割し、{1}件の中間モデルを切り出しました。".format(
+            stats.split_models, stats.intermediate_models
+        )
+    )
+
+
 def output_dbt_files(models: DbtModels) -> None:
     """
     dbtモデルをファイルへ書き出す
@@ -37,6 +99,35 @@ def output_dbt_files(models: DbtModels) -> None:
         model.yml.write(os.path.join(work_dir, "outputs", model.model_name + ".yml"))
 
 
+def output_file_names(model: DbtModel) -> list[str]:
+    """
+    output_dbt_filesで、dbtモデルを書き出すファイル名を返す
+    """
+    file_names = []
+    if model.sql is not None:
+        file_names.append(model.model_name + ".sql")
+    file_names.append(model.model_name + ".yml")
+    return file_names
+
+
+def count_results(graph: DAG) -> tuple[int, int, int]:
+    """
+    処理したステップを、成功・警告・失敗に分けて数える
+    """
+    passed = 0
+    warning = 0
+    failed = 0
+    for node_id in graph.nodes:
+        node = graph.get_node_by_id(node_id)
+        if node.is_unknown:
+            failed += 1
+        elif node.model_columns.is_applicable:
+            passed += 1
+        else:
+            warning += 1
+    return passed, warning, failed
+
+
 def print_results(graph: DAG, models: DbtModels) -> None:
     import shutil
 
@@ -1,7 +1,6 @@
 import os
 
 import click
-import networkx as nx
 
 from prep2dbt.models.graph import DAG
 from prep2dbt.models.metrics import Metrics, NodeMetrics
@@ -9,29 +8,35 @@ from prep2dbt.models.metrics import Metrics, NodeMetrics
 
 def calculate_node_and_edge_count(dag: DAG) -> tuple[int, int]:
     """ノード数とエッジ数を計算する"""
-    graph = dag.graph
-    total_nodes = graph.number_of_nodes()
-    total_edges = graph.number_of_edges()
+    total_nodes = len(dag.nodes)
+    total_edges = len(dag.edges)
 
     return total_nodes, total_edges
 
 
 def calculate_source_and_sink_count(dag: DAG) -> tuple[int, int]:
     """入出力のノードの数を数える"""
-    graph = dag.graph
-    source = len([node for node in graph.nodes if graph.in_degree(node) == 0])
-    sink = len([node for node in graph.nodes if graph.out_degree(node) == 0])
+    source = len([node for node in dag.nodes if len(dag.get_parent_ids(node)) == 0])
+    sink = len([node for node in dag.nodes if len(dag.get_child_ids(node)) == 0])
     return source, sink
 
 
+def calculate_degrees(dag: DAG) -> list[int]:
+    """ノードごとの次数（入次数と出次数の和）を計算する"""
+    return [
+        len(dag.get_parent_ids(node)) + len(dag.get_child_ids(node))
+        for node in dag.nodes
+    ]
+
+
 def calculate_depth_and_width(dag: DAG) -> tuple[int, int]:
     """深さと幅を計算する"""
-    graph = dag.graph
+    topology = dag.topology
     # レベルごとにノード総数を計算し、最大値をとる
-    levels = list(nx.topological_generations(graph))
-    width = max([len(nodes) for nodes in levels])
+    width = max([len(nodes) for nodes in topology.generations])
 
-    depth = nx.dag_longest_path_length(graph) + 1
+    # 世代の数は、最長パスのノード数と等しい
+    depth = topology.depth
 
     return depth, width
 
@@ -52,8 +57,7 @@ def calculate_density(dag: DAG) -> float:
 
 def calculate_average_degree(dag: DAG) -> float:
     """平均次数を計算する"""
-    graph = dag.graph
-    degree = list(dict(graph.degree()).values())
+    degree = calculate_degrees(dag)
     # 平均次数
     average_degree = sum(degree) / len(degree)
     return average_degree
@@ -61,11 +65,10 @@ def calculate_average_degree(dag: DAG) -> float:
 
 def calculate_entropy(dag: DAG) -> float:
     """エントロピーを計算する。"""
-    graph = dag.graph
     import math
 
     # ノードの次数
-    degrees = list(dict(graph.degree()).values())
+    degrees = calculate_degrees(dag)
 
     # 次数の出現確率を計算
     sum(degrees)
@@ -88,7 +91,6 @@ def calculate_metrics(dag: DAG) -> Metrics:
     """
     グラフの統計情報を収集します
     """
-    graph = dag.graph
     node_count, edge_count = calculate_node_and_edge_count(dag)
     depth, width = calculate_depth_and_width(dag)
     source, sink = calculate_source_and_sink_count(dag)
@@ -99,11 +101,11 @@ def calculate_metrics(dag: DAG) -> Metrics:
     node_metrics_list = []
     for node_id in dag.nodes:
         node_metrics = NodeMetrics(
-            in_degree=graph.in_degree(node_id),
-            out_degree=graph.out_degree(node_id),
+            in_degree=len(dag.get_parent_ids(node_id)),
+            out_degree=len(dag.get_child_ids(node_id)),
             id=node_id,
-            name=graph.nodes[node_id]["data"].name,
-            node_type=graph.nodes[node_id]["data"].node_type,
+            name=dag.get_node_by_id(node_id).name,
+            node_type=dag.get_node_by_id(node_id).node_type,
         )
         node_metrics_list.append(node_metrics)
 
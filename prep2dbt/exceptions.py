@@ -6,7 +6,7 @@ class IllegAlargumentException(ClickException):
 
 
 class NoFlowFileExistsException(ClickException):
-    """解凍したフローファイルの中身にflowがない"""
+    """フローファイルの中身にflowがない"""
 
 
 class UnknownJsonFormatException(ClickException):
@@ -15,3 +15,11 @@ class UnknownJsonFormatException(ClickException):
 
 class UnknownNodeException(ClickException):
     """まだ変換仕様が実装されていないNodeが見つかった"""
+
+
+class BatchConvertFailedException(ClickException):
+    """一括変換で、変換に失敗したフローがある"""
+
+
+class ColumnPruningFailedException(ClickException):
+    """カラムの削減で、必要なカラムがなくなってしまう"""
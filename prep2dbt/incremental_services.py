@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+
+import click
+
+from prep2dbt.__version__ import __version__
+from prep2dbt.cache_services import (add_node_stats, close_node_cache,
+                                     collect_node_stats, open_node_cache,
+                                     output_options, subtract_node_stats)
+from prep2dbt.core_services import calculate_columns
+from prep2dbt.dbt_services import (generate_node_dbt_models, output_dbt_files,
+                                   output_file_names,
+                                   output_filter_pushdown_stats,
+                                   output_model_split_stats,
+                                   output_projection_fusion_stats)
+from prep2dbt.models.dbt_models import DbtModels
+from prep2dbt.models.graph import DAG
+from prep2dbt.models.incremental_cache import CachedNode, IncrementalCache
+from prep2dbt.pruning_services import (output_pruning_result,
+                                       prune_unused_columns)
+
+# 差分変換のために、前回の変換結果を保存するファイル名
+INCREMENTAL_CACHE_FILE_NAME = "incremental_cache.json"
+# キャッシュの形式のバージョン。形式を変えたら上げる
+INCREMENTAL_CACHE_VERSION = 3
+
+
+def __options_key() -> str:
+    """変換結果に影響する実行時オプションと、ツールのバージョンを文字列にする"""
+    return json.dumps(
+        [INCREMENTAL_CACHE_VERSION, __version__, output_options()], sort_keys=True
+    )
+
+
+def calculate_fingerprints(graph: DAG) -> dict[str, str]:
+    """
+    各ステップのハッシュ値を計算する。
+
+    ステップのハッシュ値は、ステップ自身の定義と、ネームスペースごとの親のハッシュ値から計算する。
+    親のカラム定義は上流のステップの定義だけで決まるので、上流のどこかが変わればハッシュ値も変わる。
+    つまり、ハッシュ値が前回と変わったステップは、変更されたステップとその下流のステップになる。
+
+    Args:
+        graph (DAG): モデル名を採番したDAG
+
+    Returns:
+        dict[str, str]: ノードID -> ハッシュ値
+    """
+    fingerprints: dict[str, str] = {}
+    for node_set in graph.nodes_per_generation():
+        for node_id in sorted(node_set):
+            parents = sorted(
+                (namespace, fingerprints.get(parent_id, ""))
+                for namespace, parent_id in graph.get_parent_ids_by_namespace(
+                    node_id
+                ).items()
+            )
+            content = json.dumps([graph.get_node_by_id(node_id).digest(), parents])
+            fingerprints[node_id] = hashlib.blake2b(
+                content.encode("UTF-8"), digest_size=16
+            ).hexdigest()
+    return fingerprints
+
+
+def __cache_path() -> str:
+    ctx = click.get_current_context()
+    return os.path.join(ctx.params["work_dir"], INCREMENTAL_CACHE_FILE_NAME)
+
+
+def load_incremental_cache() -> IncrementalCache:
+    """
+    作業ディレクトリから、前回の変換結果を読み込む。
+    前回の変換結果はJSONで保存し、読み込むときに任意のコードが動くpickleは使わない。
+    ファイルがない、読み込めない、実行時オプションやツールのバージョンが違う場合は、空のキャッシュを返す。
+    """
+    path = __cache_path()
+    if not os.path.exists(path):
+        return IncrementalCache()
+    try:
+        with open(path, encoding="UTF-8") as f:
+            cache = IncrementalCache.from_dict(json.load(f))
+    except Exception:
+        click.echo("{}が読み込めないため、すべてのステップを変換しなおします。".format(path))
+        return IncrementalCache()
+
+    if cache.options_key != __options_key():
+        return IncrementalCache()
+    return cache
+
+
+def save_incremental_cache(cache: IncrementalCache) -> None:
+    """作業ディレクトリへ、今回の変換結果を保存する"""
+    with open(__cache_path(), mode="w", encoding="UTF-8") as f:
+        json.dump(cache.to_dict(), f, ensure_ascii=False)
+
+
+def __read_output_files(file_names: list[str]) -> dict[str, str]:
+    """outputsディレクトリに書き出したファイルを読み込む"""
+    ctx = click.get_current_context()
+    files = {}
+    for file_name in file_names:
+        path = os.path.join(ctx.params["work_dir"], "outputs", file_name)
+        with open(path, encoding="UTF-8", newline="") as f:
+            files[file_name] = f.read()
+    return files
+
+
+def __write_output_files(files: dict[str, str]) -> None:
+    """前回書き出したファイルを、outputsディレクトリにそのまま書き出す"""
+    ctx = click.get_current_context()
+    for file_name, content in files.items():
+        path = os.path.join(ctx.params["work_dir"], "outputs", file_name)
+        with open(path, mode="w", encoding="UTF-8", newline="") as f:
+            f.write(content)
+
+
+def __has_same_columns(node_id: str, graph: DAG, cache: IncrementalCache) -> bool:
+    """ステップと親のカラム定義が、前回の変換結果と同じか確かめる"""
+    for target_id in [node_id] + graph.get_parent_ids(node_id):
+        cached = cache.nodes.get(target_id)
+        if cached is None:
+            return False
+        columns = graph.get_node_by_id(target_id).model_columns
+        # fingerprintは作られ方で変わるので、前回のカラム定義とは内容で比べる
+        if cached.model_columns.content_digest != columns.content_digest:
+            return False
+    return True
+
+
+def convert_incrementally(graph: DAG) -> DbtModels:
+    """
+    前回の変換結果を使いまわし、変更されたステップとその下流のステップだけを変換しなおす。
+
+    1. 各ステップのハッシュ値を計算し、前回と同じステップは、前回のカラム定義をグラフに戻す
+    2. カラム定義を計算する（前回のカラム定義を戻したステップは、計算をスキップする）
+       カラムを削減する場合は、すべてのステップのカラム定義を計算してから削減し、
+       削減したあとのカラム定義が前回と変わったステップも変換しなおす
+    3. 前回と同じステップは、前回書き出したファイルをそのまま書き出し、前回数えた最適化の件数を足す
+    4. ハッシュ値が変わったステップだけ、dbtモデルを生成して書き出す
+    5. 今回の変換結果を、作業ディレクトリへ保存する
+
+    Args:
+        graph (DAG): モデル名を採番したDAG
+
+    Returns:
+        DbtModels: 変換しなおしたステップのdbtモデル（書き出し済み）
+    """
+    ctx = click.get_current_context()
+    pruning = ctx.params.get("prune_columns", False)
+    cache = load_incremental_cache()
+    fingerprints = calculate_fingerprints(graph)
+
+    reused: dict[str, CachedNode] = {}
+    for node_id, fingerprint in fingerprints.items():
+        cached = cache.get_reusable_node(node_id, fingerprint)
+        if cached is not None:
+            reused[node_id] = cached
+            if not pruning:
+                node = graph.get_node_by_id(node_id)
+                graph.add_node(node.copy_with_model_columns(cached.model_columns))
+
+    calculate_columns(graph)
+    if pruning:
+        # 削減するカラムは下流のステップの変更でも変わるので、
+        # 削減したあとのカラム定義が、ステップと親ともに前回と同じものだけを使いまわす
+        output_pruning_result(prune_unused_columns(graph))
+        reused = {
+            node_id: cached
+            for node_id, cached in reused.items()
+            if __has_same_columns(node_id, graph, cache)
+        }
+
+    node_cache = open_node_cache()
+    models = DbtModels([])
+    new_nodes: dict[str, CachedNode] = {}
+    for node_id in graph.nodes:
+        if node_id in reused:
+            __write_output_files(reused[node_id].files)
+            add_node_stats(reused[node_id].stats)
+            new_nodes[node_id] = reused[node_id]
+            continue
+
+        before = collect_node_stats()
+        node_models = generate_node_dbt_models(node_id, graph, node_cache)
+        output_dbt_files(node_models)
+        file_names = [
+            file_name for model in node_models for file_name in output_file_names(model)
+        ]
+        models = models.merge(node_models)
+        new_nodes[node_id] = CachedNode(
+            fingerprints[node_id],
+            graph.get_node_by_id(node_id).model_columns,
+            __read_output_files(file_names),
+            subtract_node_stats(collect_node_stats(), before),
+        )
+
+    if node_cache is not None:
+        close_node_cache(node_cache)
+    output_filter_pushdown_stats()
+    output_projection_fusion_stats()
+    output_model_split_stats()
+    save_incremental_cache(IncrementalCache(__options_key(), new_nodes))
+    click.echo(
+        "差分変換: {0}件のステップのうち、{1}件を変換しなおしました。".format(
+            len(new_nodes), len(new_nodes) - len(reused)
+        )
+    )
+    return models
@@ -0,0 +1,496 @@
+"""
+フロー定義ファイル（json）を逐次的に読み込むための共通処理と、jsonのbackend
+"""
+from __future__ import annotations
+
+import codecs
+import io
+import json
+import re
+from typing import IO, Any, Callable, Iterator, Mapping, TypeVar
+
+from prep2dbt.exceptions import UnknownJsonFormatException
+from prep2dbt.protocols.json_backend import JsonBackend
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+T = TypeVar("T")
+
+# 一度にストリームから読み込むバイト数
+CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(r"\s*")
+# オブジェクトや配列を読み飛ばすときに、まとめて読み飛ばす部分（括弧以外の文字と、閉じた文字列）
+_CONTENT = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
+# 文字列の開始の'"'のあとから、終わりの'"'まで（エスケープされた'"'は含めない）
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"')
+_CLOSING = {"{": "}", "[": "]"}
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+
+class RawSection:
+    """LazyRawDictの中で、まだデコードしていない要素（元のjsonのバイト列）"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+
+class LazyRawDict(Mapping[str, Any]):
+    """
+    ノードの定義を、元のjsonのバイト列のまま保持する辞書。
+
+    文字列や数値などの値はそのまま持ち、オブジェクトや配列の要素はバイト列で持っておく。
+    要素にアクセスされたときにはじめてデコードし、デコード結果はそのまま使いまわす。
+    fieldsのような大きな要素を、使われるまでデコードせずに済む。
+    """
+
+    def __init__(self, values: dict[str, Any]) -> None:
+        # キー -> 値。デコード前の要素はRawSection
+        self._values = values
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> LazyRawDict:
+        """jsonオブジェクトのバイト列から作成する"""
+        return FlowNodeReader(io.BytesIO(raw)).read_lazy_object()
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values[key]
+        if isinstance(value, RawSection):
+            value = get_json_backend().loads(value.data)
+            self._values[key] = value
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return "LazyRawDict({})".format(list(self._values.keys()))
+
+    @property
+    def decoded_keys(self) -> list[str]:
+        """デコード済みの要素のキー"""
+        return [
+            key
+            for key, value in self._values.items()
+            if not isinstance(value, RawSection)
+        ]
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        全ての要素をデコードした辞書に変換する。
+        出力用に一時的に使うことを想定し、デコード結果は保持しない。
+        """
+        backend = get_json_backend()
+        return {
+            key: backend.loads(value.data) if isinstance(value, RawSection) else value
+            for key, value in self._values.items()
+        }
+
+
+class NonFiniteFloat(float):
+    """
+    jsonのNaN、Infinity、-Infinityを読み込んだ値。
+    orjsonはこれらをnullとして出力してしまうので、floatと区別して、出力を標準ライブラリにまかせる。
+    """
+
+
+def _default(obj: Any) -> Any:
+    """json.dumpsでシリアライズできない値の変換"""
+    if isinstance(obj, LazyRawDict):
+        return obj.to_dict()
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(type(obj).__name__)
+    )
+
+
+class StdlibJsonBackend:
+    """
+    標準ライブラリのjsonモジュールによるbackend
+    """
+
+    name = "stdlib"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @classmethod
+    def loads(cls, data: bytes | str) -> Any:
+        return json.loads(data)
+
+    @classmethod
+    def dumps(cls, obj: Any, indent: int = 4, ensure_ascii: bool = True) -> str:
+        return json.dumps(
+            obj, indent=indent, ensure_ascii=ensure_ascii, default=_default
+        )
+
+
+class OrjsonJsonBackend:
+    """
+    orjson（コンパイル済みのパーサー・シリアライザー）によるbackend
+
+    orjsonはインデントが2つ固定で、ASCIIへのエスケープもできないため、出力を後から加工して
+    json.dumpsの書式にそろえる。orjsonでエンコードできない値を含む場合は、標準ライブラリにフォールバックする。
+
+    json.dumpsと異なる点
+    - 指数表記になる浮動小数点数の書式（orjson: 1e-5, json: 1e-05）
+    - NaN、Infinity、-Infinity。orjsonは読み込めず、出力はnullになる。
+      読み込みは標準ライブラリにフォールバックし、値をNonFiniteFloatにして、出力も標準ライブラリにまかせる。
+      読み込んだ値でない（プログラムの中で作った）floatのNaNなどは、nullとして出力される。
+    """
+
+    name = "orjson"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return orjson is not None
+
+    @classmethod
+    def loads(cls, data: bytes | str) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaNなど、orjsonが読み込めない値は、標準ライブラリで読み込む。不正なjsonは同じく例外になる
+            return json.loads(data, parse_constant=NonFiniteFloat)
+
+    @classmethod
+    def __escape_non_ascii(cls, m: re.Match) -> str:
+        """json.dumps(ensure_ascii=True)と同じく、非ASCII文字を\\uXXXXにエスケープする"""
+        code = ord(m.group())
+        if code > 0xFFFF:
+            # BMP外の文字は、サロゲートペアにする
+            code -= 0x10000
+            return "\\u{0:04x}\\u{1:04x}".format(
+                0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF)
+            )
+        return "\\u{0:04x}".format(code)
+
+    @classmethod
+    def __reindent(cls, text: str, indent: int) -> str:
+        """
+        インデント2つの出力を、指定されたインデントに置き換える。
+        jsonの文字列の中のタブはエスケープされているので、一時的にタブを目印にして深い階層から置き換える。
+        """
+        depth = 0
+        while "\n" + "  " * (depth + 1) in text:
+            depth += 1
+        for level in range(depth, 0, -1):
+            text = text.replace("\n" + "  " * level, "\n" + "\t" * level)
+        return text.replace("\t", " " * indent)
+
+    @classmethod
+    def dumps(cls, obj: Any, indent: int = 4, ensure_ascii: bool = True) -> str:
+        if indent <= 0:
+            return StdlibJsonBackend.dumps(obj, indent, ensure_ascii)
+        try:
+            res = orjson.dumps(
+                obj, default=_default, option=orjson.OPT_INDENT_2
+            ).decode("UTF-8")
+        except TypeError:
+            return StdlibJsonBackend.dumps(obj, indent, ensure_ascii)
+
+        if indent != 2:
+            res = cls.__reindent(res, indent)
+        if ensure_ascii and not res.isascii():
+            res = _NON_ASCII.sub(cls.__escape_non_ascii, res)
+        return res
+
+
+class SimdjsonJsonBackend:
+    """
+    simdjson（コンパイル済みのパーサー）によるbackend
+    シリアライズの機能はないため、dumpsは標準ライブラリで行う。
+    """
+
+    name = "simdjson"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return simdjson is not None
+
+    @classmethod
+    def loads(cls, data: bytes | str) -> Any:
+        return simdjson.loads(data)
+
+    @classmethod
+    def dumps(cls, obj: Any, indent: int = 4, ensure_ascii: bool = True) -> str:
+        return StdlibJsonBackend.dumps(obj, indent, ensure_ascii)
+
+
+class JsonBackendRegistry:
+    # 優先度の高い順
+    backends: dict[str, type[JsonBackend]] = {
+        OrjsonJsonBackend.name: OrjsonJsonBackend,
+        SimdjsonJsonBackend.name: SimdjsonJsonBackend,
+        StdlibJsonBackend.name: StdlibJsonBackend,
+    }
+
+
+def get_json_backend(name: str = "") -> type[JsonBackend]:
+    """
+    jsonのbackendを返却する。
+    名前の指定がなければ、インストール済みのbackendのうち最も速いものを返す。
+    指定されたbackendが利用できない場合は、標準ライブラリにフォールバックする。
+    """
+    if name:
+        backend = JsonBackendRegistry.backends.get(name, StdlibJsonBackend)
+        return backend if backend.is_available() else StdlibJsonBackend
+
+    for backend in JsonBackendRegistry.backends.values():
+        if backend.is_available():
+            return backend
+    return StdlibJsonBackend
+
+
+class FlowNodeReader:
+    """
+    フロー定義ファイルを先頭から少しずつ読み込み、nodes配下のノードを1件ずつ取り出すリーダー。
+
+    ファイル全体を一度にデコードせず、ノード1件分ずつデコードして返す。
+    バッファには、読み込み中のノード1件分とチャンク1つ分のデータしか保持しない。
+
+    ### Example
+    ```
+    with open("flow", "rb") as f:
+        for node_dict in FlowNodeReader(f).iter_nodes():
+            ...
+    ```
+    """
+
+    def __init__(self, stream: IO[bytes], chunk_size: int = CHUNK_SIZE) -> None:
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.scanner = json.JSONDecoder(parse_constant=NonFiniteFloat)
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def __fill(self, size: int = 0) -> bool:
+        """ストリームから、最低size分（指定がなければチャンク1つ分）を読み込む。読み込めなければFalse"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(max(size, self.chunk_size))
+        if not chunk:
+            self.eof = True
+            self.buffer += self.decoder.decode(b"", final=True)
+            return False
+        self.buffer += self.decoder.decode(chunk)
+        return True
+
+    def __compact(self) -> None:
+        """読み込み済みの部分がチャンク1つ分を超えたら、バッファから捨てる"""
+        if self.pos > self.chunk_size:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+
+    def __error(self, message: str) -> UnknownJsonFormatException:
+        return UnknownJsonFormatException("フロー定義ファイルの解析に失敗しました。{}".format(message))
+
+    def __peek(self) -> str:
+        """空白を読み飛ばし、次の1文字を返す。終端なら空文字"""
+        while True:
+            m = _WHITESPACE.match(self.buffer, self.pos)
+            self.pos = m.end() if m else self.pos
+            if self.pos < len(self.buffer) or not self.__fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def __expect(self, char: str) -> None:
+        if self.__peek() != char:
+            raise self.__error("'{}'が見つかりません。".format(char))
+        self.pos += 1
+
+    def __skip_string(self, start: int) -> int:
+        """
+        startの'"'から始まる文字列を読み飛ばし、終了位置を返す。
+        文字列がバッファの終端で途切れている場合は、続きを読み込んでから、その文字列だけを読み直す。
+        """
+        while True:
+            m = _STRING_REST.match(self.buffer, start + 1)
+            if m is not None:
+                return m.end()
+            # バッファを倍々に増やしながら読み込むことで、大きな値でも読み直しの回数を抑える
+            if not self.__fill(len(self.buffer) - start):
+                raise self.__error("文字列が閉じられていません。")
+
+    def __skip_container(self, start: int) -> int:
+        """
+        startの'{'もしくは'['から始まるオブジェクトや配列を、デコードせずに読み飛ばし、終了位置を返す。
+        文字列の外の括弧の対応だけを見る。読み込んだ位置から続けて見るので、続きを読み込んでも最初から見直さない。
+        """
+        closings = [_CLOSING[self.buffer[start]]]
+        pos = start + 1
+        while closings:
+            # 括弧の間の文字と文字列は、正規表現でまとめて読み飛ばす
+            pos = _CONTENT.match(self.buffer, pos).end()  # type: ignore
+            char = self.buffer[pos : pos + 1]
+            if char in ("", '"'):
+                # バッファの終端か、途中で途切れた文字列。続きを読み込んでから、途切れた位置から見直す
+                if not self.__fill(len(self.buffer) - start):
+                    raise self.__error("'{}'が見つかりません。".format(closings[-1]))
+                continue
+            if char in _CLOSING:
+                closings.append(_CLOSING[char])
+            elif char == closings[-1]:
+                closings.pop()
+            else:
+                raise self.__error("'{}'が見つかりません。".format(closings[-1]))
+            pos += 1
+        return pos
+
+    def __skip_scalar(self, start: int) -> int:
+        """
+        startから始まる数値やtrue・false・nullをデコードし、終了位置を返す。
+        数値がバッファの終端で途切れている場合は、続きを読み込んでからやり直す。
+        """
+        while True:
+            try:
+                _, end = self.scanner.raw_decode(self.buffer, start)
+                # 数値は、続きがまだ読み込まれていない可能性がある
+                if end < len(self.buffer) or not self.__fill():
+                    return end
+            except json.JSONDecodeError as e:
+                if not self.__fill():
+                    raise self.__error(e.msg)
+
+    def __skip_value(self) -> tuple[int, int]:
+        """
+        次の値を、Pythonのオブジェクトにデコードせずに読み飛ばし、バッファ上の開始・終了位置を返す。
+        """
+        char = self.__peek()
+        start = self.pos
+        if char in _CLOSING:
+            end = self.__skip_container(start)
+        elif char == '"':
+            end = self.__skip_string(start)
+        else:
+            end = self.__skip_scalar(start)
+        self.pos = end
+        return start, end
+
+    def __read_value(self) -> tuple[Any, int, int]:
+        """
+        次の値を1つデコードし、値とバッファ上の開始・終了位置を返す。
+        値がバッファの終端で途切れている場合は、値の終わりまで読み込んでから、1回だけデコードしなおす。
+        """
+        self.__peek()
+        start = self.pos
+        try:
+            value, end = self.scanner.raw_decode(self.buffer, start)
+            # 数値は、続きがまだ読み込まれていない可能性がある
+            if end < len(self.buffer) or self.eof:
+                self.pos = end
+                return value, start, end
+        except json.JSONDecodeError:
+            pass
+        start, end = self.__skip_value()
+        try:
+            value, _ = self.scanner.raw_decode(self.buffer, start)
+        except json.JSONDecodeError as e:
+            raise self.__error(e.msg)
+        return value, start, end
+
+    def __iter_members(self) -> Iterator[str]:
+        """
+        現在位置のオブジェクトのキーを順に返す。
+        呼び出し側は、キーを受け取るたびに値を1つ読み込むこと。
+        """
+        self.__expect("{")
+        if self.__peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.__peek() != '"':
+                raise self.__error("キーが見つかりません。")
+            key, _, _ = self.__read_value()
+            self.__expect(":")
+            yield key
+            char = self.__peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise self.__error("','もしくは'}'が見つかりません。")
+
+    def __iter_node_values(self, read_node: Callable[[], T]) -> Iterator[T]:
+        """nodes配下のノードを、read_nodeで1件ずつ読み込んで返す。"""
+        self.__fill()
+
+        has_nodes = False
+        for key in self.__iter_members():
+            if key != "nodes":
+                # nodes以外の要素は、デコードせずに読み飛ばす
+                self.__skip_value()
+                self.__compact()
+                continue
+
+            has_nodes = True
+            for _ in self.__iter_members():
+                yield read_node()
+                self.__compact()
+
+        if not has_nodes:
+            raise UnknownJsonFormatException(
+                "変換に失敗しました。使用しているフローのバージョンが、変換ツールの対応済みバージョンかどうか確認してください。"
+            )
+
+    def iter_nodes(self) -> Iterator[dict]:
+        """
+        nodes配下のノードを、1件ずつ辞書にデコードして返す。
+
+        Raises:
+            UnknownJsonFormatException: jsonとして解析できない場合、もしくはnodesキーが存在しない場合
+        """
+        for value, _, _ in self.__iter_node_values(self.__read_value):
+            yield value
+
+    def read_lazy_object(self) -> LazyRawDict:
+        """
+        現在位置のオブジェクトを、要素ごとに遅延デコードするLazyRawDictとして読み込む。
+        オブジェクトや配列の要素は、元のjsonのバイト列のまま保持する。
+        """
+        values: dict[str, Any] = {}
+        for key in self.__iter_members():
+            if self.__peek() in _CLOSING:
+                # オブジェクトや配列は、デコードせずに範囲だけを読み取る
+                start, end = self.__skip_value()
+                values[key] = RawSection(self.buffer[start:end].encode("UTF-8"))
+            else:
+                values[key], _, _ = self.__read_value()
+        return LazyRawDict(values)
+
+    def iter_lazy_nodes(self) -> Iterator[LazyRawDict]:
+        """
+        nodes配下のノードを、1件ずつLazyRawDictとして返す。
+        ノードの要素のうち、オブジェクトや配列は、アクセスされるまでデコードしない。
+
+        Raises:
+            UnknownJsonFormatException: jsonとして解析できない場合、もしくはnodesキーが存在しない場合
+        """
+        yield from self.__iter_node_values(self.read_lazy_object)
+
+    def iter_raw_nodes(self) -> Iterator[bytes]:
+        """
+        nodes配下のノードを、1件ずつ元のjsonのバイト列として返す。
+
+        Raises:
+            UnknownJsonFormatException: jsonとして解析できない場合、もしくはnodesキーが存在しない場合
+        """
+        for start, end in self.__iter_node_values(self.__skip_value):
+            yield self.buffer[start:end].encode("UTF-8")
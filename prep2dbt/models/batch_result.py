@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class FlowResult:
+    """
+    一括変換での、フローファイル1つ分の変換結果
+    """
+
+    flow_file: str
+    work_dir: str
+    passed: int = 0
+    warning: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    error: str = ""  # 変換自体に失敗した場合のメッセージ
+
+    @property
+    def is_succeeded(self) -> bool:
+        """変換自体が成功したか"""
+        return self.error == ""
+
+    def to_csv(self) -> str:
+        return (
+            self.flow_file
+            + ","
+            + self.work_dir
+            + ","
+            + str(self.passed)
+            + ","
+            + str(self.warning)
+            + ","
+            + str(self.failed)
+            + ","
+            + format(self.elapsed, ".2f")
+            + ","
+            + self.error.replace(",", " ").replace("\n", " ")
+        )
+
+
+@dataclass
+class BatchResult:
+    """
+    一括変換の結果
+    """
+
+    flows: list[FlowResult]
+
+    @property
+    def succeeded_count(self) -> int:
+        return len([flow for flow in self.flows if flow.is_succeeded])
+
+    @property
+    def error_count(self) -> int:
+        return len(self.flows) - self.succeeded_count
+
+    def total(self) -> tuple[int, int, int]:
+        """全フローの、成功・警告・失敗のステップ数"""
+        return (
+            sum([flow.passed for flow in self.flows]),
+            sum([flow.warning for flow in self.flows]),
+            sum([flow.failed for flow in self.flows]),
+        )
+
+    def to_csv(self, header=True) -> str:
+        import os
+
+        result = ""
+
+        if header:
+            result = "flow_file,work_dir,passed,warning,failed,elapsed,error"
+
+        for flow in self.flows:
+            result = result + os.linesep + flow.to_csv()
+
+        return result
@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """
+    ステップ単位の変換結果のキャッシュの統計情報
+    """
+
+    cache_dir: str
+    entries: int = 0
+    size: int = 0  # バイト数
+    oldest_used: float = 0.0  # 最も長く使われていないエントリの最終利用日時（UNIX時間）
+    newest_used: float = 0.0  # 最も最近使われたエントリの最終利用日時（UNIX時間）
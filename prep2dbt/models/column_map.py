@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import replace
+from math import isqrt
+from typing import TYPE_CHECKING, ItemsView, Iterable, Iterator, Mapping, ValuesView
+
+if TYPE_CHECKING:
+    from prep2dbt.models.node import ModelColumn
+
+# 差分がこの件数（またはベースの件数の平方根）を超えたら、ベースに畳み込む
+COMPACTION_MIN_SIZE = 32
+
+# content_digestの和をとる法（128ビット）
+CONTENT_DIGEST_MODULUS = 1 << 128
+
+
+class BaseInfo:
+    """ベースの辞書から計算した値。ベースを共有するColumnMapの間で共有する。"""
+
+    __slots__ = (
+        "digest",
+        "valued_names",
+        "names",
+        "positions",
+        "terms",
+        "terms_sum",
+        "changed_terms",
+    )
+
+    def __init__(self) -> None:
+        self.digest: str | None = None  # ベースのハッシュ値
+        self.valued_names: list[str] | None = None  # valueを持つカラムの列名
+        # content_digestの項。ベースの並び順の列名、列名 -> 位置、各位置の項（末尾に終端の項）とその和
+        self.names: list[str] = []
+        self.positions: dict[str, int] = {}
+        self.terms: list[int] | None = None
+        self.terms_sum = 0
+        # 列名 -> (直前の列名, カラム, 項)。差分のカラムの項を、ベースを共有するインスタンスの間で使いまわす
+        self.changed_terms: dict[str, tuple[str | None, ModelColumn, int]] = {}
+
+
+class ColumnMap(Mapping[str, "ModelColumn"]):
+    """
+    列名 -> カラムの、変更できない（永続的な）マッピング
+
+    - 共有されるベースの辞書と、そこからの差分の辞書で構成される。ベースの辞書は決して書き換えない。
+    - 1列の追加・置き換え・削除は、差分だけをコピーした新しいインスタンスを返すため、
+      変更のないカラムは元のインスタンスと共有される。
+    - 差分が大きくなったら、新しいベースに畳み込む。
+      1回の変更にかかるコストは、償却してカラム数の平方根程度になる。
+
+    並び順は、辞書と同じく追加した順になる（置き換えでは並び順を変えない）。
+    """
+
+    __slots__ = (
+        "_base",
+        "_changes",
+        "_size",
+        "_valued",
+        "_base_info",
+        "_flushed",
+        "_fingerprint",
+        "_content_digest",
+        "_parent",
+        "_delta",
+        "_depth",
+    )
+
+    def __init__(
+        self,
+        base: dict[str, ModelColumn],
+        changes: dict[str, ModelColumn | None] | None = None,
+        size: int | None = None,
+        valued: int | None = None,
+        base_info: BaseInfo | None = None,
+        parent: ColumnMap | None = None,
+        delta: tuple[tuple[str, ModelColumn | None], ...] = (),
+    ) -> None:
+        # 列名 -> カラム。共有されるので書き換えない。
+        self._base = base
+        # 列名 -> カラム。Noneはベースからの削除を表す。
+        self._changes: dict[str, ModelColumn | None] = changes or {}
+        self._size = len(base) if size is None else size
+        # valueを持つカラムの数
+        self._valued = (
+            sum(1 for col in base.values() if col.value) if valued is None else valued
+        )
+        # 同じベースを共有するインスタンスの間で、ベースから計算した値を共有する。
+        self._base_info = BaseInfo() if base_info is None else base_info
+        self._fingerprint: str | None = None
+        self._content_digest: str | None = None
+        self._flushed: ColumnMap | None = None
+        # ハッシュ値を計算するまで、変更元と変更内容を覚えておく（チェーンの長さには上限を設ける）
+        self._depth: int = 0 if parent is None else parent._depth + 1
+        if self._depth > COMPACTION_MIN_SIZE:
+            parent, delta, self._depth = None, (), 0
+        self._parent = parent
+        self._delta = delta
+
+    @classmethod
+    def from_columns(cls, columns: Iterable[ModelColumn]) -> ColumnMap:
+        """
+        カラムの並びから作る
+        同一カラム名の要素が複数ある場合は、後ろの要素で置き換える。
+        """
+        return ColumnMap({col.name: col for col in columns})
+
+    @property
+    def valued_count(self) -> int:
+        """valueを持つカラムの数"""
+        return self._valued
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        並び順も含めた、カラムの内容のハッシュ値
+        変更元のハッシュ値と変更内容（なければ、ベースのハッシュ値と差分）から作るので、
+        計算は変更の大きさに比例する時間で済む。
+        同じ内容でも作られ方が違えば別の値になることはあるが、違う内容が同じ値になることはない。
+        """
+        if self._fingerprint is None:
+            if self._parent is not None:
+                self._fingerprint = self.__digest(self._parent.fingerprint, self._delta)
+            else:
+                info = self._base_info
+                if info.digest is None:
+                    info.digest = self.__digest("", self._base.items())
+                if self._changes:
+                    self._fingerprint = self.__digest(
+                        info.digest, self._changes.items()
+                    )
+                else:
+                    self._fingerprint = info.digest
+            # 変更元はもう使わないので、手放す
+            self._parent = None
+            self._delta = ()
+        return self._fingerprint
+
+    @property
+    def content_digest(self) -> str:
+        """
+        並び順も含めた、カラムの内容だけから作るハッシュ値
+        fingerprintと違って作られ方によらないので、同じ内容なら必ず同じ値になる。
+        別のプロセスや、前回の変換の結果と比べるときに使う。
+
+        各カラムとその直前のカラムの列名の組から作った項の和なので、ベースの項を共有して覚えておけば、
+        差分で変わる項（変更したカラムとその次のカラム、末尾）だけを計算しなおせばよい。
+        列名は重複しないので、項の組から並び順も一意に決まる。
+        """
+        if self._content_digest is None:
+            self._content_digest = "{0:032x}".format(self.__content_sum())
+        return self._content_digest
+
+    def __content_sum(self) -> int:
+        info = self._base_info
+        base = self._base
+        if info.terms is None:
+            info.names = list(base)
+            info.positions = {name: i for i, name in enumerate(info.names)}
+            prevs: list[str | None] = [None, *info.names]
+            info.terms = [
+                self.__term(prev, base[name]) for prev, name in zip(prevs, info.names)
+            ]
+            info.terms.append(self.__term(prevs[-1], None))
+            info.terms_sum = sum(info.terms) % CONTENT_DIGEST_MODULUS
+        changes = self._changes
+        if not changes:
+            return info.terms_sum
+
+        names, positions, terms = info.names, info.positions, info.terms
+        end = len(names)
+
+        def prev_name(position: int) -> str | None:
+            """位置の直前に残っているカラムの列名。先頭ならNone"""
+            position -= 1
+            # 削除したカラムは飛ばす
+            while (
+                position >= 0
+                and names[position] in changes
+                and changes[names[position]] is None
+            ):
+                position -= 1
+            return names[position] if position >= 0 else None
+
+        # 変更したカラムの項と、直前のカラムが変わりうる次のカラムの項を計算しなおす
+        changed = {positions[name] for name in changes if name in positions}
+        dirty = changed | {position + 1 for position in changed}
+        added = [
+            col
+            for name, col in changes.items()
+            if name not in positions and col is not None
+        ]
+        if added:
+            dirty.add(end)
+        total = info.terms_sum - sum(terms[position] for position in dirty)
+        for position in dirty:
+            if position == end:
+                continue
+            name = names[position]
+            col = changes[name] if name in changes else base[name]
+            if col is not None:
+                total += self.__changed_term(prev_name(position), col)
+        if end in dirty:
+            # 追加したカラムは、ベースのカラムのあとに追加した順に並ぶ
+            prev = prev_name(end)
+            for col in added:
+                total += self.__changed_term(prev, col)
+                prev = col.name
+            total += self.__term(prev, None)
+        return total % CONTENT_DIGEST_MODULUS
+
+    def __changed_term(self, prev: str | None, col: ModelColumn) -> int:
+        """差分で変わる項。同じ直前の列名とカラム（同じインスタンス）の項は、計算済みの値を使う"""
+        memo = self._base_info.changed_terms
+        entry = memo.get(col.name)
+        if entry is not None and entry[1] is col and entry[0] == prev:
+            return entry[2]
+        term = self.__term(prev, col)
+        memo[col.name] = (prev, col, term)
+        return term
+
+    @staticmethod
+    def __term(prev: str | None, col: ModelColumn | None) -> int:
+        """直前のカラムの列名（先頭ならNone）と、カラム（終端ならNone）から作る、content_digestの項"""
+        text = "{0}\x03{1}".format(
+            "\x04" if prev is None else prev,
+            "\x04"
+            if col is None
+            else "{0}\x00{1}\x00{2}".format(col.name, col.data_type, col.value),
+        )
+        return int.from_bytes(
+            hashlib.blake2b(text.encode("UTF-8"), digest_size=16).digest(), "big"
+        )
+
+    @staticmethod
+    def __digest(prefix: str, items: Iterable[tuple[str, ModelColumn | None]]) -> str:
+        parts = [prefix]
+        for name, col in items:
+            if col is None:
+                # 削除
+                parts.append("{0}\x01".format(name))
+            else:
+                parts.append("{0}\x00{1}\x00{2}".format(name, col.data_type, col.value))
+        return hashlib.blake2b(
+            "\x02".join(parts).encode("UTF-8"), digest_size=16
+        ).hexdigest()
+
+    def valued_columns(self) -> list[ModelColumn]:
+        """
+        valueを持つカラムのリスト（並び順は保証しない）
+        ベースの中でvalueを持つカラムは共有して覚えておくので、差分の大きさに比例する時間で済む。
+        """
+        if self._valued == 0:
+            return []
+        info = self._base_info
+        if info.valued_names is None:
+            info.valued_names = [name for name, col in self._base.items() if col.value]
+        changes = self._changes
+        result = [self._base[name] for name in info.valued_names if name not in changes]
+        result.extend(col for col in changes.values() if col is not None and col.value)
+        return result
+
+    def flush_values(self) -> ColumnMap:
+        """
+        各カラムのvalue要素をからにしたマッピングを返す
+        valueを持つカラムだけを作り直し、それ以外のカラムは共有する。
+        変更できないので、結果は覚えておいて使いまわす。
+        """
+        if self._valued == 0:
+            return self
+        if self._flushed is None:
+            self._flushed = self.update(
+                [replace(col, value="") for col in self.valued_columns()]
+            )
+        return self._flushed
+
+    def __getitem__(self, name: str) -> ModelColumn:
+        if name in self._changes:
+            col = self._changes[name]
+            if col is None:
+                raise KeyError(name)
+            return col
+        return self._base[name]
+
+    def __contains__(self, name: object) -> bool:
+        if name in self._changes:
+            return self._changes[name] is not None  # type: ignore[index]
+        return name in self._base
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[str]:
+        if not self._changes:
+            return iter(self._base)
+        return self.__iter_with_changes()
+
+    def __iter_with_changes(self) -> Iterator[str]:
+        changes = self._changes
+        base = self._base
+        for name in base:
+            if name not in changes or changes[name] is not None:
+                yield name
+        for name in changes:
+            if name not in base:
+                yield name
+
+    def values(self) -> ValuesView[ModelColumn]:
+        if not self._changes:
+            return self._base.values()
+        return ValuesView(self)
+
+    def items(self) -> ItemsView[str, ModelColumn]:
+        if not self._changes:
+            return self._base.items()
+        return ItemsView(self)
+
+    def __reduce__(self) -> tuple[type[ColumnMap], tuple[dict[str, ModelColumn]]]:
+        # 別プロセスに渡すときは、差分や変更元を含めず、内容だけを渡す
+        return (ColumnMap, (dict(self.items()),))
+
+    def __repr__(self) -> str:
+        return "ColumnMap({0!r})".format(list(self.values()))
+
+    def set(self, col: ModelColumn) -> ColumnMap:
+        """カラムを追加した（同名のカラムがあれば置き換えた）マッピングを返す"""
+        return self.update([col])
+
+    def update(self, columns: Iterable[ModelColumn]) -> ColumnMap:
+        """複数のカラムを追加した（同名のカラムがあれば置き換えた）マッピングを返す"""
+        columns = list(columns)
+        changes = dict(self._changes)
+        size = self._size
+        valued = self._valued
+        for col in columns:
+            if col.name in changes:
+                old = changes[col.name]
+                if old is None:
+                    # ベースから削除した列の再追加は、末尾に並べるためにベースを作り直す
+                    return self.__compact().update(columns)
+            else:
+                old = self._base.get(col.name)
+            if old is None:
+                size += 1
+            elif old.value:
+                valued -= 1
+            changes[col.name] = col
+            valued += 1 if col.value else 0
+        return ColumnMap(
+            self._base,
+            changes,
+            size,
+            valued,
+            self._base_info,
+            self,
+            tuple((col.name, col) for col in columns),
+        ).__compact_if_needed()
+
+    def remove(self, name: str) -> ColumnMap:
+        """カラムを削除したマッピングを返す。なければ自分自身を返す。"""
+        if name not in self:
+            return self
+        changes = dict(self._changes)
+        if name in self._base:
+            changes[name] = None
+        else:
+            del changes[name]
+        valued = self._valued - (1 if self[name].value else 0)
+        return ColumnMap(
+            self._base,
+            changes,
+            self._size - 1,
+            valued,
+            self._base_info,
+            self,
+            ((name, None),),
+        ).__compact_if_needed()
+
+    def __compact_if_needed(self) -> ColumnMap:
+        if len(self._changes) > max(COMPACTION_MIN_SIZE, isqrt(len(self._base))):
+            return self.__compact()
+        return self
+
+    def __compact(self) -> ColumnMap:
+        """差分を畳み込んだ新しいベースのマッピングを返す"""
+        return ColumnMap(
+            {name: self[name] for name in self}, size=self._size, valued=self._valued
+        )
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import KeysView
+
+import networkx as nx
+
+from prep2dbt.models.graph import DAG, DagTopology
+from prep2dbt.models.node import Node
+
+
+class CompactDAG(DAG):
+    """
+    networkxを使わずに、ノードIDを整数に置き換えて管理するDAG
+
+    - ノードIDは、はじめて現れた順に0から連番の整数に変換される（インターン）。
+    - ノードは、整数IDを添字とするリスト（ノードテーブル）に格納される。
+    - 親子関係は、CSR形式（オフセットの配列と、隣接ノードの配列）で保持する。
+      CSRはエッジが追加されたときだけ作り直され、add_nodeによるノードの置き換えでは作り直さない。
+
+    ノードとエッジの並び順は、networkxのDiGraphと同じく追加した順になるため、DAGと同じ結果を返す。
+    networkxのDiGraphは持たないため、graph属性は使えない。DAGのメソッド（nodes, edges, get_child_idsなど）を使うこと。
+    """
+
+    def __init__(self) -> None:
+        # namespace_indexと_topologyは、DAGの初期化で作る
+        super().__init__()
+        self._index: dict[str, int] = {}  # ノードID -> 整数ID
+        self._ids: list[str] = []  # 整数ID -> ノードID
+        self._nodes: list[Node | None] = []  # 整数ID -> ノード
+        self._edges: list[tuple[int, int]] = []  # 追加された順のエッジ
+        self._edge_set: set[tuple[int, int]] = set()
+        # CSR形式の親子関係。エッジが変更されるまで使いまわす。
+        self._parent_offsets: array | None = None
+        self._parents: array | None = None
+        self._child_offsets: array | None = None
+        self._children: array | None = None
+
+    @property  # type: ignore[override]
+    def graph(self) -> nx.DiGraph:
+        """networkxのDiGraphは持たないため、参照するとエラー"""
+        raise TypeError(
+            "CompactDAG does not hold a networkx graph. Use the DAG methods instead."
+        )
+
+    @graph.setter
+    def graph(self, graph: nx.DiGraph) -> None:
+        """DAGの初期化で渡される、空のグラフだけを受けつける"""
+        if graph.number_of_nodes() > 0:
+            raise TypeError("CompactDAG cannot be created from a networkx graph.")
+
+    def __eq__(self, other: object) -> bool:
+        """networkxのグラフの代わりに、ノードテーブルとエッジとネームスペースのインデックスを比べる"""
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        assert isinstance(other, CompactDAG)
+        return (self._ids, self._nodes, self._edges, self.namespace_index) == (
+            other._ids,
+            other._nodes,
+            other._edges,
+            other.namespace_index,
+        )
+
+    def __repr__(self) -> str:
+        return "{0}(nodes={1}, edges={2}, namespace_index={3!r})".format(
+            self.__class__.__qualname__,
+            len(self._ids),
+            len(self._edges),
+            self.namespace_index,
+        )
+
+    @property
+    def nodes(self) -> KeysView[str]:  # type: ignore[override]
+        """nodes"""
+        return self._index.keys()
+
+    @property
+    def edges(self) -> list[tuple[str, str]]:
+        """エッジ（親ノードID, 子ノードID）のリスト。追加した順に並べる"""
+        ids = self._ids
+        return [(ids[src], ids[dst]) for src, dst in self._edges]
+
+    def __intern(self, node_id: str) -> int:
+        """ノードIDを整数IDに変換する。はじめて現れたIDなら、ノードテーブルに空の行を追加する。"""
+        idx = self._index.get(node_id)
+        if idx is None:
+            idx = len(self._ids)
+            self._index[node_id] = idx
+            self._ids.append(node_id)
+            self._nodes.append(None)
+            self.__invalidate_edges()
+        return idx
+
+    def __invalidate_edges(self) -> None:
+        self._parent_offsets = None
+        self._parents = None
+        self._child_offsets = None
+        self._children = None
+        self._topology = None
+
+    def __build_csr(self) -> None:
+        """エッジのリストから、CSR形式の親子関係を作る。エッジの追加順は保たれる。"""
+        size = len(self._ids)
+        parent_offsets = array("q", [0] * (size + 1))
+        child_offsets = array("q", [0] * (size + 1))
+        for src, dst in self._edges:
+            parent_offsets[dst + 1] += 1
+            child_offsets[src + 1] += 1
+        for idx in range(size):
+            parent_offsets[idx + 1] += parent_offsets[idx]
+            child_offsets[idx + 1] += child_offsets[idx]
+
+        parents = array("q", [0] * len(self._edges))
+        children = array("q", [0] * len(self._edges))
+        parent_cursor = array("q", parent_offsets[:-1])
+        child_cursor = array("q", child_offsets[:-1])
+        for src, dst in self._edges:
+            parents[parent_cursor[dst]] = src
+            parent_cursor[dst] += 1
+            children[child_cursor[src]] = dst
+            child_cursor[src] += 1
+
+        self._parent_offsets = parent_offsets
+        self._parents = parents
+        self._child_offsets = child_offsets
+        self._children = children
+
+    def __parent_indexes(self, idx: int) -> array:
+        if self._parents is None or self._parent_offsets is None:
+            self.__build_csr()
+        assert self._parents is not None and self._parent_offsets is not None
+        return self._parents[self._parent_offsets[idx] : self._parent_offsets[idx + 1]]
+
+    def __child_indexes(self, idx: int) -> array:
+        if self._children is None or self._child_offsets is None:
+            self.__build_csr()
+        assert self._children is not None and self._child_offsets is not None
+        return self._children[self._child_offsets[idx] : self._child_offsets[idx + 1]]
+
+    def add_node(self, node: Node) -> None:
+        """ノードを追加します。もしすでに同名ノードが存在しても、黙って内容を置き換えます。"""
+        idx = self.__intern(node.id)
+        self._nodes[idx] = node
+
+    def add_edge(
+        self, from_node_id: str, to_node_id: str, namespace: str | None = None
+    ) -> None:
+        """エッジを追加します。ネームスペースが指定されたら、インデックスにも登録します。"""
+        edge = (self.__intern(from_node_id), self.__intern(to_node_id))
+        self._register_namespace(from_node_id, to_node_id, namespace)
+        if edge in self._edge_set:
+            return
+        self._edge_set.add(edge)
+        self._edges.append(edge)
+        self.__invalidate_edges()
+
+    def merge(self, sub_dag: DAG) -> DAG:
+        """与えられたサブグラフを結合したDAGを作成します。"""
+        merged = CompactDAG()
+        merged.add_subgraph(self)
+        merged.add_subgraph(sub_dag)
+        return merged
+
+    def add_subgraph(self, sub_dag: DAG) -> None:
+        """
+        与えられたサブグラフのノードとエッジを、このDAGに直接追加します。
+        同じノードが既に存在する場合は、サブグラフ側のノードで上書きします。
+        """
+        if isinstance(sub_dag, CompactDAG):
+            for idx, node_id in enumerate(sub_dag._ids):
+                node = sub_dag._nodes[idx]
+                if node is None:
+                    self.__intern(node_id)
+                else:
+                    self.add_node(node)
+            for src, dst in sub_dag._edges:
+                self.add_edge(sub_dag._ids[src], sub_dag._ids[dst])
+            self._update_namespace_index(sub_dag)
+            return
+
+        for node_id in sub_dag.nodes:
+            try:
+                self.add_node(sub_dag.get_node_by_id(node_id))
+            except KeyError:
+                self.__intern(node_id)
+        for from_node_id, to_node_id in sub_dag.edges:
+            self.add_edge(from_node_id, to_node_id)
+        self._update_namespace_index(sub_dag)
+
+    def _sort_generations(self) -> list[list[str]]:
+        """CSRの上でカーンのアルゴリズムを使って、世代ごとのノードIDのリストを作ります。"""
+        if self._child_offsets is None or self._children is None:
+            self.__build_csr()
+        assert self._child_offsets is not None and self._children is not None
+        assert self._parent_offsets is not None
+
+        in_degrees = [
+            self._parent_offsets[idx + 1] - self._parent_offsets[idx]
+            for idx in range(len(self._ids))
+        ]
+        generation = [idx for idx, degree in enumerate(in_degrees) if degree == 0]
+        result = []
+        visited = 0
+        while generation:
+            result.append([self._ids[idx] for idx in generation])
+            visited += len(generation)
+            next_generation = []
+            for idx in generation:
+                for child in self._children[
+                    self._child_offsets[idx] : self._child_offsets[idx + 1]
+                ]:
+                    in_degrees[child] -= 1
+                    if in_degrees[child] == 0:
+                        next_generation.append(child)
+            generation = next_generation
+
+        if visited != len(self._ids):
+            raise nx.NetworkXUnfeasible(
+                "Graph contains a cycle or graph changed during iteration"
+            )
+        return result
+
+    def get_node_by_id(self, node_id: str) -> Node:
+        """IDからNodeを取得する"""
+        node = self._nodes[self._index[node_id]]
+        if node is None:
+            # networkxと同じく、データのないノードはKeyError
+            raise KeyError("data")
+        return node
+
+    def get_parent_ids(self, node_id: str) -> list[str]:
+        """親のIDのリストを取得する"""
+        ids = self._ids
+        return [ids[idx] for idx in self.__parent_indexes(self._index[node_id])]
+
+    def get_child_ids(self, node_id: str) -> list[str]:
+        """子のIDのリストを取得する"""
+        ids = self._ids
+        return [ids[idx] for idx in self.__child_indexes(self._index[node_id])]
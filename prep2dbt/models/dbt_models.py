@@ -3,16 +3,16 @@ from __future__ import annotations
 import io
 import os
 import textwrap
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from typing import Iterator
 
 import click
 from ruamel.yaml import YAML
 from ruamel.yaml.scalarstring import LiteralScalarString
 from sqlalchemy.sql.expression import Selectable
+from sqlalchemy.sql.selectable import CTE
 
-from prep2dbt.sqlalchemy_utils import (compile_sql_statements,
-                                       replace_table_name_to_jinja_tags)
+from prep2dbt.sqlalchemy_utils import build_dbt_tags, compile_sql_statements
 
 
 @dataclass(frozen=True)
@@ -22,23 +22,28 @@ class Sql(object):
     converterによって、nodeから変換される
     """
 
-    alchemy_statements: Selectable  # コンパイル前のsqlalchemyオブジェクト
-    compiled_sql: str  # コンパイル後の生SQL
-    dbt_sql: str  # table名→refタグの置き換えなどの操作がされた、dbt向けSQL
+    alchemy_statements: Selectable | None  # コンパイル前のsqlalchemyオブジェクト（キャッシュから復元したものはNone）
+    dbt_sql: str  # table名をrefタグなどでコンパイルした、dbt向けSQL
 
     @classmethod
     def create_model_reference_model_sql_by_statements(
-        cls, alchemy_statements: Selectable, table_names: list[str]
+        cls,
+        alchemy_statements: Selectable,
+        table_names: list[str],
+        cte_models: dict[CTE, str] | None = None,
     ) -> Sql:
         """
         Alchemyのオブジェクトから、refタグを用いて親テーブルを参照するようなSQLを生成します。
+        cte_modelsを渡すと、別のモデルに切り出したCTE（CTE -> モデル名）も、refタグで参照します。
         """
-        compiled_sql = compile_sql_statements(alchemy_statements)
-        dbt_sql = replace_table_name_to_jinja_tags(
-            compiled_sql, list(table_names), "model"
+        cte_tags: dict[CTE, str] = {}
+        if cte_models:
+            model_tags = build_dbt_tags(cte_models.values(), "model")
+            cte_tags = {cte: model_tags[name] for cte, name in cte_models.items()}
+        dbt_sql = compile_sql_statements(
+            alchemy_statements, build_dbt_tags(table_names, "model"), cte_tags
         )
-
-        return Sql(alchemy_statements, compiled_sql, dbt_sql)
+        return Sql(alchemy_statements, dbt_sql)
 
     @classmethod
     def create_source_refference_model_by_statements(
@@ -50,20 +55,29 @@ class Sql(object):
         c = click.get_current_context()
         source_name = c.params["source_name"]
 
-        compiled_sql = compile_sql_statements(alchemy_statements)
-        dbt_sql = replace_table_name_to_jinja_tags(
-            compiled_sql, table_names, tag_type="source", source_name=source_name
+        dbt_sql = compile_sql_statements(
+            alchemy_statements,
+            build_dbt_tags(table_names, tag_type="source", source_name=source_name),
         )
-        return Sql(alchemy_statements, compiled_sql, dbt_sql)
+        return Sql(alchemy_statements, dbt_sql)
+
+    def without_statements(self) -> Sql:
+        """コンパイル前のsqlalchemyオブジェクトを除いたSQL文を返す。キャッシュに保存するときに使う。"""
+        return Sql(None, self.dbt_sql)
 
     def write_raw_sql(self, path: str) -> None:
-        """コンパイル済みSQLをファイルに保存する。"""
+        """
+        table名をタグにしない生SQLをコンパイルして、ファイルに保存する。
+        コンパイル前のsqlalchemyオブジェクトが必要なので、キャッシュから復元したSQL文では使えない。
+        """
+        if self.alchemy_statements is None:
+            raise ValueError("コンパイル前のsqlalchemyオブジェクトがありません。")
         with click.open_file(
             path,
             mode="w",
             encoding="UTF-8",
         ) as f:
-            click.echo(self.compiled_sql, file=f)
+            click.echo(compile_sql_statements(self.alchemy_statements), file=f)
 
     def write_dbt_sql(self, path: str) -> None:
         """dbtタグ付与ずみSQLをファイルに保存する。"""
@@ -82,6 +96,7 @@ class Yml(object):
     """
 
     raw: dict
+    text: str = field(default="", compare=False)  # YAMLテキストに変換済みなら、その結果
 
     def __to_literal_scalar_string(self, s):
         if not type(s) is str:
@@ -126,21 +141,31 @@ class Yml(object):
 
     def __str__(self) -> str:
         """runame.yamlで辞書をYAML構造にしてから文字にする。"""
+        if self.text:
+            return self.text
         f = io.StringIO()
         yaml = YAML()
         yaml.dump(self.raw, f)
         f.seek(0)
         return f.read()
 
+    def rendered(self) -> Yml:
+        """YAMLテキストに変換した結果を持たせる。書き出すときに、もう一度変換せずに済む。"""
+        if self.text:
+            return self
+        return replace(self, text=str(self))
+
     def write(self, path: str) -> None:
         """yamlファイルに保存する。"""
-        yaml = YAML()
         with click.open_file(
             path,
             mode="w",
             encoding="UTF-8",
         ) as f:
-            yaml.dump(self.raw, f)
+            if self.text:
+                f.write(self.text)
+            else:
+                YAML().dump(self.raw, f)
 
 
 @dataclass(frozen=True)
@@ -154,6 +179,14 @@ class DbtModel(object):
     model_name: str
     resource_type: str  # 'model' or 'source'
 
+    def rendered(self) -> DbtModel:
+        """
+        コンパイル前のsqlalchemyオブジェクトを除き、YAMLをテキストに変換したdbtモデルを返す。
+        書き出しに必要なものだけを持つので、小さく保存できる。
+        """
+        sql = self.sql.without_statements() if self.sql is not None else None
+        return DbtModel(sql, self.yml.rendered(), self.model_name, self.resource_type)
+
 
 @dataclass(frozen=True)
 class DbtModels(object):
@@ -173,6 +206,10 @@ class DbtModels(object):
         merged.extend(models.models)
         return self.__class__(merged)
 
+    def rendered(self) -> DbtModels:
+        """各dbtモデルをDbtModel.renderedで変換したコレクションを返す"""
+        return self.__class__([model.rendered() for model in self.models])
+
     def as_tuple(self) -> tuple[DbtModel, ...]:
         return tuple(self.models)
 
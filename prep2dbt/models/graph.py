@@ -10,6 +10,43 @@ from sqlalchemy import Table
 from prep2dbt.models.node import ModelColumns, Node
 
 
+@dataclass(frozen=True)
+class DagTopology:
+    """
+    DAGの実行順に関する情報。エッジが変更されるまで使いまわす。
+    """
+
+    # ルートからの深さ順にまとめたノードIDのリスト
+    generations: list[set[str]]
+    # トポロジカル順のノードIDのリスト（世代順に並べたもの）
+    order: list[str]
+    # ノードID -> 世代（ルートからの最長距離）
+    generation_index: dict[str, int]
+
+    @property
+    def depth(self) -> int:
+        """深さ（最長パスのノード数）"""
+        return len(self.generations)
+
+    @property
+    def longest_path_length(self) -> int:
+        """最長パスの長さ（エッジ数）"""
+        return max(self.depth - 1, 0)
+
+    @classmethod
+    def from_generations(cls, generations: list[list[str]]) -> DagTopology:
+        """世代ごとのノードIDのリストから作成する"""
+        return DagTopology(
+            [set(generation) for generation in generations],
+            [node_id for generation in generations for node_id in generation],
+            {
+                node_id: idx
+                for idx, generation in enumerate(generations)
+                for node_id in generation
+            },
+        )
+
+
 @dataclass
 class DAG:
     """
@@ -17,43 +54,101 @@ class DAG:
     """
 
     graph: nx.DiGraph = field(default_factory=nx.DiGraph)
+    # 子ノードID -> ネームスペース -> 親ノードID。エッジの追加時に作っておき、親のnextNodesを毎回走査しないようにする。
+    namespace_index: dict[str, dict[str, str]] = field(default_factory=dict)
+    # 実行順の情報。ノードかエッジが追加されたら作り直す。
+    _topology: DagTopology | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     @property
     def nodes(self) -> NodeView:
         """nodes"""
         return self.graph.nodes
 
+    @property
+    def edges(self) -> list[tuple[str, str]]:
+        """エッジ（親ノードID, 子ノードID）のリスト。追加した順に並べる"""
+        return list(self.graph.edges)
+
     def add_node(self, node: Node) -> None:
         """ノードを追加します。もしすでに同名ノードが存在しても、黙って内容を置き換えます。"""
+        if node.id not in self.graph:
+            self._topology = None
         # node追加
         self.graph.add_node(node.id)
         self.graph.nodes[node.id]["data"] = node
 
-    def add_edge(self, from_node_id: str, to_node_id: str) -> None:
-        """エッジを追加します。"""
+    def add_edge(
+        self, from_node_id: str, to_node_id: str, namespace: str | None = None
+    ) -> None:
+        """エッジを追加します。ネームスペースが指定されたら、インデックスにも登録します。"""
+        if not self.graph.has_edge(from_node_id, to_node_id):
+            self._topology = None
         self.graph.add_edge(from_node_id, to_node_id)
+        self._register_namespace(from_node_id, to_node_id, namespace)
+
+    def _register_namespace(
+        self, from_node_id: str, to_node_id: str, namespace: str | None
+    ) -> None:
+        """子ノードとネームスペースから、親ノードを引けるようにインデックスに登録します。"""
+        if namespace is not None:
+            self.namespace_index.setdefault(to_node_id, {})[namespace] = from_node_id
+
+    def _update_namespace_index(self, sub_dag: DAG) -> None:
+        """サブグラフのインデックスを取り込みます。同じネームスペースはサブグラフ側で上書きします。"""
+        for to_node_id, parents in sub_dag.namespace_index.items():
+            self.namespace_index.setdefault(to_node_id, {}).update(parents)
 
     def add_node_with_edge(self, node: Node) -> None:
         """ノードと、付属するエッジを追加します。"""
         # node追加
-        self.graph.add_node(node.id)
-        self.graph.nodes[node.id]["data"] = node
+        self.add_node(node)
         # edge追加
         if "nextNodes" in node.raw_dict:
             if len(node.raw_dict["nextNodes"]) > 0:
                 for next_node in node.raw_dict["nextNodes"]:
-                    self.graph.add_edge(node.id, next_node["nextNodeId"])
+                    self.add_edge(
+                        node.id,
+                        next_node["nextNodeId"],
+                        next_node.get("nextNamespace"),
+                    )
 
     def merge(self, sub_dag: DAG) -> DAG:
         """与えられたサブグラフを結合したDAGを作成します。"""
         merged_graph = nx.compose(self.graph, sub_dag.graph)
-        return DAG(merged_graph)
+        merged = DAG(merged_graph)
+        merged._update_namespace_index(self)
+        merged._update_namespace_index(sub_dag)
+        return merged
+
+    def add_subgraph(self, sub_dag: DAG) -> None:
+        """
+        与えられたサブグラフのノードとエッジを、このDAGに直接追加します。
+        mergeと違ってグラフ全体をコピーしないため、サブグラフの大きさに比例した時間で済みます。
+        同じノードが既に存在する場合は、mergeと同じくサブグラフ側の属性で上書きします。
+        """
+        self.graph.update(sub_dag.graph)
+        self._update_namespace_index(sub_dag)
+        self._topology = None
+
+    @property
+    def topology(self) -> DagTopology:
+        """
+        実行順の情報。はじめて参照されたときに計算し、エッジが変更されるまで使いまわします。
+        add_nodeによるノードの置き換えでは、作り直しません。
+        """
+        if self._topology is None:
+            self._topology = DagTopology.from_generations(self._sort_generations())
+        return self._topology
+
+    def _sort_generations(self) -> list[list[str]]:
+        """実行順にノードをソートして、世代ごとのノードIDのリストを作ります。"""
+        return list(nx.topological_generations(self.graph))
 
     def nodes_per_generation(self) -> list[set[str]]:
         """実行順にノードをソートして、世代順のノードIDのリストを作って返します。"""
-        return [
-            set(generation) for generation in nx.topological_generations(self.graph)
-        ]
+        return list(self.topology.generations)
 
     def get_node_by_id(self, node_id: str) -> Node:
         """IDからNodeを取得する"""
@@ -63,12 +158,16 @@ class DAG:
         """親のIDのリストを取得する"""
         return list(self.graph.predecessors(node_id))
 
+    def get_child_ids(self, node_id: str) -> list[str]:
+        """子のIDのリストを取得する"""
+        return list(self.graph.successors(node_id))
+
     def get_parent_model_names(self, node_id: str) -> list[str]:
         """親のモデル名のリストを取得する"""
         parent_ids = self.get_parent_ids(node_id)
         result = []
         for parent_id in parent_ids:
-            parent_node = self.graph.nodes[parent_id]["data"]
+            parent_node = self.get_node_by_id(parent_id)
             if parent_node.model_name.is_applicable:
                 result.append(parent_node.model_name.value)
             else:
@@ -76,17 +175,36 @@ class DAG:
 
         return result
 
+    def get_parent_subgraph(self, node_id: str) -> DAG:
+        """
+        ノードと、その親だけを含むサブグラフを作る。
+        カラム定義の計算は自分と親のノードしか参照しないため、別プロセスではこのサブグラフで計算できる。
+        """
+        sub_dag = DAG()
+        sub_dag.add_node(self.get_node_by_id(node_id))
+        for parent_id in self.get_parent_ids(node_id):
+            try:
+                sub_dag.add_node(self.get_node_by_id(parent_id))
+            except KeyError:
+                # データのない親は、エッジだけを追加する
+                pass
+            sub_dag.add_edge(parent_id, node_id)
+        sub_dag.namespace_index[node_id] = dict(
+            self.get_parent_ids_by_namespace(node_id)
+        )
+        return sub_dag
+
+    def get_parent_ids_by_namespace(self, node_id: str) -> dict[str, str]:
+        """ネームスペースごとに、親のIDを取得する"""
+        return self.namespace_index.get(node_id, {})
+
     def get_parent_by_namespace(self, node_id, namespace) -> Node:
         """ネームスペースに紐づく親ノードを取得する。"""
-        parent_ids = self.get_parent_ids(node_id)
-        for parent_id in parent_ids:
-            parent_node: Node = self.graph.nodes[parent_id]["data"]
-            for next_node in parent_node.raw_dict["nextNodes"]:
-                if next_node["nextNamespace"] == namespace:
-                    return parent_node
-
-        # 存在しなければ、アベンド
-        raise ClickException("No such namespace item exists.")
+        parent_id = self.get_parent_ids_by_namespace(node_id).get(namespace)
+        if parent_id is None:
+            # 存在しなければ、アベンド
+            raise ClickException("No such namespace item exists.")
+        return self.get_node_by_id(parent_id)
 
     def get_all_parent_columns(self, node_id: str) -> dict[str, ModelColumns]:
         """
@@ -95,18 +213,15 @@ class DAG:
         # 親がひとつもない場合は、カラム定義はUnknownとしておく。
         result = {"Default": ModelColumns.unknown()}
 
-        for parent_id in self.get_parent_ids(node_id):
-            parent_node: Node = self.graph.nodes[parent_id]["data"]
-            for next_node in parent_node.raw_dict["nextNodes"]:
-                result[next_node["nextNamespace"]] = parent_node.model_columns
+        for namespace, parent_id in self.get_parent_ids_by_namespace(node_id).items():
+            result[namespace] = self.get_node_by_id(parent_id).model_columns
         return result
 
     def get_all_parent_as_table(self, node_id: str) -> dict[str, Table]:
         """ネームスペースごとに、親テーブルをSqlAlchemy Tableとして変換して、すべて取得する。"""
-        result = {}
-        for parent_id in self.get_parent_ids(node_id):
-            parent_node: Node = self.graph.nodes[parent_id]["data"]
-            for next_node in parent_node.raw_dict["nextNodes"]:
-                result[next_node["nextNamespace"]] = parent_node.to_table()
-
-        return result
+        return {
+            namespace: self.get_node_by_id(parent_id).to_table()
+            for namespace, parent_id in self.get_parent_ids_by_namespace(
+                node_id
+            ).items()
+        }
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from prep2dbt.models.column_map import ColumnMap
+from prep2dbt.models.node import ModelColumn, ModelColumns
+
+
+@dataclass(frozen=True)
+class CachedNode:
+    """
+    前回の変換での、ステップ1つ分の変換結果
+    """
+
+    fingerprint: str  # ステップと、その上流のステップの定義から計算したハッシュ値
+    model_columns: ModelColumns
+    files: dict[str, str]  # outputsディレクトリに書き出したファイル名 -> ファイルの内容
+    # 変換で数えた最適化の件数（click.Context.metaのキー -> 件数の名前 -> 件数）
+    stats: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        """JSONにできる辞書にする"""
+        return {
+            "fingerprint": self.fingerprint,
+            "model_columns": {
+                "status": self.model_columns.status,
+                "columns": [
+                    [col.name, col.data_type, col.value]
+                    for col in self.model_columns.columns.values()
+                ],
+            },
+            "files": self.files,
+            "stats": self.stats,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CachedNode:
+        """to_dictでつくった辞書から復元する"""
+        model_columns = ModelColumns(
+            data["model_columns"]["status"],
+            ColumnMap.from_columns(
+                ModelColumn(name, data_type, value)
+                for name, data_type, value in data["model_columns"]["columns"]
+            ),
+        )
+        return CachedNode(
+            data["fingerprint"], model_columns, dict(data["files"]), data["stats"]
+        )
+
+
+@dataclass(frozen=True)
+class IncrementalCache:
+    """
+    差分変換のために作業ディレクトリへ保存する、前回の変換結果
+
+    options_key : 変換結果に影響する実行時オプションとツールのバージョン。
+    変わっていれば、すべてのステップを変換しなおす。
+    """
+
+    options_key: str = ""
+    nodes: dict[str, CachedNode] = field(default_factory=dict)
+
+    def get_reusable_node(self, node_id: str, fingerprint: str) -> CachedNode | None:
+        """ハッシュ値が前回と同じなら、前回の変換結果を返す。なければNone"""
+        cached = self.nodes.get(node_id)
+        if cached is None or cached.fingerprint != fingerprint:
+            return None
+        return cached
+
+    def to_dict(self) -> dict:
+        """JSONにできる辞書にする"""
+        return {
+            "options_key": self.options_key,
+            "nodes": {node_id: node.to_dict() for node_id, node in self.nodes.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> IncrementalCache:
+        """to_dictでつくった辞書から復元する"""
+        return IncrementalCache(
+            data["options_key"],
+            {
+                node_id: CachedNode.from_dict(node)
+                for node_id, node in data["nodes"].items()
+            },
+        )
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, replace
+import hashlib
+import json
+from dataclasses import dataclass, field, replace
+from typing import Any, Collection, Iterable, Mapping
 
 from click import ClickException
 from sqlalchemy import Column, MetaData, String, Table
 from sqlalchemy.sql.expression import ColumnElement
 
+from prep2dbt.json_utils import LazyRawDict
+from prep2dbt.models.column_map import ColumnMap
+
+# ノードの定義。jsonをデコードした辞書か、必要な要素だけを遅延してデコードするLazyRawDict
+NodeDict = Mapping[str, Any]
+
 
 @dataclass(frozen=True)
 class ModelColumn:
@@ -44,51 +53,70 @@ class ModelColumns:
     Applicable : 計算後
     Unknown : 不明
     を示す。
+
+    カラムは、列名をキーにして追加された順に保持する。列名での参照はO(1)で、SELECTの列の並びも追加順になる。
+    変更のたびに新しいインスタンスを返し、元のインスタンスは変更しない。
+    変更されなかったカラムは、元のインスタンスと共有される（ColumnMapを参照）。
     """
 
     status: str
-    value: set[ModelColumn]
+    columns: ColumnMap  # 列名 -> カラム（追加順）
 
     @classmethod
     def initialized(cls) -> ModelColumns:
         """初期"""
-        return ModelColumns("Not Applicable", set())
+        return ModelColumns("Not Applicable", ColumnMap({}))
 
     @classmethod
-    def calculated(cls, value: set[ModelColumn]) -> ModelColumns:
-        """計算後"""
-        if len(value) > 0:
-            return ModelColumns("Applicable", value)
+    def calculated(cls, value: Iterable[ModelColumn]) -> ModelColumns:
+        """
+        計算後
+        同一カラム名の要素が複数ある場合は、後ろの要素で置き換える。
+        """
+        columns = ColumnMap.from_columns(value)
+        if len(columns) > 0:
+            return ModelColumns("Applicable", columns)
         else:
-            return ModelColumns("Unknown", value)
+            return ModelColumns("Unknown", columns)
 
     @classmethod
     def unknown(cls) -> ModelColumns:
         """不明"""
-        return ModelColumns("Unknown", set())
+        return ModelColumns("Unknown", ColumnMap({}))
 
     @property
     def is_applicable(self) -> bool:
         """使用可能か確かめる"""
         return self.status == "Applicable"
 
+    @property
+    def value(self) -> set[ModelColumn]:
+        """カラムのセット（コピー）"""
+        return set(self.columns.values())
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        ステータスとカラムの内容から作ったハッシュ値。違うカラム定義なら違う値になる。
+        作られ方が違えば同じカラム定義でも別の値になることがあるので、比べるときはcontent_digestを使う。
+        """
+        return "{0}:{1}".format(self.status, self.columns.fingerprint)
+
+    @property
+    def content_digest(self) -> str:
+        """
+        ステータスとカラムの内容だけから作ったハッシュ値。作られ方によらず、同じカラム定義なら同じ値になる。
+        """
+        return "{0}:{1}".format(self.status, self.columns.content_digest)
+
     def add(self, col: ModelColumn) -> ModelColumns:
         """
         カラムを追加する
-        同一カラム名の要素がすでにある場合は、与えられたカラム定義で置き換える。
+        同一カラム名の要素がすでにある場合は、与えられたカラム定義で置き換える（並び順は変えない）。
         不明なカラム定義の場合は、何もしない。
         """
         if self.is_applicable:
-            if col.name in self.names_list():
-                new_cols = self.value
-                for new_col in new_cols:
-                    if new_col.name == col.name:
-                        remove_target = new_col
-                new_cols.remove(remove_target)
-                new_cols.add(col)
-                return ModelColumns.calculated(new_cols)
-            else:
-                return ModelColumns.calculated(self.value | set([col]))
+            return ModelColumns("Applicable", self.columns.set(col))
         return self
 
     def merge(self, other: ModelColumns) -> ModelColumns:
@@ -98,10 +126,9 @@ class ModelColumns:
         不明なカラム定義の場合は、何もしない。
         """
         if self.is_applicable:
-            new = self
-            for new_col in other.value:
-                new = new.add(new_col)
-            return new
+            return ModelColumns(
+                "Applicable", self.columns.update(other.columns.values())
+            )
         return self
 
     def names_list(self) -> list[str]:
@@ -110,20 +137,25 @@ class ModelColumns:
         不明なら、空のリストを返す
         """
         if self.is_applicable:
-            return [column.name for column in self.value]
+            return list(self.columns.keys())
         else:
             return []
 
+    def has_column_by_name(self, name: str) -> bool:
+        """
+        指定された名前のカラムがあるか確かめる
+        不明なら、False
+        """
+        return self.is_applicable and name in self.columns
+
     def get_column_by_name(self, name: str) -> ModelColumn:
         """
         名前からカラムをとりだす。
         なかったらException
         不明でも、Exception
         """
-        if self.is_applicable:
-            for column in self.value:
-                if name == column.name:
-                    return column
+        if self.has_column_by_name(name):
+            return self.columns[name]
         raise ClickException("カラムが見つかりませんでした。")
 
     def remove_column_by_name(self, name: str) -> ModelColumns:
@@ -133,35 +165,47 @@ class ModelColumns:
         不明なら、何もしない
         消した結果、カラムが0個になったら、不明にする
         """
-        if self.is_applicable and name in self.names_list():
-            new_cols = self.value
-            delete_target = self.get_column_by_name(name)
-            new_cols.remove(delete_target)
+        if self.has_column_by_name(name):
+            new_cols = self.columns.remove(name)
             if len(new_cols) > 0:
-                return ModelColumns.calculated(new_cols)
+                return ModelColumns("Applicable", new_cols)
             else:
                 return ModelColumns.unknown()
         else:
             return self
 
+    def keep_columns_by_names(self, names: Collection[str]) -> ModelColumns:
+        """
+        指定された名前のカラムだけを残す（並び順は変えない）
+        不明なら、何もしない
+        残した結果、カラムが0個になったら、不明にする
+        """
+        if not self.is_applicable:
+            return self
+        return ModelColumns.calculated(
+            col for col in self.columns.values() if col.name in names
+        )
+
     def to_alchemy_obj_list(self, with_value: bool = False) -> list[ColumnElement]:
         """
         SQLAlchemyのカラムに変換する
         不明の場合は、starを返す
         """
         if self.is_applicable:
-            return [col.to_alchemy_obj(with_value) for col in self.value]
+            return [col.to_alchemy_obj(with_value) for col in self.columns.values()]
         else:
             return [Column("*", String, quote=False)]
 
     def flush_values(self) -> ModelColumns:
         """
         各列のvalue要素をからにする
+        valueを持つカラムだけを作り直し、ひとつもなければ自分自身を返す。
         """
-        new_cols = []
-        for col in self.value:
-            new_cols.append(ModelColumn(col.name, col.data_type))
-        return ModelColumns.calculated(set(new_cols))
+        if not self.is_applicable:
+            return ModelColumns.unknown()
+        if self.columns.valued_count == 0:
+            return self
+        return ModelColumns("Applicable", self.columns.flush_values())
 
 
 @dataclass(frozen=True)
@@ -198,6 +242,57 @@ class ModelName:
         return self.status == "Applicable"
 
 
+@dataclass(frozen=True)
+class AnnotationColumns:
+    """
+    beforeActionAnnotation・afterActionAnnotationの各ステップのカラム定義
+
+    SQLの生成では、各アノテーションへ入力するカラム定義が必要になる。
+    カラム定義の計算時に記録しておき、SQLの生成で計算しなおさずに使いまわす。
+
+    status:
+    Not Applicable : 初期（未計算）
+    Applicable : カラム定義の計算後
+    parent_columns : beforeActionAnnotationsを適用したあとの、ネームスペースごとの親のカラム定義
+    performed_columns : ユーザ定義の処理のあと、afterActionAnnotationsを適用する前のカラム定義
+    before_inputs : beforeActionAnnotationsの順に、各アノテーションへ入力したカラム定義（値はflush済み）
+    after_inputs : afterActionAnnotationsの順に、各アノテーションへ入力したカラム定義（値はflush済み）
+    """
+
+    status: str = "Not Applicable"
+    parent_columns: Mapping[str, ModelColumns] = field(default_factory=dict)
+    performed_columns: ModelColumns = field(default_factory=ModelColumns.unknown)
+    before_inputs: tuple[ModelColumns, ...] = ()
+    after_inputs: tuple[ModelColumns, ...] = ()
+
+    @classmethod
+    def initialized(cls) -> AnnotationColumns:
+        """初期"""
+        return AnnotationColumns()
+
+    @classmethod
+    def calculated(
+        cls,
+        parent_columns: Mapping[str, ModelColumns],
+        performed_columns: ModelColumns,
+        before_inputs: Iterable[ModelColumns],
+        after_inputs: Iterable[ModelColumns],
+    ) -> AnnotationColumns:
+        """計算後"""
+        return AnnotationColumns(
+            "Applicable",
+            dict(parent_columns),
+            performed_columns,
+            tuple(before_inputs),
+            tuple(after_inputs),
+        )
+
+    @property
+    def is_applicable(self) -> bool:
+        """使用可能か確かめる"""
+        return self.status == "Applicable"
+
+
 @dataclass(frozen=True)
 class Node:
     """
@@ -207,10 +302,14 @@ class Node:
     id: str
     name: str
     node_type: str
-    raw_dict: dict
+    raw_dict: NodeDict
     model_name: ModelName
     model_columns: ModelColumns
     is_unknown: bool = False
+    annotation_columns: AnnotationColumns = field(
+        default_factory=AnnotationColumns.initialized
+    )
+    pruned_columns: tuple[str, ...] = ()  # カラムの削減で、取り除いたカラム名
 
     def copy_with_model_name(self, new_model_name: ModelName) -> Node:
         """
@@ -224,6 +323,41 @@ class Node:
         """
         return replace(self, model_columns=new_model_columns)
 
+    def copy_with_annotation_columns(
+        self, new_annotation_columns: AnnotationColumns
+    ) -> Node:
+        """
+        annotation_columnsのみ更新された同一クラスのノードを新規にインスタンス化する
+        """
+        return replace(self, annotation_columns=new_annotation_columns)
+
+    def copy_with_pruned_columns(
+        self, new_model_columns: ModelColumns, pruned_columns: Iterable[str]
+    ) -> Node:
+        """
+        カラムを削減したmodel_columnsと、取り除いたカラム名で更新された同一クラスのノードを新規にインスタンス化する
+        """
+        return replace(
+            self, model_columns=new_model_columns, pruned_columns=tuple(pruned_columns)
+        )
+
+    def digest(self) -> str:
+        """
+        ステップの定義（種類、モデル名、jsonの内容）のハッシュ値を返す。
+        jsonの内容は、デコード済みかどうかに関係なく、すべてデコードしてから計算する。
+        """
+        if isinstance(self.raw_dict, LazyRawDict):
+            raw_dict = self.raw_dict.to_dict()
+        else:
+            raw_dict = dict(self.raw_dict)
+        content = json.dumps(
+            [self.node_type, self.model_name.value, raw_dict],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.blake2b(content.encode("UTF-8"), digest_size=16).hexdigest()
+
     def to_table(self, model_name: str = "") -> Table:
         """
         NodeをSqlalchemyテーブルに変換する
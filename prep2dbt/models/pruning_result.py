@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PrunedModel:
+    """
+    カラムの削減で、カラムを取り除いたモデル1つ分の結果
+    """
+
+    model_name: str
+    node_name: str
+    column_count: int  # 削減前のカラム数
+    pruned_columns: tuple[str, ...]  # 取り除いたカラム名
+
+    def to_csv(self) -> str:
+        return (
+            self.model_name
+            + ","
+            + self.node_name.replace(",", " ")
+            + ","
+            + str(self.column_count)
+            + ","
+            + str(len(self.pruned_columns))
+            + ","
+            + " ".join(self.pruned_columns)
+        )
+
+
+@dataclass(frozen=True)
+class PruningResult:
+    """
+    カラムの削減の結果
+    """
+
+    models: tuple[PrunedModel, ...] = ()
+    error: str = ""  # 削減をとりやめた場合のメッセージ
+
+    @property
+    def pruned_count(self) -> int:
+        """取り除いたカラムの総数"""
+        return sum(len(model.pruned_columns) for model in self.models)
+
+    def to_csv(self, header=True) -> str:
+        import os
+
+        result = ""
+
+        if header:
+            result = "model_name,name,column_count,pruned_count,pruned_columns"
+
+        for model in self.models:
+            result = result + os.linesep + model.to_csv()
+
+        return result
@@ -2,6 +2,7 @@ import os
 
 import click
 
+from prep2dbt.cache_services import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_SIZE
 from prep2dbt.exceptions import IllegAlargumentException
 
 
@@ -108,3 +109,113 @@ prefix = click.option(
     default="",
     callback=validate_prefix,
 )
+
+
+graph_backend = click.option(
+    "--graph-backend",
+    help="グラフの実装です。'networkx'（デフォルト）か、大きなフロー向けの'compact'を指定できます。",
+    type=click.Choice(["networkx", "compact"]),
+    default="networkx",
+)
+
+
+naming = click.option(
+    "--naming",
+    help="モデル名の連番のふり方です。'sequential'（デフォルト）はステップのIDの順に連番をふります。"
+    "'stable'は作業ディレクトリのmodel_names.jsonに保存したモデル名を引き継ぎ、変更のないステップのモデル名を変えません。",
+    type=click.Choice(["sequential", "stable"]),
+    default="sequential",
+)
+
+jobs = click.option(
+    "--jobs",
+    "-j",
+    help="カラム定義の計算で、同じ世代のステップを並列に計算するプロセスの数です。デフォルトは1（並列化しない）です。",
+    type=click.IntRange(min=1),
+    default=1,
+)
+
+incremental = click.option(
+    "--incremental",
+    help="作業ディレクトリに保存した前回の変換結果を使いまわし、変更されたステップとその下流のステップだけを変換しなおします。",
+    is_flag=True,
+    default=False,
+)
+
+prune_columns = click.option(
+    "--prune-columns",
+    help="出力先（子のいないステップ）で使われないカラムを、各モデルから取り除きます。"
+    "取り除いたカラムは、作業ディレクトリのoutputs/pruned_columns.csvに書き出します。",
+    is_flag=True,
+    default=False,
+)
+
+push_down_filters = click.option(
+    "--push-down-filters",
+    help="フィルターを、参照するカラムを変えないアノテーションや、結合で値がNULLで補われない側をこえて、できるだけソースの近くへ移します。",
+    is_flag=True,
+    default=False,
+)
+
+fuse_projections = click.option(
+    "--fuse-projections",
+    help="ステップの中で続く、列を選ぶだけのアノテーション（計算フィールドの追加、名前の変更、列の削除など）のCTEを、1つのSELECTに統合します。"
+    "同じステップで名前を変えた列や計算した列を参照する計算フィールドは、式を書き換えないため統合しません。",
+    is_flag=True,
+    default=False,
+)
+
+max_cte_depth = click.option(
+    "--max-cte-depth",
+    help="モデルのCTEの深さ（参照をたどったときに続くCTEの数）の上限です。超えるモデルは、一部のCTEを中間モデルに切り出して分割します。"
+    "デフォルトは分割しません。",
+    type=click.IntRange(min=2),
+    default=None,
+)
+
+split_materialized = click.option(
+    "--split-materialized",
+    help="分割で切り出した中間モデルのマテリアライズです。'ephemeral'（デフォルト）か'view'を指定できます。",
+    type=click.Choice(["ephemeral", "view"]),
+    default="ephemeral",
+)
+
+use_cache = click.option(
+    "--cache",
+    "use_cache",
+    help="ステップ単位の変換結果（コンパイル済みのSQLとYAML）をディスクにキャッシュし、同じステップの変換に使いまわします。"
+    "別のフローや作業ディレクトリの変換でも使いまわします。",
+    is_flag=True,
+    default=False,
+)
+
+cache_dir = click.option(
+    "--cache-dir",
+    help="キャッシュのディレクトリです。環境変数PREP2DBT_CACHE_DIRでも指定できます。",
+    envvar="PREP2DBT_CACHE_DIR",
+    default=DEFAULT_CACHE_DIR,
+    show_default=True,
+)
+
+cache_max_size = click.option(
+    "--cache-max-size",
+    help="キャッシュのサイズの上限（MB）です。超えたら、最も長く使われていない変換結果から消します。",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CACHE_MAX_SIZE,
+    show_default=True,
+)
+
+flows = click.option(
+    "--flows",
+    "-f",
+    help="変換するフローファイル（.tfl/.tflx）のあるディレクトリか、globパターン（例: 'flows/**/*.tfl'）。",
+    required=True,
+)
+
+workers = click.option(
+    "--workers",
+    "-n",
+    help="一括変換で並列に実行するプロセスの数です。デフォルトはCPUの数です。",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+)
@@ -6,7 +6,7 @@ from sqlalchemy.sql.selectable import CTE
 
 from prep2dbt.models.dbt_models import DbtModels
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumns
+from prep2dbt.models.node import ModelColumns, Node, NodeDict
 
 
 class Converter(Protocol):
@@ -15,12 +15,12 @@ class Converter(Protocol):
     """
 
     @classmethod
-    def validate(cls, node_dict: dict) -> None:
+    def validate(cls, node_dict: NodeDict) -> None:
         """ノードが変換可能かどうかチェックします。想定外のフォーマットだった場合、UnknownNodeException"""
         raise NotImplementedError()
 
     @classmethod
-    def generate_graph(cls, node_dict: dict) -> DAG:
+    def generate_graph(cls, node_dict: NodeDict) -> DAG:
         """ノードをグラフに変換します。"""
         raise NotImplementedError()
 
@@ -29,6 +29,18 @@ class Converter(Protocol):
         """カラム定義を計算し、カラムのセットを作成します。"""
         raise NotImplementedError()
 
+    @classmethod
+    def calculate_node(cls, node_id: str, graph: DAG) -> Node:
+        """カラム定義を計算し、計算したカラム定義をもつノードを作成します。"""
+        raise NotImplementedError()
+
+    @classmethod
+    def calculate_required_columns(
+        cls, node_id: str, graph: DAG, required: set[str]
+    ) -> dict[str, set[str]]:
+        """ノードに必要なカラム名から、ネームスペースごとに親に必要なカラム名を計算します。"""
+        raise NotImplementedError()
+
     @classmethod
     def generate_dbt_models(cls, node_id: str, graph: DAG) -> DbtModels:
         """DBTモデルのSQLおよびYAMLを作成します。"""
@@ -52,6 +64,20 @@ class AnnotationConverter(Protocol):
         """カラム定義を計算し、カラムのセットを作成します。"""
         raise NotImplementedError()
 
+    @classmethod
+    def calculate_required_columns(
+        cls, annotation_node: dict, cols: ModelColumns, required: set[str]
+    ) -> set[str]:
+        """処理後に必要なカラム名から、処理前に必要なカラム名を計算します。"""
+        raise NotImplementedError()
+
+    @classmethod
+    def calculate_changed_columns(
+        cls, annotation_node: dict, cols: ModelColumns
+    ) -> set[str] | None:
+        """処理で追加・変更・削除するカラム名を計算します。行を変える処理や、計算できない処理はNone。"""
+        raise NotImplementedError()
+
     @classmethod
     def generate_statements(
         cls, annotation_node: dict, cols: ModelColumns, stmts: CTE
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import Any, Protocol
+
+
+class JsonBackend(Protocol):
+    """
+    json backend protocol
+    """
+
+    name: str
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """backendが利用可能（依存パッケージがインストール済み）かどうか確かめます。"""
+        raise NotImplementedError()
+
+    @classmethod
+    def loads(cls, data: bytes | str) -> Any:
+        """jsonをデコードします。"""
+        raise NotImplementedError()
+
+    @classmethod
+    def dumps(cls, obj: Any, indent: int = 4, ensure_ascii: bool = True) -> str:
+        """オブジェクトを、json.dumpsと同じ書式のjson文字列にエンコードします。"""
+        raise NotImplementedError()
@@ -0,0 +1,157 @@
+import os
+
+import click
+
+from prep2dbt.converters.factory import ConverterFactory
+from prep2dbt.exceptions import ColumnPruningFailedException
+from prep2dbt.models.graph import DAG
+from prep2dbt.models.pruning_result import PrunedModel, PruningResult
+
+# カラムの削減の結果を書き出すファイル名
+PRUNING_RESULT_FILE_NAME = "pruned_columns.csv"
+
+
+def calculate_required_columns(graph: DAG) -> dict[str, set[str]]:
+    """
+    各ステップに必要なカラム名を、出力先（子のいないステップ）から親へさかのぼって計算する。
+
+    1. 子のいないステップは、すべてのカラムが必要
+    2. 子のいるステップは、子が必要とするカラムの和集合が必要
+    3. ステップに必要なカラムから、ステップの変換仕様が、親に必要なカラムを計算する
+
+    カラム定義が不明なステップや、変換仕様が必要なカラムを計算できないステップは、親のすべてのカラムを必要とする。
+
+    Args:
+        graph (DAG): カラム定義を計算したDAG
+
+    Returns:
+        dict[str, set[str]]: ノードID -> 必要なカラム名
+    """
+    # 子が必要とするカラム名。子のいないステップは含まない
+    needed: dict[str, set[str]] = {}
+    required: dict[str, set[str]] = {}
+    # 子は親より後ろの世代にいるので、後ろの世代から計算すれば、子の計算がすべて済んでいる
+    for node_set in reversed(graph.nodes_per_generation()):
+        for node_id in sorted(node_set):
+            node = graph.get_node_by_id(node_id)
+            names = set(node.model_columns.names_list())
+            node_required = needed.get(node_id, names) & names
+            if len(node_required) == 0:
+                # カラムが0個のモデルはつくれないので、削減しない
+                node_required = names
+            required[node_id] = node_required
+
+            converter = ConverterFactory.get_converter_by_type(node.node_type)
+            parent_required = converter.calculate_required_columns(
+                node_id, graph, node_required
+            )
+            for namespace, parent_id in graph.get_parent_ids_by_namespace(
+                node_id
+            ).items():
+                parent_columns = graph.get_node_by_id(parent_id).model_columns
+                needed.setdefault(parent_id, set()).update(
+                    parent_required.get(namespace, set(parent_columns.names_list()))
+                )
+    return required
+
+
+def __apply_required_columns(
+    graph: DAG, required: dict[str, set[str]]
+) -> list[PrunedModel]:
+    """
+    ルートから順に、各ステップのカラムを必要なカラムだけに削減する。
+    親のカラムを削減したステップは、カラム定義を計算しなおしてから削減する。
+
+    Raises:
+        ColumnPruningFailedException: 計算しなおしたカラム定義に、必要なカラムがない場合
+    """
+    models: list[PrunedModel] = []
+    # カラムを削減したステップ
+    changed: set[str] = set()
+    for node_set in graph.nodes_per_generation():
+        for node_id in sorted(node_set):
+            original = graph.get_node_by_id(node_id)
+            node = original
+            if any(parent_id in changed for parent_id in graph.get_parent_ids(node_id)):
+                converter = ConverterFactory.get_converter_by_type(node.node_type)
+                node = converter.calculate_node(node_id, graph)
+
+            names = node.model_columns.names_list()
+            missing = required[node_id] - set(names)
+            if len(missing) > 0:
+                raise ColumnPruningFailedException(
+                    "{0}のカラム（{1}）が、親のカラムを削減すると計算できません。".format(
+                        node.name, ", ".join(sorted(missing))
+                    )
+                )
+            if node is original and len(names) == len(required[node_id]):
+                continue
+
+            original_names = original.model_columns.names_list()
+            pruned = [name for name in original_names if not name in required[node_id]]
+            new_columns = node.model_columns.keep_columns_by_names(required[node_id])
+            graph.add_node(node.copy_with_pruned_columns(new_columns, pruned))
+            # fingerprintは作られ方で変わるので、内容で比べる
+            if new_columns.content_digest != original.model_columns.content_digest:
+                changed.add(node_id)
+            if len(pruned) > 0:
+                models.append(
+                    PrunedModel(
+                        node.model_name.value,
+                        node.name,
+                        len(original_names),
+                        tuple(pruned),
+                    )
+                )
+    return models
+
+
+def prune_unused_columns(graph: DAG) -> PruningResult:
+    """
+    出力先で使われないカラムを、各ステップのモデルから取り除く。
+
+    1. 出力先から親へさかのぼり、各ステップに必要なカラムを計算する
+    2. ルートから順に、各ステップのカラムを必要なカラムだけに削減する
+
+    削減の途中で必要なカラムが計算できなくなった場合は、グラフを元に戻し、削減をとりやめる。
+
+    Args:
+        graph (DAG): カラム定義を計算したDAG
+
+    Returns:
+        PruningResult: カラムを取り除いたモデルの一覧
+    """
+    required = calculate_required_columns(graph)
+    original_nodes = [graph.get_node_by_id(node_id) for node_id in graph.nodes]
+    try:
+        models = __apply_required_columns(graph, required)
+    except ColumnPruningFailedException as e:
+        for node in original_nodes:
+            graph.add_node(node)
+        return PruningResult(error=e.format_message())
+    return PruningResult(tuple(models))
+
+
+def output_pruning_result(result: PruningResult) -> None:
+    """
+    カラムの削減の結果を出力し、モデルごとの取り除いたカラムを書き出す
+    """
+    c = click.get_current_context()
+    work_dir = c.params["work_dir"]
+
+    if result.error:
+        click.echo("カラムの削減をとりやめました。" + result.error)
+        return
+
+    click.echo(
+        "カラムの削減: {0}件のモデルから、{1}件のカラムを取り除きました。"
+        "詳細は、outputs/{2}を確認してください。".format(
+            len(result.models), result.pruned_count, PRUNING_RESULT_FILE_NAME
+        )
+    )
+    with click.open_file(
+        os.path.join(work_dir, "outputs", PRUNING_RESULT_FILE_NAME),
+        mode="w",
+        encoding="UTF-8",
+    ) as f:
+        click.echo(result.to_csv(), file=f)
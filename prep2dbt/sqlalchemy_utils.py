@@ -6,7 +6,7 @@ from typing import Any
 
 import click
 from snowflake.sqlalchemy import snowdialect
-from sqlalchemy import select, union_all
+from sqlalchemy import Table, select, union_all
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql import expression as exp
@@ -139,44 +139,138 @@ def get_dialect() -> Any:
     return DialectMapping[c.params["dialect"]].value
 
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+# コンパイル時のキーワード引数で、テーブル名 -> dbtのタグ を渡すときのキー
+DBT_TAGS_COMPILE_KEY = "dbt_tags"
+# コンパイル時のキーワード引数で、CTE -> dbtのタグ を渡すときのキー
+CTE_TAGS_COMPILE_KEY = "cte_tags"
 
 
-def compile_sql_statements(selectable) -> str:
+class DbtTagCompilerMixin:
     """
-    SqlAlchemyのselectableをSQL文にコンパイルする
+    テーブルへの参照を、dbtのタグ（{{ ref('...') }}など）でコンパイルするstatement compilerのmixin。
+    名前が完全に一致するテーブルだけを置き換えるので、他のテーブル名や列名の一部を置き換えることはない。
+    すべての列のコンパイルを通るので、@compilesではなく、dialectのstatement compilerを継承して上書きする。
+
+    CTEを別のモデルに切り出したときは、そのCTEへの参照をタグにし、WITH句にはCTEを書き出さない。
+    """
+
+    def __init__(self, dialect, statement, **kw) -> None:
+        compile_kwargs = kw.get("compile_kwargs", {})
+        self.dbt_tags = compile_kwargs.get(DBT_TAGS_COMPILE_KEY, {})
+        self.cte_tags = compile_kwargs.get(CTE_TAGS_COMPILE_KEY, {})
+        super().__init__(dialect, statement, **kw)  # type: ignore
+
+    def visit_table(self, table, **kw):
+        """FROM句などのテーブルへの参照を、タグにする"""
+        text = super().visit_table(table, **kw)  # type: ignore
+        tag = self.dbt_tags.get(table.name)
+        if tag is None or not text:
+            return text
+        return tag
+
+    def visit_column(self, column, include_table=True, **kw):
+        """テーブル名で修飾された列を、タグで修飾する"""
+        table = column.table
+        if include_table and table is not None and table.name in self.dbt_tags:
+            if isinstance(table, Table):
+                return (
+                    self.dbt_tags[table.name]
+                    + "."
+                    + super().visit_column(column, include_table=False, **kw)  # type: ignore
+                )
+        return super().visit_column(column, include_table=include_table, **kw)  # type: ignore
+
+    def visit_cte(self, cte, asfrom=False, from_linter=None, **kw):
+        """切り出したCTEへの参照を、CTE名を別名にしたタグにする。列はCTE名で修飾されたまま参照できる"""
+        tag = self.cte_tags.get(cte)
+        if tag is None:
+            return super().visit_cte(cte, asfrom=asfrom, from_linter=from_linter, **kw)  # type: ignore
+        if from_linter is not None:
+            from_linter.froms[cte] = cte.name
+        return tag + " AS " + self.preparer.format_alias(cte, cte.name)  # type: ignore
+
+
+class SqlCompiler:
+    """
+    SqlAlchemyのselectableを、変換先のdialectのSQL文にコンパイルする。
+    dialectを1つだけ持ち、1回の実行の中で使いまわす。
     """
-    # ダミーのDBセッションを生成する
-    # ダミーセッションは、dialectと関係ないので、なんのDBでつくってもよいので、とりあえずsnowflakeでつくっている
-    engine = create_engine(
-        "snowflake://{user}:{password}@{account_identifier}/".format(
-            user="dummy",
-            password="dummy",
-            account_identifier="dummy",
+
+    def __init__(self, dialect_name: str) -> None:
+        self.dialect_name = dialect_name
+        # dbtのタグでコンパイルできるよう、statement compilerを差し替えたdialectをつくる
+        base = DialectMapping[dialect_name].value
+        self.dialect = type(base)()
+        self.dialect.statement_compiler = type(
+            "DbtTag" + base.statement_compiler.__name__,
+            (DbtTagCompilerMixin, base.statement_compiler),
+            {},
         )
-    )
-    Sessionmaker = sessionmaker(bind=engine)
-    session = Sessionmaker()
 
-    q = session.query(selectable)
-    # 指定されたdialectの方言でコンパイル
-    stmt = q.statement.compile(dialect=get_dialect())
-    return str(stmt)
+    def compile(
+        self,
+        selectable,
+        dbt_tags: dict[str, str] | None = None,
+        cte_tags: dict[Any, str] | None = None,
+    ) -> str:
+        """
+        selectableをSQL文にコンパイルする。
+        モデルの最後のCTEを受け取り、そのCTEをselectする文にする。
+
+        Args:
+            selectable: コンパイルするSqlAlchemyのオブジェクト
+            dbt_tags (dict[str, str] | None): テーブル名 -> dbtのタグ。
+                名前が一致するテーブルへの参照を、コンパイル時にタグに置き換える。
+            cte_tags (dict[Any, str] | None): CTE -> dbtのタグ。
+                別のモデルに切り出したCTEへの参照を、コンパイル時にタグに置き換える。
+        """
+        return str(
+            select(selectable).compile(
+                dialect=self.dialect,
+                compile_kwargs={
+                    DBT_TAGS_COMPILE_KEY: dbt_tags or {},
+                    CTE_TAGS_COMPILE_KEY: cte_tags or {},
+                },
+            )
+        )
+
+
+# 実行中のSqlCompilerを保存する、click.Context.metaのキー
+SQL_COMPILER_META_KEY = "prep2dbt.sql_compiler"
 
 
-def replace_table_name_to_jinja_tags(
-    raw_sql, table_names, tag_type, source_name=""
+def get_sql_compiler() -> SqlCompiler:
+    """
+    実行中のSqlCompilerを返す。
+    click.Contextごと（1回の実行ごと）につくり、metaに保存して使いまわす。
+    """
+    c = click.get_current_context()
+    compiler = c.meta.get(SQL_COMPILER_META_KEY)
+    if compiler is None or compiler.dialect_name != c.params["dialect"]:
+        compiler = SqlCompiler(c.params["dialect"])
+        c.meta[SQL_COMPILER_META_KEY] = compiler
+    return compiler
+
+
+def compile_sql_statements(
+    selectable,
+    dbt_tags: dict[str, str] | None = None,
+    cte_tags: dict[Any, str] | None = None,
 ) -> str:
     """
-    生SQLから、dbt用のSQLに変換する
+    SqlAlchemyのselectableをSQL文にコンパイルする
     """
-    sql = raw_sql
+    return get_sql_compiler().compile(selectable, dbt_tags, cte_tags)
+
+
+def build_dbt_tags(table_names, tag_type, source_name="") -> dict[str, str]:
+    """
+    テーブル名から、dbtのタグ（modelはref、sourceはsource）へのマッピングをつくる
+    """
+    tags = {}
     for table in table_names:
         if tag_type == "model":
-            sql = sql.replace(table, "{{ ref('" + table + "') }}")
+            tags[table] = "{{ ref('" + table + "') }}"
         if tag_type == "source":
-            sql = sql.replace(
-                table, "{{ source('" + source_name + "', '" + table + "') }}"
-            )
-    return sql
+            tags[table] = "{{ source('" + source_name + "', '" + table + "') }}"
+    return tags
@@ -1,4 +1,6 @@
+import re
 import unicodedata
+from typing import Iterable
 
 
 def get_east_asian_width_count(text: str) -> int:
@@ -80,3 +82,79 @@ def flex(left_text: str, right_text: str, sep: str = " ", width: int = 0) -> str
     return left_text.ljust(int(width / 2) - left_gap, sep) + right_text.rjust(
         int(width / 2) - right_gap, sep
     )
+
+
+def referenced_names(expression: str, names: Iterable[str]) -> set[str]:
+    """
+    式が参照している列名を返す。
+    Tableauの式では列名を[]で囲むが、囲まれていない列名も参照とみなす。
+
+    Examples:
+        >>> referenced_names('[ORDER_ID] + AMOUNT', ['ORDER_ID', 'AMOUNT', 'STATUS'])
+            {'ORDER_ID', 'AMOUNT'}
+
+    Args:
+        expression (str): 式
+        names (Iterable[str]): 列名の候補
+
+    Returns:
+        set[str]: 式が参照している列名
+    """
+    identifiers = set(re.findall(r"\w+", expression))
+    return {
+        name for name in names if "[" + name + "]" in expression or name in identifiers
+    }
+
+
+# 行ごとに値が決まる（他の行の値によらない）Tableauの関数と、関数のように()をとるキーワード。
+# 集計関数・表計算関数は含めない。MIN/MAXは引数の数で集計にもなるので含めない。
+ROW_LOCAL_FUNCTIONS = frozenset(
+    # 論理
+    "IF IIF IFNULL ISNULL ZN AND OR NOT IN CASE WHEN THEN ELSE ELSEIF END".split()
+    # 数値
+    + "ABS ACOS ASIN ATAN ATAN2 CEILING COS COT DEGREES DIV EXP FLOOR LN LOG PI POWER".split()
+    + "RADIANS ROUND SIGN SIN SQRT SQUARE TAN".split()
+    # 文字列
+    + "ASCII CHAR CONTAINS ENDSWITH FIND FINDNTH LEFT LEN LOWER LTRIM MID PROPER".split()
+    + "REPLACE RIGHT RTRIM SPACE SPLIT STARTSWITH TRIM UPPER".split()
+    + "REGEXP_EXTRACT REGEXP_EXTRACT_NTH REGEXP_MATCH REGEXP_REPLACE".split()
+    # 日付
+    + "DATEADD DATEDIFF DATENAME DATEPARSE DATEPART DATETRUNC DAY ISDATE".split()
+    + "MAKEDATE MAKEDATETIME MAKETIME MONTH QUARTER WEEK YEAR".split()
+    + "ISOYEAR ISOQUARTER ISOWEEK ISOWEEKDAY NOW TODAY".split()
+    # 型変換
+    + "DATE DATETIME FLOAT INT STR".split()
+)
+
+
+def is_row_local_expression(expression: str) -> bool:
+    """
+    式の値が、その行の値だけで決まるか。
+    LOD式（{FIXED ...}など）や、集計関数・表計算関数（SUM、RANK、RUNNING_SUMなど）を含む式は、
+    ほかの行の値によって変わるので、行を絞りこむ前と後で値が変わりうる。
+    ROW_LOCAL_FUNCTIONSにない関数を呼ぶ式は、行ごとに決まるとは言い切れないのでFalseにする。
+
+    Examples:
+        >>> is_row_local_expression('UPPER([NAME]) + "(x)"')
+            True
+        >>> is_row_local_expression('{FIXED [ID] : SUM([AMOUNT])}')
+            False
+        >>> is_row_local_expression('RANK([AMOUNT])')
+            False
+
+    Args:
+        expression (str): 式
+
+    Returns:
+        bool: 値がその行の値だけで決まるならTrue
+    """
+    # 列名と文字列リテラルの中の括弧は、関数呼び出しやLOD式ではない
+    stripped = re.sub(
+        r"\[(?:[^\]]|\]\])*\]|\"(?:[^\"]|\"\")*\"|'(?:[^']|'')*'", " ", expression
+    )
+    if "{" in stripped:
+        return False
+    return all(
+        name.upper() in ROW_LOCAL_FUNCTIONS
+        for name in re.findall(r"(\w+)\s*\(", stripped)
+    )
@@ -197,3 +197,65 @@ FROM source)
  SELECT test_id.* 
 FROM test_id"""
         assert str(select(actual)) == expected
+
+    def test__calculate_required_columns(self):
+        in_dict = {
+            "nodeType": ".v1.AddColumn",
+            "columnName": "DOUBLE",
+            "expression": "[AMOUNT] * 2",
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated(
+            [
+                ModelColumn("ID", "integer"),
+                ModelColumn("AMOUNT", "integer"),
+                ModelColumn("NOTE", "string"),
+            ]
+        )
+        actual = AddColumnAnnotationConverter.calculate_required_columns(
+            in_dict, in_cols, {"ID", "DOUBLE"}
+        )
+        # 追加するカラムの代わりに、計算式で使うカラムが必要
+        assert actual == {"ID", "AMOUNT"}
+
+    def test__calculate_required_columns__column_is_not_aplicable(self):
+        in_dict = {
+            "nodeType": ".v1.AddColumn",
+            "columnName": "DOUBLE",
+            "expression": "[AMOUNT] * 2",
+            "name": "test",
+            "id": "test_id",
+        }
+        actual = AddColumnAnnotationConverter.calculate_required_columns(
+            in_dict, ModelColumns.unknown(), {"DOUBLE"}
+        )
+        assert actual == set()
+
+    def test__calculate_changed_columns(self):
+        in_dict = {
+            "nodeType": ".v1.AddColumn",
+            "columnName": "DOUBLE",
+            "expression": "[AMOUNT] * 2",
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated([ModelColumn("AMOUNT", "integer")])
+        actual = AddColumnAnnotationConverter.calculate_changed_columns(
+            in_dict, in_cols
+        )
+        assert actual == {"DOUBLE"}
+
+        # ほかの行の値による式（LOD式、表計算）は、行を変える処理とみなす
+        for expression in ["{FIXED [ID] : SUM([AMOUNT])}", "RANK([AMOUNT])"]:
+            actual = AddColumnAnnotationConverter.calculate_changed_columns(
+                dict(in_dict, expression=expression), in_cols
+            )
+            assert actual is None
+
+        # 変換できないアノテーションは、行を変える処理とみなす
+        del in_dict["expression"]
+        actual = AddColumnAnnotationConverter.calculate_changed_columns(
+            in_dict, in_cols
+        )
+        assert actual is None
@@ -101,3 +101,37 @@ WHERE [計算1]=1)
 FROM test_id"""
 
         assert str(select(actual)) == expected
+
+    def test__calculate_required_columns(self):
+        in_dict = {
+            "nodeType": ".v1.FilterOperation",
+            "name": "フィルター",
+            "id": "test_id",
+            "filterExpression": "[STATUS] = 'done'",
+        }
+        in_cols = ModelColumns.calculated(
+            [
+                ModelColumn("ID", "integer"),
+                ModelColumn("STATUS", "string"),
+                ModelColumn("NOTE", "string"),
+            ]
+        )
+        actual = FilterOperationAnnotationConverter.calculate_required_columns(
+            in_dict, in_cols, {"ID"}
+        )
+        # 条件式で使うカラムも必要
+        assert actual == {"ID", "STATUS"}
+
+    def test__calculate_changed_columns(self):
+        in_dict = {
+            "nodeType": ".v1.FilterOperation",
+            "name": "フィルター",
+            "id": "test_id",
+            "filterExpression": "[STATUS] = 'done'",
+        }
+        in_cols = ModelColumns.calculated([ModelColumn("STATUS", "string")])
+        actual = FilterOperationAnnotationConverter.calculate_changed_columns(
+            in_dict, in_cols
+        )
+        # フィルターは行を変える
+        assert actual is None
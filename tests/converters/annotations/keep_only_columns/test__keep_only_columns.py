@@ -236,3 +236,43 @@ FROM source)
  SELECT test_id."test_column_1" 
 FROM test_id"""
         assert str(select(actual)) == expected_1 or str(select(actual)) == expected_2
+
+    def test__calculate_required_columns(self):
+        in_dict = {
+            "nodeType": ".v2019_2_2.KeepOnlyColumns",
+            "columnNames": ["ID", "NAME"],
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated(
+            [
+                ModelColumn("ID", "integer"),
+                ModelColumn("NAME", "string"),
+                ModelColumn("NOTE", "string"),
+            ]
+        )
+        actual = KeepOnlyColumnAnnotationConverter.calculate_required_columns(
+            in_dict, in_cols, {"ID"}
+        )
+        # 残すカラムは、後で使われなくても必要
+        assert actual == {"ID", "NAME"}
+
+    def test__calculate_changed_columns(self):
+        in_dict = {
+            "nodeType": ".v2019_2_2.KeepOnlyColumns",
+            "columnNames": ["ID", "NAME"],
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated(
+            [
+                ModelColumn("ID", "integer"),
+                ModelColumn("NAME", "string"),
+                ModelColumn("NOTE", "string"),
+            ]
+        )
+        actual = KeepOnlyColumnAnnotationConverter.calculate_changed_columns(
+            in_dict, in_cols
+        )
+        # 残さないカラムが削除される
+        assert actual == {"NOTE"}
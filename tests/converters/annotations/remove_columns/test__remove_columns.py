@@ -248,3 +248,22 @@ FROM source)
  SELECT test_id."test_column_1" 
 FROM test_id"""
         assert str(select(actual)) == expected
+
+    def test__calculate_required_columns(self):
+        in_dict = {
+            "nodeType": ".v1.RemoveColumns",
+            "columnNames": ["NOTE"],
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated(
+            [
+                ModelColumn("ID", "integer"),
+                ModelColumn("NAME", "string"),
+                ModelColumn("NOTE", "string"),
+            ]
+        )
+        actual = RemoveColumnsAnnotationConverter.calculate_required_columns(
+            in_dict, in_cols, {"ID", "NOTE"}
+        )
+        assert actual == {"ID"}
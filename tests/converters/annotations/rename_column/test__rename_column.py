@@ -260,3 +260,37 @@ FROM source)
  SELECT test_id.test_column_2 
 FROM test_id"""
         assert str(select(actual)) == expected_1 or str(select(actual)) == expected_2
+
+    def test__calculate_required_columns(self):
+        in_dict = {
+            "nodeType": ".v1.RenameColumn",
+            "columnName": "NAME",
+            "rename": "CUSTOMER_NAME",
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated(
+            [ModelColumn("ID", "integer"), ModelColumn("NAME", "string")]
+        )
+        actual = RenameColumnAnnotationConverter.calculate_required_columns(
+            in_dict, in_cols, {"CUSTOMER_NAME"}
+        )
+        # 変更後の名前の代わりに、変更前の名前が必要
+        assert actual == {"NAME"}
+
+    def test__calculate_changed_columns(self):
+        in_dict = {
+            "nodeType": ".v1.RenameColumn",
+            "columnName": "NAME",
+            "rename": "CUSTOMER_NAME",
+            "name": "test",
+            "id": "test_id",
+        }
+        in_cols = ModelColumns.calculated(
+            [ModelColumn("ID", "integer"), ModelColumn("NAME", "string")]
+        )
+        actual = RenameColumnAnnotationConverter.calculate_changed_columns(
+            in_dict, in_cols
+        )
+        # 変更前と変更後の名前のどちらも変わる
+        assert actual == {"NAME", "CUSTOMER_NAME"}
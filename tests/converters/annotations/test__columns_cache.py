@@ -0,0 +1,132 @@
+import click
+
+from prep2dbt.converters.annotations.columns_cache import (
+    AnnotationColumnsCache, get_annotation_columns_cache)
+from prep2dbt.models.node import ModelColumn, ModelColumns
+
+
+def create_annotation(annotation_id: str, rename: str) -> dict:
+    return {
+        "nodeType": ".v1.RenameColumn",
+        "columnName": "a",
+        "rename": rename,
+        "id": annotation_id,
+    }
+
+
+class TestAnnotationColumnsCache:
+    def test__get_or_calculate(self):
+        cache = AnnotationColumnsCache()
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+        annotation = create_annotation("id_1", "b")
+        calls = []
+
+        def calculate():
+            calls.append(1)
+            return cols.add(ModelColumn("b", "string"))
+
+        first = cache.get_or_calculate("converter", annotation, cols, calculate)
+        # 同じ内容のカラム定義なら、別のインスタンスでもヒットする
+        same_cols = ModelColumns.calculated([ModelColumn("a", "string")])
+        second = cache.get_or_calculate("converter", annotation, same_cols, calculate)
+
+        assert second is first
+        assert len(calls) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test__get_or_calculate__built_differently(self):
+        cache = AnnotationColumnsCache()
+        annotation = create_annotation("id_1", "b")
+        cols = ModelColumns.calculated([ModelColumn("a", "string")]).add(
+            ModelColumn("c", "string")
+        )
+        same_cols = ModelColumns.calculated(
+            [ModelColumn("a", "string"), ModelColumn("c", "string")]
+        )
+
+        first = cache.get_or_calculate("converter", annotation, cols, lambda: cols)
+        # 作られ方が違っても（fingerprintが違っても）、内容が同じカラム定義ならヒットする
+        second = cache.get_or_calculate(
+            "converter", annotation, same_cols, lambda: same_cols
+        )
+
+        assert second is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test__get_or_calculate__different_key(self):
+        cache = AnnotationColumnsCache()
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+        other_cols = ModelColumns.calculated([ModelColumn("a", "int")])
+
+        cache.get_or_calculate(
+            "converter", create_annotation("id_1", "b"), cols, lambda: cols
+        )
+        cache.get_or_calculate(
+            "converter", create_annotation("id_1", "b"), other_cols, lambda: cols
+        )
+        # 同じIDでも、内容の違うアノテーションはヒットしない
+        actual = cache.get_or_calculate(
+            "converter",
+            create_annotation("id_1", "c"),
+            cols,
+            lambda: other_cols,
+        )
+
+        assert actual is other_cols
+        assert (cache.hits, cache.misses) == (0, 3)
+
+    def test__get_or_calculate__lru(self):
+        cache = AnnotationColumnsCache(maxsize=2)
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+        annotations = [create_annotation("id_{}".format(idx), "b") for idx in range(3)]
+
+        cache.get_or_calculate("converter", annotations[0], cols, lambda: cols)
+        cache.get_or_calculate("converter", annotations[1], cols, lambda: cols)
+        # 0を使ったので、1が最も長く使われていない
+        cache.get_or_calculate("converter", annotations[0], cols, lambda: cols)
+        cache.get_or_calculate("converter", annotations[2], cols, lambda: cols)
+        cache.get_or_calculate("converter", annotations[0], cols, lambda: cols)
+        cache.get_or_calculate("converter", annotations[1], cols, lambda: cols)
+
+        assert len(cache) == 2
+        assert (cache.hits, cache.misses) == (2, 4)
+
+    def test__get_or_calculate__disabled(self):
+        cache = AnnotationColumnsCache(maxsize=0)
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+
+        cache.get_or_calculate(
+            "converter", create_annotation("id", "b"), cols, lambda: cols
+        )
+        cache.get_or_calculate(
+            "converter", create_annotation("id", "b"), cols, lambda: cols
+        )
+
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    def test__clear(self):
+        cache = AnnotationColumnsCache()
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+        cache.get_or_calculate(
+            "converter", create_annotation("id", "b"), cols, lambda: cols
+        )
+
+        cache.clear()
+
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses) == (0, 0)
+
+    def test__get_annotation_columns_cache(self):
+        # 1回の実行（click.Context）の中では、同じキャッシュを使いまわす
+        with click.Context(click.Command("convert")):
+            cache = get_annotation_columns_cache()
+            assert get_annotation_columns_cache() is cache
+        # 実行ごとに、新しいキャッシュを使う
+        with click.Context(click.Command("convert")):
+            other_cache = get_annotation_columns_cache()
+            assert other_cache is not cache
+            assert len(other_cache) == 0
+        # クリックコンテキストの外では、プロセスで共有するキャッシュを使う
+        assert get_annotation_columns_cache() is get_annotation_columns_cache()
+        assert get_annotation_columns_cache() not in [cache, other_cache]
@@ -0,0 +1,217 @@
+import copy
+
+import click
+
+from prep2dbt.converters.annotations.factory import AnnotationConverterFactory
+from prep2dbt.converters.annotations.filter_pushdown import push_down_filters
+from prep2dbt.dbt_services import generate_dbt_models
+from prep2dbt.models.node import ModelColumn, ModelColumns
+from tests.mocks import context_mock
+from tests.services.test__pruning_service import FLOW_SAMPLE, create_graph
+
+
+def annotation(node_type: str, annotation_id: str, **kwargs) -> dict:
+    return dict(nodeType=node_type, name=annotation_id, id=annotation_id, **kwargs)
+
+
+def add_column(annotation_id: str, column_name: str, expression: str) -> dict:
+    return annotation(
+        ".v1.AddColumn", annotation_id, columnName=column_name, expression=expression
+    )
+
+
+def rename_column(annotation_id: str, column_name: str, rename: str) -> dict:
+    return annotation(
+        ".v1.RenameColumn", annotation_id, columnName=column_name, rename=rename
+    )
+
+
+def filter_operation(annotation_id: str, expression: str) -> dict:
+    return annotation(".v1.FilterOperation", annotation_id, filterExpression=expression)
+
+
+def with_inputs(annotations: list[dict]) -> list[tuple[dict, ModelColumns]]:
+    """a, bの2列から、各アノテーションへ入力するカラム定義を計算する"""
+    cols = ModelColumns.calculated(
+        [ModelColumn("a", "string"), ModelColumn("b", "string")]
+    )
+    result = []
+    for annotation_node in annotations:
+        flushed_cols = cols.flush_values()
+        result.append((annotation_node, flushed_cols))
+        cols = AnnotationConverterFactory.get_annotation_converter_by_type(
+            annotation_node["nodeType"]
+        ).calculate_columns(annotation_node, flushed_cols)
+    return result
+
+
+def pushed_ids(annotations: list[dict]) -> list[str]:
+    return [
+        annotation_node["id"]
+        for annotation_node, _ in push_down_filters(with_inputs(annotations))
+    ]
+
+
+def generate_sqls(flow: dict, push_down: bool = True) -> dict[str, str]:
+    """フローを変換し、ステップのID -> モデルのSQLを返す"""
+    with click.Context(click.Command("convert")) as ctx:
+        ctx.params = dict(context_mock.params, push_down_filters=push_down)
+        graph = create_graph(flow)
+        names = {
+            graph.get_node_by_id(node_id).model_name.value: node_id
+            for node_id in graph.nodes
+        }
+        return {
+            names[model.model_name]: model.sql.dbt_sql
+            for model in generate_dbt_models(graph)
+            if model.sql is not None
+        }
+
+
+def join_flow(join_type: str, filter_expressions: list[str]) -> dict:
+    """結合のあとに、フィルターを追加したフロー"""
+    flow = copy.deepcopy(FLOW_SAMPLE)
+    join = flow["nodes"]["node_4"]
+    join["actionNode"]["joinType"] = join_type
+    join["afterActionAnnotations"] = [
+        {
+            "namespace": "Default",
+            "annotationNode": filter_operation("filter_{}".format(i), expression),
+        }
+        for i, expression in enumerate(filter_expressions)
+    ]
+    return flow
+
+
+class TestFilterPushdown:
+    def test__push_down_filters(self):
+        annotations = [
+            add_column("add", "c", "[a] * 2"),
+            rename_column("rename", "b", "d"),
+            filter_operation("filter", "[a] = 1"),
+        ]
+        # 参照するカラムを変えないアノテーションより前へ移す
+        assert pushed_ids(annotations) == ["filter", "add", "rename"]
+
+    def test__push_down_filters__changed_columns(self):
+        annotations = [
+            add_column("add", "c", "[a] * 2"),
+            rename_column("rename", "b", "d"),
+            filter_operation("filter", "[d] = 1"),
+        ]
+        # 名前を変えたカラムを参照するフィルターは、名前の変更より前へ移さない
+        assert pushed_ids(annotations) == ["add", "rename", "filter"]
+
+        annotations = [
+            add_column("add", "c", "[a] * 2"),
+            filter_operation("filter", "[c] = 1"),
+        ]
+        # 追加したカラムを参照するフィルターは、移さない
+        assert pushed_ids(annotations) == ["add", "filter"]
+
+    def test__push_down_filters__not_row_local(self):
+        annotations = [
+            add_column("fixed", "c", "{FIXED [b] : SUM([a])}"),
+            filter_operation("filter", "[a] = 1"),
+        ]
+        # LOD式は、行を絞りこむと値が変わるので、フィルターを前へ移さない
+        assert pushed_ids(annotations) == ["fixed", "filter"]
+
+        annotations = [
+            add_column("rank", "c", "RANK([a])"),
+            filter_operation("filter", "[a] = 1"),
+        ]
+        # 表計算も、行を絞りこむと値が変わるので、フィルターを前へ移さない
+        assert pushed_ids(annotations) == ["rank", "filter"]
+
+        annotations = [
+            add_column("upper", "c", 'UPPER([a]) + "RANK("'),
+            filter_operation("filter", "[a] = 1"),
+        ]
+        # 行ごとに決まる関数だけの式なら、文字列の中に関数名があっても移す
+        assert pushed_ids(annotations) == ["filter", "upper"]
+
+    def test__push_down_filters__not_movable(self):
+        annotations = [
+            filter_operation("filter_1", "[b] = 1"),
+            add_column("add", "c", "[a] * 2"),
+            filter_operation("filter_2", "[a] = 1"),
+        ]
+        # フィルター同士の順番は変えない
+        assert pushed_ids(annotations) == ["filter_1", "filter_2", "add"]
+
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+        inputs = [
+            (annotation(".v1.Unknown", "unknown"), cols),
+            (filter_operation("filter", "[a] = 1"), cols),
+        ]
+        # 未対応のアノテーションをこえては移さない
+        assert push_down_filters(inputs) == inputs
+
+    def test__push_down_filters__unknown_columns(self):
+        annotations = [
+            add_column("add", "c", "[a] * 2"),
+            filter_operation("filter", "[a] = 1"),
+        ]
+        inputs = [
+            (annotation_node, ModelColumns.unknown()) for annotation_node in annotations
+        ]
+        # カラム定義が不明なら、参照するカラムがわからないので移さない
+        assert push_down_filters(inputs) == inputs
+
+    def test__generate__before_annotations(self):
+        sqls = generate_sqls(FLOW_SAMPLE)
+
+        # クリーニングのフィルターは、計算フィールドの追加より前に移す
+        assert sqls["node_2"].index("annotation_2 AS") < sqls["node_2"].index(
+            "annotation_1 AS"
+        )
+        assert "FROM \"source_Default\" \nWHERE [STATUS] = 'done'" in sqls["node_2"]
+
+        # 押し下げが無効なら、順番を変えない
+        sqls = generate_sqls(FLOW_SAMPLE, push_down=False)
+        assert sqls["node_2"].index("annotation_1 AS") < sqls["node_2"].index(
+            "annotation_2 AS"
+        )
+
+    def test__generate__inner_join(self):
+        flow = join_flow("inner", ["[NAME] = 'x'", "[DOUBLE] > 10", "[ID-1] = 1"])
+
+        sql = generate_sqls(flow)["node_4"]
+
+        # 内部結合では、両側のフィルターを結合の前へ移す
+        assert "FROM \"source_Right\" \nWHERE [NAME] = 'x'" in sql
+        assert 'FROM "source_Left" \nWHERE [DOUBLE] > 10' in sql
+        # 右側のカラムに'-1'をつけた列名を参照するフィルターは、結合のあとに残す
+        assert "FROM joined \nWHERE [ID-1] = 1" in sql
+
+    def test__generate__inner_join__stats(self, capsys):
+        generate_sqls(join_flow("inner", ["[ID-1] = 1", "[NAME] = 'x'"]))
+
+        # 結合のあとに残したフィルターは、移したフィルターに数えない
+        assert "フィルターの押し下げ: 3件のフィルターのうち、2件をソースの近くへ移しました。" in capsys.readouterr().out
+
+    def test__generate__left_join(self):
+        flow = join_flow("left", ["[NAME] = 'x'", "[DOUBLE] > 10"])
+
+        sql = generate_sqls(flow)["node_4"]
+
+        # 左結合では、左側のフィルターだけを結合の前へ移す
+        assert 'FROM "source_Left" \nWHERE [DOUBLE] > 10' in sql
+        assert "FROM joined \nWHERE [NAME] = 'x'" in sql
+
+    def test__generate__full_join(self):
+        flow = join_flow("full", ["[NAME] = 'x'", "[DOUBLE] > 10"])
+
+        sql = generate_sqls(flow)["node_4"]
+
+        # 完全外部結合では、どちらの側へも移さない
+        assert "FROM joined \nWHERE [NAME] = 'x'" in sql
+        assert '"source_Left" \nWHERE' not in sql
+        assert '"source_Right" \nWHERE' not in sql
+
+    def test__generate__stats(self, capsys):
+        generate_sqls(join_flow("left", ["[NAME] = 'x'", "[DOUBLE] > 10"]))
+
+        # クリーニングのフィルターと、左側へ移したフィルター
+        assert "フィルターの押し下げ: 3件のフィルターのうち、2件をソースの近くへ移しました。" in capsys.readouterr().out
@@ -0,0 +1,242 @@
+import click
+from sqlalchemy import MetaData, Table, select
+
+from prep2dbt.converters.annotations.projection_fusion import (
+    fuse_projections, generate_annotation_statements,
+    get_projection_fusion_stats)
+from prep2dbt.models.node import ModelColumn, ModelColumns
+from tests.mocks import context_mock
+
+ADD_COLUMN = {
+    "nodeType": ".v1.AddColumn",
+    "columnName": "c",
+    "expression": "[a] * 2",
+    "name": "add c",
+    "id": "annotation_1",
+}
+RENAME_COLUMN = {
+    "nodeType": ".v1.RenameColumn",
+    "columnName": "c",
+    "rename": "d",
+    "name": "rename c",
+    "id": "annotation_2",
+}
+REMOVE_COLUMNS = {
+    "nodeType": ".v1.RemoveColumns",
+    "columnNames": ["b"],
+    "name": "remove b",
+    "id": "annotation_3",
+}
+QUICK_CALC_COLUMN = {
+    "nodeType": ".v2018_3_3.QuickCalcColumn",
+    "columnName": "e",
+    "expression": "UPPER([b])",
+    "name": "upper b",
+    "id": "annotation_5",
+}
+RENAME_QUICK_CALC_COLUMN = {
+    "nodeType": ".v1.RenameColumn",
+    "columnName": "e",
+    "rename": "f",
+    "name": "rename e",
+    "id": "annotation_6",
+}
+FILTER_OPERATION = {
+    "nodeType": ".v1.FilterOperation",
+    "filterExpression": "[a] = 1",
+    "name": "filter",
+    "id": "annotation_4",
+}
+
+
+def create_source():
+    cols = ModelColumns.calculated(
+        [ModelColumn("a", "string"), ModelColumn("b", "string")]
+    )
+    table = Table("test_table", MetaData(), *cols.to_alchemy_obj_list())
+    return cols, select(table).cte("source")
+
+
+def generate(annotations: list[dict], fuse: bool) -> tuple[str, tuple[int, int]]:
+    """アノテーションを順に適用したSQLと、射影の統合の件数を返す"""
+    with click.Context(click.Command("convert")) as ctx:
+        ctx.params = dict(context_mock.params, fuse_projections=fuse)
+        cols, stmts = create_source()
+        for i, annotation in enumerate(annotations):
+            flushed_cols = cols.flush_values()
+            stmts = generate_annotation_statements(
+                annotation, flushed_cols, stmts, i > 0
+            )
+            cols = ModelColumns.calculated(
+                [ModelColumn(name, "string") for name in stmts.c.keys()]  # type: ignore
+            )
+        stats = get_projection_fusion_stats()
+        return str(select(stmts)), (stats.annotation_ctes, stats.fused_ctes)
+
+
+class TestProjectionFusion:
+    def test__fuse_projections(self):
+        cols, source = create_source()
+        added = (
+            select(
+                *cols.add(ModelColumn("c", "string", "[a] * 2")).to_alchemy_obj_list(
+                    True
+                )
+            )
+            .select_from(source)
+            .cte("annotation_1")
+        )
+        renamed = (
+            select(
+                *ModelColumns.calculated(
+                    [
+                        ModelColumn("a", "string"),
+                        ModelColumn("b", "string"),
+                        ModelColumn("d", "string", "c"),
+                    ]
+                ).to_alchemy_obj_list(True)
+            )
+            .select_from(added)
+            .cte("annotation_2")
+        )
+
+        actual = fuse_projections(renamed, added)
+
+        assert actual is not None
+        assert actual.name == "annotation_2"
+        # 参照するinnerの列を、innerでの値に置き換えて、innerのFROMから直接選ぶ
+        assert (
+            str(select(actual))
+            == """WITH source AS 
+(SELECT test_table."a" AS "a", test_table."b" AS "b" 
+FROM test_table), 
+annotation_2 AS 
+(SELECT "a", "b", "[a] * 2" AS d 
+FROM source)
+ SELECT annotation_2."a", annotation_2."b", annotation_2.d 
+FROM annotation_2"""
+        )
+        # 列名（クォートの有無）は、統合しない場合と変わらない
+        assert (
+            str(select(actual)).split("\n")[-2:]
+            == str(select(renamed)).split("\n")[-2:]
+        )
+
+    def test__fuse_projections__not_projection(self):
+        cols, source = create_source()
+        filtered = (
+            select(*cols.to_alchemy_obj_list(True))
+            .select_from(source)
+            .where(cols.to_alchemy_obj_list()[0] == "1")
+            .cte("annotation_1")
+        )
+        projected = (
+            select(*cols.to_alchemy_obj_list(True))
+            .select_from(filtered)
+            .cte("annotation_2")
+        )
+
+        # WHEREのあるCTEは、射影ではないので統合しない
+        assert fuse_projections(projected, filtered) is None
+        assert fuse_projections(filtered, projected) is None
+
+    def test__fuse_projections__compute(self):
+        cols, source = create_source()
+        projected = (
+            select(*cols.to_alchemy_obj_list(True))
+            .select_from(source)
+            .cte("annotation_1")
+        )
+        added = (
+            select(
+                *cols.add(ModelColumn("c", "string", "[a] * 2")).to_alchemy_obj_list(
+                    True
+                )
+            )
+            .select_from(projected)
+            .cte("annotation_2")
+        )
+
+        actual = fuse_projections(added, projected)
+
+        # 計算式が参照する列がinnerをそのまま通るなら、式のまま統合する
+        assert actual is not None
+        assert """annotation_2 AS 
+(SELECT "a", "b", "[a] * 2" AS c 
+FROM source)""" in str(
+            select(actual)
+        )
+
+    def test__fuse_projections__reference_computed(self):
+        cols, source = create_source()
+        added_cols = cols.add(ModelColumn("c", "string", "[a] * 2"))
+        added = (
+            select(*added_cols.to_alchemy_obj_list(True))
+            .select_from(source)
+            .cte("annotation_1")
+        )
+        added_again = (
+            select(
+                *added_cols.flush_values()
+                .add(ModelColumn("e", "string", "[c] + 1"))
+                .to_alchemy_obj_list(True)
+            )
+            .select_from(added)
+            .cte("annotation_2")
+        )
+
+        # innerで計算した列を参照する計算式は、式を書き換えないと参照先が変わるので統合しない
+        assert fuse_projections(added_again, added) is None
+
+    def test__generate_annotation_statements(self):
+        annotations = [ADD_COLUMN, RENAME_COLUMN, REMOVE_COLUMNS]
+
+        actual, stats = generate(annotations, fuse=True)
+
+        assert stats == (3, 2)
+        assert actual.count(" AS \n(") == 2  # source, annotation_3
+        assert (
+            """annotation_3 AS 
+(
+-- add c, rename c, remove b
+SELECT "a", "[a] * 2" AS "d" 
+FROM source)"""
+            in actual
+        )
+        assert generate(annotations, fuse=False)[0].count(" AS \n(") == 4
+
+    def test__generate_annotation_statements__chain(self):
+        annotations = [
+            ADD_COLUMN,
+            RENAME_COLUMN,
+            QUICK_CALC_COLUMN,
+            RENAME_QUICK_CALC_COLUMN,
+        ]
+
+        actual, stats = generate(annotations, fuse=True)
+
+        # 計算と射影が続くチェーンは、ペアごとではなく、まとめて1つのCTEになる
+        assert stats == (4, 3)
+        assert actual.count(" AS \n(") == 2  # source, annotation_6
+        assert (
+            """annotation_6 AS 
+(
+-- add c, rename c, upper b, rename e
+SELECT "a", "b", "[a] * 2" AS "d", "UPPER([b])" AS f 
+FROM source)"""
+            in actual
+        )
+        # 列名（クォートの有無）は、統合しない場合と変わらない
+        assert (
+            actual.split("\n")[-2:]
+            == generate(annotations, fuse=False)[0].split("\n")[-2:]
+        )
+
+    def test__generate_annotation_statements__filter(self):
+        annotations = [ADD_COLUMN, FILTER_OPERATION, RENAME_COLUMN, REMOVE_COLUMNS]
+
+        actual, stats = generate(annotations, fuse=True)
+
+        # フィルターの前後は統合できない。フィルターのあとの射影どうしだけ統合する
+        assert stats == (4, 1)
+        assert "WHERE [a] = 1" in actual
@@ -1,8 +1,15 @@
+from dataclasses import replace
+
 from sqlalchemy import MetaData, Table, select
 
+from prep2dbt.converters.annotations.columns_cache import \
+    get_annotation_columns_cache
 from prep2dbt.converters.mixins.annotation_mixin import AnnotationMixin
+from prep2dbt.converters.supertransform.converter import \
+    SuperTransformConverter
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+from prep2dbt.models.node import (AnnotationColumns, ModelColumn, ModelColumns,
+                                  ModelName, Node)
 from tests.mocks import context_mock
 
 
@@ -480,3 +487,134 @@ FROM "source_Left"'''
         print(actual.dbt_sql)
         for col in compiled_cols:
             assert col in actual.dbt_sql
+
+    def create_supertransform_graph(self) -> DAG:
+        graph = DAG()
+        graph.add_node_with_edge(
+            Node(
+                "test_parent_id",
+                "test_parent_name",
+                "test_node_type",
+                {
+                    "id": "test_parent_id",
+                    "name": "test_parent_name",
+                    "nodeType": "test_node_type",
+                    "nextNodes": [
+                        {
+                            "namespace": "Default",
+                            "nextNodeId": "test_id",
+                            "nextNamespace": "Default",
+                        }
+                    ],
+                },
+                ModelName.calculated("test_parent_model_name"),
+                ModelColumns.calculated(
+                    [ModelColumn("ID", "string"), ModelColumn("NAME", "string")]
+                ),
+            )
+        )
+        graph.add_node_with_edge(
+            Node(
+                "test_id",
+                "test_name",
+                ".v2018_2_3.SuperTransform",
+                {
+                    "id": "test_id",
+                    "name": "test_name",
+                    "nodeType": ".v2018_2_3.SuperTransform",
+                    "nextNodes": [],
+                    "beforeActionAnnotations": [
+                        {
+                            "namespace": "Default",
+                            "annotationNode": {
+                                "nodeType": ".v1.AddColumn",
+                                "columnName": "added_column",
+                                "expression": "[ID] + 1",
+                                "name": "Add added_column",
+                                "id": "test_before_annotation_id",
+                            },
+                        },
+                    ],
+                    "afterActionAnnotations": [
+                        {
+                            "namespace": "Default",
+                            "annotationNode": {
+                                "nodeType": ".v1.RenameColumn",
+                                "columnName": "NAME",
+                                "rename": "CUSTOMER_NAME",
+                                "name": "Rename NAME",
+                                "id": "test_after_annotation_id",
+                            },
+                        },
+                    ],
+                },
+                ModelName.calculated("test_model_name"),
+                ModelColumns.initialized(),
+            )
+        )
+        return graph
+
+    def test__calculate_node(self, mocker):
+        mocker.patch(
+            "click.get_current_context",
+            return_value=context_mock(),
+        )
+        in_graph = self.create_supertransform_graph()
+
+        actual = SuperTransformConverter.calculate_node("test_id", in_graph)
+
+        assert actual.model_columns.names_list() == [
+            "ID",
+            "added_column",
+            "CUSTOMER_NAME",
+        ]
+        assert actual.model_columns == SuperTransformConverter.calculate_columns(
+            "test_id", in_graph
+        )
+        # 各アノテーションへ入力したカラム定義を記録している
+        assert actual.annotation_columns.is_applicable
+        assert actual.annotation_columns.before_inputs == (
+            ModelColumns.calculated(
+                [ModelColumn("ID", "string"), ModelColumn("NAME", "string")]
+            ),
+        )
+        assert actual.annotation_columns.parent_columns["Default"].names_list() == [
+            "ID",
+            "NAME",
+            "added_column",
+        ]
+        assert actual.annotation_columns.after_inputs == (
+            actual.annotation_columns.performed_columns.flush_values(),
+        )
+
+    def test__calculate_node__unknown(self, mocker):
+        mocker.patch(
+            "click.get_current_context",
+            return_value=context_mock(),
+        )
+        in_graph = self.create_supertransform_graph()
+        node = in_graph.get_node_by_id("test_id")
+        raw_dict = dict(node.raw_dict)
+        del raw_dict["beforeActionAnnotations"]
+        in_graph.add_node(replace(node, raw_dict=raw_dict))
+
+        actual = SuperTransformConverter.calculate_node("test_id", in_graph)
+
+        assert actual.model_columns == ModelColumns.unknown()
+        assert actual.annotation_columns == AnnotationColumns.initialized()
+
+    def test__generate_dbt_models__reuse_annotation_columns(self, mocker):
+        mocker.patch(
+            "click.get_current_context",
+            return_value=context_mock(),
+        )
+        in_graph = self.create_supertransform_graph()
+        expected = SuperTransformConverter.generate_dbt_models("test_id", in_graph)
+        in_graph.add_node(SuperTransformConverter.calculate_node("test_id", in_graph))
+        spy = mocker.spy(get_annotation_columns_cache(), "get_or_calculate")
+
+        actual = SuperTransformConverter.generate_dbt_models("test_id", in_graph)
+
+        # 記録したカラム定義を使いまわすので、アノテーションのカラム定義は計算しなおさない
+        assert spy.call_count == 0
+        assert actual.models[0].sql.dbt_sql == expected.models[0].sql.dbt_sql
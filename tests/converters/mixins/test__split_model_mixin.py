@@ -0,0 +1,135 @@
+import copy
+
+import click
+from sqlalchemy import Column, MetaData, String, Table, select
+
+from prep2dbt.converters.mixins.split_model_mixin import (
+    calculate_cte_dependencies, calculate_split_ctes)
+from prep2dbt.dbt_services import generate_dbt_models
+from prep2dbt.models.dbt_models import DbtModels
+from tests.mocks import context_mock
+from tests.services.test__pruning_service import FLOW_SAMPLE, create_graph
+
+
+def create_chain(length: int) -> list:
+    """1つ前のCTEを参照するCTEをlength個つくる"""
+    table = Table("test_table", MetaData(), Column("a", String))
+    ctes = [select(table).cte("cte_0")]
+    for i in range(1, length):
+        ctes.append(select(ctes[-1]).cte("cte_{}".format(i)))
+    return ctes
+
+
+def deep_flow() -> dict:
+    """クリーニングステップに、計算フィールドの追加を6件加えたフロー"""
+    flow = copy.deepcopy(FLOW_SAMPLE)
+    flow["nodes"]["node_2"]["beforeActionAnnotations"] = [
+        {
+            "namespace": "Default",
+            "annotationNode": {
+                "nodeType": ".v1.AddColumn",
+                "columnName": "CALC_{}".format(i),
+                "expression": "[AMOUNT] + {}".format(i),
+                "name": "calc {}".format(i),
+                "id": "annotation_{}".format(i),
+            },
+        }
+        for i in range(6)
+    ]
+    return flow
+
+
+def generate(flow: dict, **params) -> tuple[DbtModels, str]:
+    """フローを変換し、dbtモデルと、クリーニングステップのモデル名を返す"""
+    with click.Context(click.Command("convert")) as ctx:
+        ctx.params = dict(context_mock.params, **params)
+        graph = create_graph(flow)
+        return (
+            generate_dbt_models(graph),
+            graph.get_node_by_id("node_2").model_name.value,
+        )
+
+
+class TestSplitModelMixin:
+    def test__calculate_cte_dependencies(self):
+        ctes = create_chain(3)
+        joined = (
+            select(ctes[1], ctes[2].c.a.label("b"))
+            .select_from(ctes[1].join(ctes[2], ctes[1].c.a == ctes[2].c.a))
+            .cte("joined")
+        )
+
+        # 直接参照するCTEだけを返し、参照先のCTEの中まではたどらない
+        assert {cte.name for cte in calculate_cte_dependencies(joined)} == {
+            "cte_1",
+            "cte_2",
+        }
+        assert calculate_cte_dependencies(ctes[0]) == []
+
+    def test__calculate_split_ctes(self):
+        ctes = create_chain(7)
+
+        # 深さが3を超えないよう、参照される側から3つごとに切り出す
+        assert [cte.name for cte in calculate_split_ctes(ctes[-1], 3)] == [
+            "cte_2",
+            "cte_5",
+        ]
+        assert calculate_split_ctes(ctes[-1], 7) == []
+
+    def test__calculate_split_ctes__shared(self):
+        ctes = create_chain(3)
+        # cte_2と、cte_2より浅いcte_0を参照する
+        joined = (
+            select(ctes[2], ctes[0].c.a.label("b"))
+            .select_from(ctes[2].join(ctes[0], ctes[2].c.a == ctes[0].c.a))
+            .cte("joined")
+        )
+
+        # 最も深い参照先を切り出せば、上限におさまる
+        assert [cte.name for cte in calculate_split_ctes(joined, 3)] == ["cte_2"]
+
+    def test__generate_dbt_models(self):
+        models, model_name = generate(deep_flow(), max_cte_depth=3)
+
+        actual = {model.model_name: model for model in models}
+        split_1 = actual[model_name + "__split_1"]
+        split_2 = actual[model_name + "__split_2"]
+        # 中間モデルは、親のモデルや、参照される側の中間モデルをrefタグで参照する
+        assert "{{ ref('" + model_name + "__split_1') }} AS annotation_1" in (
+            split_2.sql.dbt_sql
+        )
+        assert "{{ ref('" + model_name + "__split_2') }} AS annotation_4" in (
+            actual[model_name].sql.dbt_sql
+        )
+        # 切り出したCTEは、WITH句に書き出さない
+        assert "annotation_4 AS" not in actual[model_name].sql.dbt_sql
+        assert "annotation_1 AS" in split_1.sql.dbt_sql
+
+        yml = split_1.yml.raw["models"][0]
+        assert yml["name"] == model_name + "__split_1"
+        assert yml["config"]["materialized"] == "ephemeral"
+        assert {"name": "CALC_1"} in yml["columns"]
+        assert {"name": "CALC_2"} not in yml["columns"]
+
+    def test__generate_dbt_models__view(self, capsys):
+        models, model_name = generate(
+            deep_flow(), max_cte_depth=3, split_materialized="view"
+        )
+
+        actual = {model.model_name: model for model in models}
+        assert (
+            actual[model_name + "__split_1"].yml.raw["models"][0]["config"][
+                "materialized"
+            ]
+            == "view"
+        )
+        # クリーニングステップと、結合のステップを分割する
+        assert "モデルの分割: 2件のモデルを分割し、3件の中間モデルを切り出しました。" in capsys.readouterr().out
+
+    def test__generate_dbt_models__not_split(self, capsys):
+        expected, _ = generate(deep_flow())
+        actual, _ = generate(deep_flow(), max_cte_depth=20)
+
+        # 上限を超えないモデルや、上限を指定しない場合は、分割しない
+        assert actual.rendered() == expected.rendered()
+        assert "モデルの分割: 0件のモデルを分割し、0件の中間モデルを切り出しました。" in capsys.readouterr().out
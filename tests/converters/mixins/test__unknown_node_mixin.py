@@ -4,7 +4,8 @@ from prep2dbt.converters.mixins.unknown_node_mixin import UnknownNodeMixin
 from prep2dbt.exceptions import UnknownNodeException
 from prep2dbt.models.dbt_models import DbtModels
 from prep2dbt.models.graph import DAG
-from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+from prep2dbt.models.node import (ModelColumn, ModelColumns, ModelName, Node,
+                                  NodeDict)
 from tests.mocks import context_mock
 
 
@@ -50,11 +51,11 @@ class TestUnknownNodeMixin:
         # 必ずフォールバックするコンバーター
         class FallbackAlwaysTestConverter(UnknownNodeMixin):
             @classmethod
-            def validate(cls, node_dict: dict) -> None:
+            def validate(cls, node_dict: NodeDict) -> None:
                 raise UnknownNodeException("Test exception")
 
             @classmethod
-            def perform_generate_graph(cls, node_dict: dict) -> DAG:
+            def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
                 return DAG()
 
         in_dict = {
@@ -82,11 +83,11 @@ class TestUnknownNodeMixin:
         # フォールバックしないコンバーター
         class NoFallbackTestConverter(UnknownNodeMixin):
             @classmethod
-            def validate(cls, node_dict: dict) -> None:
+            def validate(cls, node_dict: NodeDict) -> None:
                 pass
 
             @classmethod
-            def perform_generate_graph(cls, node_dict: dict) -> DAG:
+            def perform_generate_graph(cls, node_dict: NodeDict) -> DAG:
                 return DAG()
 
         in_dict = {}
@@ -107,7 +108,7 @@ class TestUnknownNodeMixin:
         # 必ずフォールバックするコンバーター
         class FallbackAlwaysTestConverter(UnknownNodeMixin):
             @classmethod
-            def validate(cls, node_dict: dict) -> None:
+            def validate(cls, node_dict: NodeDict) -> None:
                 raise UnknownNodeException("Test exception")
 
             @classmethod
@@ -156,7 +157,7 @@ class TestUnknownNodeMixin:
         # 必ずフォールバックするコンバーター
         class NoFallbackTestConverter(UnknownNodeMixin):
             @classmethod
-            def validate(cls, node_dict: dict) -> None:
+            def validate(cls, node_dict: NodeDict) -> None:
                 pass
 
             @classmethod
@@ -403,7 +404,7 @@ FROM final""",
         # 必ずフォールバックするコンバーター
         class FallbackAlwaysTestConverter(UnknownNodeMixin):
             @classmethod
-            def validate(cls, node_dict: dict) -> None:
+            def validate(cls, node_dict: NodeDict) -> None:
                 raise UnknownNodeException("Test exception")
 
             @classmethod
@@ -443,7 +444,7 @@ FROM final""",
         # フォールバックしないコンバーター
         class NoFallbackTestConverter(UnknownNodeMixin):
             @classmethod
-            def validate(cls, node_dict: dict) -> None:
+            def validate(cls, node_dict: NodeDict) -> None:
                 pass
 
             @classmethod
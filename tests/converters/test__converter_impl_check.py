@@ -20,6 +20,7 @@ class TestConverterImplCheck:
         assert hasattr(converter, "validate")
         assert hasattr(converter, "calculate_columns")
         assert hasattr(converter, "generate_dbt_models")
+        assert hasattr(converter, "calculate_required_columns")
 
         try:
             converter.validate({})
@@ -35,3 +36,8 @@ class TestConverterImplCheck:
             converter.generate_dbt_models("", DAG())
         except Exception as e:
             assert type(e) != NotImplementedError
+
+        try:
+            converter.calculate_required_columns("", DAG(), set())
+        except Exception as e:
+            assert type(e) != NotImplementedError
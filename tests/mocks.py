@@ -7,3 +7,7 @@ class context_mock:
         "tags": "test_1,test_2,test_3",
         "prefix": "test__",
     }
+
+    def __init__(self) -> None:
+        # 実行中に使いまわすもの（SqlCompilerなど）を保存する
+        self.meta: dict = {}
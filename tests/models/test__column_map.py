@@ -0,0 +1,166 @@
+import pickle
+import random
+
+from prep2dbt.models.column_map import COMPACTION_MIN_SIZE, ColumnMap
+from prep2dbt.models.node import ModelColumn
+
+
+def create_columns(count: int) -> list[ModelColumn]:
+    return [ModelColumn("col_{0}".format(idx), "string") for idx in range(count)]
+
+
+class TestColumnMap:
+    def test__from_columns(self):
+        actual = ColumnMap.from_columns(
+            [ModelColumn("b", "string"), ModelColumn("a", "int", "1")]
+        )
+
+        assert list(actual) == ["b", "a"]
+        assert len(actual) == 2
+        assert actual.valued_count == 1
+        assert actual == {
+            "b": ModelColumn("b", "string"),
+            "a": ModelColumn("a", "int", "1"),
+        }
+
+    def test__set(self):
+        original = ColumnMap.from_columns(create_columns(3))
+
+        actual = original.set(ModelColumn("col_1", "int")).set(
+            ModelColumn("new", "int", "1")
+        )
+
+        assert list(actual) == ["col_0", "col_1", "col_2", "new"]
+        assert actual["col_1"] == ModelColumn("col_1", "int")
+        assert actual.valued_count == 1
+        # 元のマッピングは変わらず、変更のないカラムは共有される
+        assert original["col_1"] == ModelColumn("col_1", "string")
+        assert "new" not in original
+        assert actual["col_0"] is original["col_0"]
+
+    def test__update__duplicated_name(self):
+        original = ColumnMap.from_columns(create_columns(2))
+
+        actual = original.update(
+            [ModelColumn("new", "string"), ModelColumn("new", "int")]
+        )
+
+        assert list(actual) == ["col_0", "col_1", "new"]
+        assert len(actual) == 3
+        assert actual["new"] == ModelColumn("new", "int")
+
+    def test__remove(self):
+        original = ColumnMap.from_columns(create_columns(3))
+
+        actual = original.set(ModelColumn("new", "string")).remove("col_1")
+
+        assert list(actual) == ["col_0", "col_2", "new"]
+        assert len(actual) == 3
+        assert "col_1" not in actual
+        assert list(actual.remove("new")) == ["col_0", "col_2"]
+        assert actual.remove("nothing") is actual
+        assert list(original) == ["col_0", "col_1", "col_2"]
+
+    def test__set__after_remove(self):
+        actual = (
+            ColumnMap.from_columns(create_columns(3))
+            .remove("col_0")
+            .set(ModelColumn("col_0", "int"))
+        )
+
+        # 辞書と同じく、削除してから追加した列は末尾に並ぶ
+        assert list(actual) == ["col_1", "col_2", "col_0"]
+        assert actual["col_0"] == ModelColumn("col_0", "int")
+
+    def test__compaction(self):
+        original = ColumnMap.from_columns(create_columns(10))
+
+        actual = original
+        for idx in range(COMPACTION_MIN_SIZE * 3):
+            actual = actual.set(ModelColumn("new_{0}".format(idx), "string"))
+            actual = actual.remove("col_{0}".format(idx))
+
+        expected = ["new_{0}".format(idx) for idx in range(COMPACTION_MIN_SIZE * 3)]
+        assert list(actual) == expected
+        assert len(actual) == len(expected)
+        assert len(original) == 10
+
+    def test__fingerprint(self):
+        original = ColumnMap.from_columns(create_columns(3))
+        same = ColumnMap.from_columns(create_columns(3))
+
+        assert original.fingerprint == same.fingerprint
+        assert (
+            original.set(ModelColumn("new", "int")).fingerprint
+            == same.set(ModelColumn("new", "int")).fingerprint
+        )
+        # 内容か並び順が違えば、別の値になる
+        assert original.set(ModelColumn("new", "int")).fingerprint != (
+            original.set(ModelColumn("new", "string")).fingerprint
+        )
+        assert original.remove("col_0").fingerprint != original.fingerprint
+        assert (
+            ColumnMap.from_columns(reversed(create_columns(3))).fingerprint
+            != original.fingerprint
+        )
+
+    def test__content_digest(self):
+        original = ColumnMap.from_columns(create_columns(3))
+        changed = original.set(ModelColumn("new", "int")).remove("col_0")
+
+        # 作られ方が違っても、内容と並び順が同じなら同じ値になる
+        rebuilt = ColumnMap.from_columns(changed.values())
+        assert rebuilt.fingerprint != changed.fingerprint
+        assert rebuilt.content_digest == changed.content_digest
+        assert pickle.loads(pickle.dumps(changed)).content_digest == (
+            changed.content_digest
+        )
+        # 内容か並び順が違えば、別の値になる
+        assert changed.content_digest != original.content_digest
+        assert (
+            ColumnMap.from_columns(reversed(list(changed.values()))).content_digest
+            != changed.content_digest
+        )
+
+    def test__content_digest__changes(self):
+        # 差分で変わる項だけを計算しなおしても、作りなおしたマッピングと同じ値になる
+        rng = random.Random(0)
+        actual = ColumnMap.from_columns(create_columns(40))
+        for step in range(500):
+            names = list(actual)
+            operation = rng.choice(["set", "add", "remove", "flush"])
+            if operation == "set" and names:
+                actual = actual.set(
+                    ModelColumn(rng.choice(names), "int", str(rng.randrange(3)))
+                )
+            elif operation == "add":
+                actual = actual.set(
+                    ModelColumn("col_{0}".format(rng.randrange(60)), "int")
+                )
+            elif operation == "remove" and names:
+                actual = actual.remove(rng.choice(names))
+            else:
+                actual = actual.flush_values()
+
+            assert (
+                actual.content_digest
+                == ColumnMap.from_columns(list(actual.values())).content_digest
+            ), step
+        assert (
+            ColumnMap({}).content_digest
+            == ColumnMap.from_columns(create_columns(1)).remove("col_0").content_digest
+        )
+
+    def test__flush_values(self):
+        original = ColumnMap.from_columns(
+            [ModelColumn("a", "string", "'x'"), ModelColumn("b", "int")]
+        )
+
+        actual = original.flush_values()
+
+        assert actual == {"a": ModelColumn("a", "string"), "b": ModelColumn("b", "int")}
+        assert actual.valued_count == 0
+        assert actual["b"] is original["b"]
+        # 結果は使いまわす
+        assert original.flush_values() is actual
+        assert actual.flush_values() is actual
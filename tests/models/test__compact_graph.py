@@ -0,0 +1,124 @@
+import networkx as nx
+import pytest
+
+from prep2dbt.models.compact_graph import CompactDAG
+from prep2dbt.models.graph import DAG
+from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
+
+
+def create_node(node_id: str, next_nodes: list[tuple[str, str]]) -> Node:
+    node_dict: dict = {
+        "id": node_id,
+        "name": "name_" + node_id,
+        "nodeType": "test_node_type",
+        "nextNodes": [
+            {
+                "namespace": "Default",
+                "nextNodeId": next_node_id,
+                "nextNamespace": namespace,
+            }
+            for next_node_id, namespace in next_nodes
+        ],
+    }
+    return Node(
+        node_id,
+        "name_" + node_id,
+        "test_node_type",
+        node_dict,
+        ModelName.calculated("model_" + node_id),
+        ModelColumns.calculated(set([ModelColumn("col_" + node_id, "string")])),
+    )
+
+
+# left -┐
+#       join - final
+# right-┘
+NODES = [
+    create_node("join", [("final", "Default")]),
+    create_node("left", [("join", "Left")]),
+    create_node("right", [("join", "Right")]),
+    create_node("final", []),
+]
+
+
+def build_graph(graph: DAG) -> DAG:
+    for node in NODES:
+        subgraph = DAG()
+        subgraph.add_node_with_edge(node)
+        graph.add_subgraph(subgraph)
+    return graph
+
+
+class TestCompactDag:
+    def test__same_structure_as_networkx(self):
+        expected = build_graph(DAG())
+        actual = build_graph(CompactDAG())
+
+        assert list(actual.nodes) == list(expected.nodes)
+        assert actual.edges == expected.edges
+        assert actual.nodes_per_generation() == expected.nodes_per_generation()
+        for node_id in expected.nodes:
+            assert actual.get_node_by_id(node_id) == expected.get_node_by_id(node_id)
+            assert actual.get_parent_ids(node_id) == expected.get_parent_ids(node_id)
+            assert actual.get_child_ids(node_id) == expected.get_child_ids(node_id)
+            assert actual.get_parent_model_names(
+                node_id
+            ) == expected.get_parent_model_names(node_id)
+            assert actual.get_all_parent_columns(
+                node_id
+            ) == expected.get_all_parent_columns(node_id)
+
+    def test__get_parent_by_namespace(self):
+        actual = build_graph(CompactDAG())
+
+        assert actual.get_parent_by_namespace("join", "Right").id == "right"
+
+    def test__add_node__replace_payload(self):
+        actual = build_graph(CompactDAG())
+        generations = actual.nodes_per_generation()
+        new_node = NODES[0].copy_with_model_name(ModelName.calculated("renamed"))
+
+        actual.add_node(new_node)
+
+        assert actual.get_node_by_id("join") == new_node
+        assert actual.nodes_per_generation() == generations
+
+    def test__node_without_data(self):
+        # nextNodesで参照されているだけのノードは、データをもたない
+        actual = CompactDAG()
+        actual.add_node_with_edge(NODES[0])
+
+        assert list(actual.nodes) == ["join", "final"]
+        with pytest.raises(KeyError):
+            actual.get_node_by_id("final")
+
+    def test__nodes_per_generation__cycle(self):
+        actual = CompactDAG()
+        actual.add_edge("a", "b")
+        actual.add_edge("b", "a")
+
+        with pytest.raises(nx.NetworkXUnfeasible):
+            actual.nodes_per_generation()
+
+    def test__graph(self):
+        actual = CompactDAG()
+
+        # networkxのグラフは持たないので、参照しても黙って作りなおさない
+        with pytest.raises(TypeError):
+            actual.graph
+
+    def test__eq_and_repr(self):
+        actual = build_graph(CompactDAG())
+
+        # DAGの初期化を通るので、ネームスペースのインデックスをもつ
+        assert actual.namespace_index == {
+            "final": {"Default": "join"},
+            "join": {"Left": "left", "Right": "right"},
+        }
+        assert actual == build_graph(CompactDAG())
+        assert actual != CompactDAG()
+        assert repr(actual) == (
+            "CompactDAG(nodes=4, edges=3, namespace_index={0!r})".format(
+                actual.namespace_index
+            )
+        )
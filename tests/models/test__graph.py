@@ -1,4 +1,6 @@
+import networkx as nx
 import pytest
+from click import ClickException
 
 from prep2dbt.models.graph import DAG
 from prep2dbt.models.node import ModelColumns, ModelName, Node
@@ -52,3 +54,169 @@ class TestDag:
 
         assert set(actual.graph.nodes) == expected_nodes
         assert set(actual.graph.edges) == expected_edges
+
+    def test__add_subgraph(self):
+        # 親ノードのエッジで先にできた子ノードに、あとから子ノードのデータが追加される
+        __parent_dict = {
+            "id": "test_id",
+            "name": "test_name",
+            "nodeType": "test_node_type",
+            "nextNodes": [
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "test_child_id",
+                    "nextNamespace": "Default",
+                }
+            ],
+        }
+        __child_dict = {
+            "id": "test_child_id",
+            "name": "test_child_name",
+            "nodeType": "test_node_type",
+            "nextNodes": [],
+        }
+        __nodes = [
+            Node(
+                in_dict["id"],
+                in_dict["name"],
+                in_dict["nodeType"],
+                in_dict,
+                ModelName.initialized(),
+                ModelColumns.initialized(),
+            )
+            for in_dict in [__parent_dict, __child_dict]
+        ]
+
+        actual = DAG()
+        expected = DAG()
+        for node in __nodes:
+            subgraph = DAG()
+            subgraph.add_node_with_edge(node)
+            actual.add_subgraph(subgraph)
+            expected = expected.merge(subgraph)
+
+        assert set(actual.graph.nodes) == set(expected.graph.nodes)
+        assert set(actual.graph.edges) == set(expected.graph.edges)
+        assert actual.get_node_by_id("test_child_id") == __nodes[1]
+
+    def test__get_parent_by_namespace(self):
+        # parent_aは、join_1のLeftとjoin_2のRightにつながっている
+        # join_2のLeftは、parent_bだけ
+        __dicts = [
+            {
+                "id": "parent_a",
+                "name": "parent_a",
+                "nodeType": "test_node_type",
+                "nextNodes": [
+                    {
+                        "namespace": "Default",
+                        "nextNodeId": "join_1",
+                        "nextNamespace": "Left",
+                    },
+                    {
+                        "namespace": "Default",
+                        "nextNodeId": "join_2",
+                        "nextNamespace": "Right",
+                    },
+                ],
+            },
+            {
+                "id": "parent_b",
+                "name": "parent_b",
+                "nodeType": "test_node_type",
+                "nextNodes": [
+                    {
+                        "namespace": "Default",
+                        "nextNodeId": "join_2",
+                        "nextNamespace": "Left",
+                    },
+                ],
+            },
+        ]
+        actual = DAG()
+        for in_dict in __dicts:
+            subgraph = DAG()
+            subgraph.add_node_with_edge(
+                Node(
+                    in_dict["id"],
+                    in_dict["name"],
+                    in_dict["nodeType"],
+                    in_dict,
+                    ModelName.initialized(),
+                    ModelColumns.initialized(),
+                )
+            )
+            actual.add_subgraph(subgraph)
+
+        assert actual.get_parent_by_namespace("join_1", "Left").id == "parent_a"
+        assert actual.get_parent_by_namespace("join_2", "Left").id == "parent_b"
+        assert actual.get_parent_by_namespace("join_2", "Right").id == "parent_a"
+        assert set(actual.get_all_parent_columns("join_2").keys()) == {
+            "Default",
+            "Left",
+            "Right",
+        }
+        with pytest.raises(ClickException):
+            actual.get_parent_by_namespace("join_1", "Right")
+
+    def test__get_parent_subgraph(self):
+        # a -(Left)-> c <-(Right)- b, a - d
+        actual = DAG()
+        for node_id in ["a", "b", "c", "d"]:
+            actual.add_node(
+                Node(
+                    node_id,
+                    node_id,
+                    "test_node_type",
+                    {"nextNodes": []},
+                    ModelName.initialized(),
+                    ModelColumns.initialized(),
+                )
+            )
+        actual.add_edge("a", "c", "Left")
+        actual.add_edge("b", "c", "Right")
+        actual.add_edge("a", "d", "Default")
+
+        subgraph = actual.get_parent_subgraph("c")
+
+        assert set(subgraph.nodes) == {"a", "b", "c"}
+        assert subgraph.get_parent_ids("c") == ["a", "b"]
+        assert subgraph.get_parent_by_namespace("c", "Right").id == "b"
+        assert subgraph.get_node_by_id("a") is actual.get_node_by_id("a")
+
+    def test__topology(self):
+        # a - b - c
+        #   \---- d
+        in_graph = nx.DiGraph()
+        in_graph.add_edges_from([("a", "b"), ("b", "c"), ("a", "d")])
+        actual = DAG(in_graph)
+
+        assert actual.topology.generations == [{"a"}, {"b", "d"}, {"c"}]
+        assert actual.topology.order[0] == "a"
+        assert actual.topology.generation_index == {"a": 0, "b": 1, "d": 1, "c": 2}
+        assert actual.topology.depth == 3
+        assert actual.topology.longest_path_length == nx.dag_longest_path_length(
+            in_graph
+        )
+
+    def test__topology__invalidate(self):
+        in_node = Node(
+            "a",
+            "a",
+            "test_node_type",
+            {"nextNodes": []},
+            ModelName.initialized(),
+            ModelColumns.initialized(),
+        )
+        actual = DAG()
+        actual.add_node(in_node)
+        topology = actual.topology
+
+        # ノードの置き換えでは、作り直さない
+        actual.add_node(in_node.copy_with_model_name(ModelName.calculated("a_1")))
+        assert actual.topology is topology
+
+        # エッジが追加されたら、作り直す
+        actual.add_edge("a", "b")
+        assert actual.topology is not topology
+        assert actual.nodes_per_generation() == [{"a"}, {"b"}]
@@ -0,0 +1,103 @@
+import pytest
+from click import ClickException
+
+from prep2dbt.models.node import ModelColumn, ModelColumns
+
+
+class TestModelColumns:
+    def test__calculated__keep_order(self):
+        cols = ModelColumns.calculated(
+            [ModelColumn("b", "string"), ModelColumn("a", "int")]
+        )
+
+        assert cols.is_applicable
+        assert cols.names_list() == ["b", "a"]
+
+    def test__calculated__duplicated_name(self):
+        cols = ModelColumns.calculated(
+            [ModelColumn("a", "string"), ModelColumn("a", "int")]
+        )
+
+        assert cols.names_list() == ["a"]
+        assert cols.get_column_by_name("a").data_type == "int"
+
+    def test__calculated__empty(self):
+        assert ModelColumns.calculated([]) == ModelColumns.unknown()
+
+    def test__add(self):
+        original = ModelColumns.calculated(
+            [ModelColumn("a", "string"), ModelColumn("b", "string")]
+        )
+
+        actual = original.add(ModelColumn("a", "int")).add(ModelColumn("c", "int"))
+
+        assert actual.names_list() == ["a", "b", "c"]
+        assert actual.get_column_by_name("a").data_type == "int"
+        # 元のインスタンスは変更されない
+        assert original.names_list() == ["a", "b"]
+        assert original.get_column_by_name("a").data_type == "string"
+
+    def test__add__not_applicable(self):
+        actual = ModelColumns.unknown().add(ModelColumn("a", "string"))
+
+        assert actual == ModelColumns.unknown()
+
+    def test__merge(self):
+        left = ModelColumns.calculated(
+            [ModelColumn("a", "string"), ModelColumn("b", "string")]
+        )
+        right = ModelColumns.calculated(
+            [ModelColumn("c", "int"), ModelColumn("a", "int")]
+        )
+
+        actual = left.merge(right)
+
+        assert actual.names_list() == ["a", "b", "c"]
+        assert actual.get_column_by_name("a").data_type == "int"
+        assert left.names_list() == ["a", "b"]
+
+    def test__has_column_by_name(self):
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+
+        assert cols.has_column_by_name("a")
+        assert not cols.has_column_by_name("b")
+        assert not ModelColumns.unknown().has_column_by_name("a")
+
+    def test__get_column_by_name__not_found(self):
+        cols = ModelColumns.calculated([ModelColumn("a", "string")])
+
+        with pytest.raises(ClickException):
+            cols.get_column_by_name("b")
+
+    def test__remove_column_by_name(self):
+        original = ModelColumns.calculated(
+            [ModelColumn("a", "string"), ModelColumn("b", "string")]
+        )
+
+        actual = original.remove_column_by_name("a")
+
+        assert actual.names_list() == ["b"]
+        assert original.names_list() == ["a", "b"]
+        assert actual.remove_column_by_name("b") == ModelColumns.unknown()
+
+    def test__flush_values(self):
+        cols = ModelColumns.calculated(
+            [ModelColumn("a", "string", "'x'"), ModelColumn("b", "int")]
+        )
+
+        actual = cols.flush_values()
+
+        assert actual.names_list() == ["a", "b"]
+        assert actual.get_column_by_name("a") == ModelColumn("a", "string")
+
+    def test__flush_values__share_columns(self):
+        cols = ModelColumns.calculated(
+            [ModelColumn("a", "string", "'x'"), ModelColumn("b", "int")]
+        )
+
+        actual = cols.flush_values()
+
+        # valueを持たないカラムは作り直さない
+        assert actual.get_column_by_name("b") is cols.get_column_by_name("b")
+        assert actual.flush_values() is actual
+        assert ModelColumns.initialized().flush_values() == ModelColumns.unknown()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, MetaData, String, Table
+from sqlalchemy import Column, MetaData, String, Table, select
 
 from prep2dbt.models.dbt_models import Sql
 from tests.mocks import context_mock
@@ -18,10 +18,6 @@ class TestSql:
             in_stmts, in_table_names
         )
 
-        expected_compiled_sql = """SELECT test_table.test_column 
-FROM test_table"""
-        assert actual.compiled_sql == expected_compiled_sql
-
         expected_dbt_sql = """SELECT {{ ref('test_table') }}.test_column 
 FROM {{ ref('test_table') }}"""
 
@@ -42,10 +38,6 @@ FROM {{ ref('test_table') }}"""
             in_stmts, in_table_names
         )
 
-        expected_compiled_sql = """SELECT test_table.test_column 
-FROM test_table"""
-        assert actual.compiled_sql == expected_compiled_sql
-
         expected_dbt_sql = """SELECT test_table.test_column 
 FROM test_table"""
 
@@ -64,10 +56,6 @@ FROM test_table"""
             in_stmts, in_table_names
         )
 
-        expected_compiled_sql = """SELECT test_table.test_column 
-FROM test_table"""
-        assert actual.compiled_sql == expected_compiled_sql
-
         expected_dbt_sql = """SELECT {{ source('SOURCE', 'test_table') }}.test_column 
 FROM {{ source('SOURCE', 'test_table') }}"""
 
@@ -88,11 +76,53 @@ FROM {{ source('SOURCE', 'test_table') }}"""
             in_stmts, in_table_names
         )
 
-        expected_compiled_sql = """SELECT test_table.test_column 
-FROM test_table"""
-        assert actual.compiled_sql == expected_compiled_sql
-
         expected_dbt_sql = """SELECT test_table.test_column 
 FROM test_table"""
 
         assert actual.dbt_sql == expected_dbt_sql
+
+    def test__create_model_reference_model_sql_by_statements__similar_names(
+        self, mocker
+    ):
+        mocker.patch(
+            "click.get_current_context",
+            return_value=context_mock(),
+        )
+        # テーブル名を含む、別のテーブル名や列名は置き換えない
+        __orders_1 = Table("orders_1", MetaData(), Column("orders_1_id", String))
+        __orders_10 = Table("orders_10", MetaData(), Column("orders_1_name", String))
+        in_stmts = select(__orders_1.c.orders_1_id, __orders_10.c.orders_1_name).cte(
+            "final"
+        )
+        in_table_names = ["orders_1"]
+
+        actual = Sql.create_model_reference_model_sql_by_statements(
+            in_stmts, in_table_names
+        )
+
+        expected_dbt_sql = """WITH final AS 
+(SELECT {{ ref('orders_1') }}.orders_1_id AS orders_1_id, orders_10.orders_1_name AS orders_1_name 
+FROM {{ ref('orders_1') }}, orders_10)
+ SELECT final.orders_1_id, final.orders_1_name 
+FROM final"""
+
+        assert actual.dbt_sql == expected_dbt_sql
+
+    def test__create_model_reference_model_sql_by_statements__quoted_name(self, mocker):
+        mocker.patch(
+            "click.get_current_context",
+            return_value=context_mock(),
+        )
+        # 引用符が必要なテーブル名も、タグを引用符で囲まない
+        __cols = [Column("test_column", String)]
+        in_stmts = Table("クリーニング_1", MetaData(), *__cols)
+        in_table_names = ["クリーニング_1"]
+
+        actual = Sql.create_model_reference_model_sql_by_statements(
+            in_stmts, in_table_names
+        )
+
+        expected_dbt_sql = """SELECT {{ ref('クリーニング_1') }}.test_column 
+FROM {{ ref('クリーニング_1') }}"""
+
+        assert actual.dbt_sql == expected_dbt_sql
@@ -0,0 +1,216 @@
+import json
+import os
+import zipfile
+
+import click
+import pytest
+
+from prep2dbt.batch_services import (assign_work_dirs, convert_flow,
+                                     convert_flows, find_flow_files,
+                                     output_batch_result)
+from prep2dbt.converters.annotations import columns_cache
+from prep2dbt.exceptions import (BatchConvertFailedException,
+                                 IllegAlargumentException)
+from prep2dbt.models.batch_result import BatchResult, FlowResult
+from tests.mocks import context_mock
+
+FLOW_SAMPLE = {
+    "nodes": {
+        "node_1": {
+            "nodeType": ".v1.LoadSql",
+            "name": "orders",
+            "id": "node_1",
+            "baseType": "input",
+            "nextNodes": [],
+            "connectionAttributes": {"schema": "PUBLIC", "dbname": "DB"},
+            "fields": [
+                {"name": "ID", "type": "integer", "ordinal": 1, "caption": ""},
+            ],
+            "relation": {"type": "table", "table": "[DB].[PUBLIC].[ORDERS]"},
+        }
+    }
+}
+
+FLOW_WITH_ANNOTATION = {
+    "nodes": {
+        "node_1": dict(
+            FLOW_SAMPLE["nodes"]["node_1"],
+            nextNodes=[
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "node_2",
+                    "nextNamespace": "Default",
+                }
+            ],
+        ),
+        "node_2": {
+            "nodeType": ".v2018_2_3.SuperTransform",
+            "name": "cleaning",
+            "id": "node_2",
+            "baseType": "superNode",
+            "nextNodes": [],
+            "beforeActionAnnotations": [
+                {
+                    "namespace": "Default",
+                    "annotationNode": {
+                        "nodeType": ".v1.AddColumn",
+                        "columnName": "DOUBLE",
+                        "expression": "[ID] * 2",
+                        "name": "double",
+                        "id": "annotation_1",
+                    },
+                }
+            ],
+            "afterActionAnnotations": [],
+        },
+    }
+}
+
+
+def write_flow(path: str, flow: dict = FLOW_SAMPLE) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("flow", json.dumps(flow))
+    return path
+
+
+class TestBatchService:
+    def test__find_flow_files(self, tmp_path):
+        __a = write_flow(os.path.join(tmp_path, "a.tfl"))
+        __b = write_flow(os.path.join(tmp_path, "sub", "b.tflx"))
+        with open(os.path.join(tmp_path, "memo.txt"), "w") as f:
+            f.write("not a flow")
+
+        # ディレクトリなら再帰的に、それ以外はglobとして探す
+        assert find_flow_files(str(tmp_path)) == [__a, __b]
+        assert find_flow_files(os.path.join(tmp_path, "*.tfl")) == [__a]
+
+    def test__find_flow_files__not_found(self, tmp_path):
+        with pytest.raises(IllegAlargumentException):
+            find_flow_files(str(tmp_path))
+
+    def test__assign_work_dirs(self):
+        actual = assign_work_dirs(
+            ["/flows/a.tfl", "/flows/sub/b.tfl", "/flows/sub/b.tflx"], "/out"
+        )
+
+        assert actual == {
+            "/flows/a.tfl": os.path.join("/out", "a"),
+            "/flows/sub/b.tfl": os.path.join("/out", "sub", "b"),
+            "/flows/sub/b.tflx": os.path.join("/out", "sub", "b_2"),
+        }
+
+    def test__convert_flow(self, tmp_path):
+        __params = dict(
+            context_mock.params,
+            flow_file=write_flow(os.path.join(tmp_path, "a.tfl")),
+            work_dir=os.path.join(tmp_path, "out"),
+            graph_backend="networkx",
+        )
+
+        actual = convert_flow(__params)
+
+        assert actual.is_succeeded
+        assert (actual.passed, actual.warning, actual.failed) == (1, 0, 0)
+        assert os.listdir(os.path.join(tmp_path, "out", "outputs")) != []
+
+    def test__convert_flow__jobs_and_incremental(self, tmp_path, capsys):
+        __params = dict(
+            context_mock.params,
+            flow_file=write_flow(os.path.join(tmp_path, "a.tfl")),
+            work_dir=os.path.join(tmp_path, "out"),
+            graph_backend="networkx",
+            jobs=2,
+            incremental=True,
+        )
+
+        expected = convert_flow(__params)
+        # 2回目は、作業ディレクトリに保存した前回の変換結果を使いまわす
+        actual = convert_flow(__params)
+
+        assert expected.is_succeeded and actual.is_succeeded
+        assert (actual.passed, actual.warning, actual.failed) == (1, 0, 0)
+        assert "1件のステップのうち、0件を変換しなおしました" in capsys.readouterr().out
+        assert os.path.exists(os.path.join(tmp_path, "out", "incremental_cache.json"))
+
+    def test__convert_flow__error(self, tmp_path):
+        # 変換に失敗しても例外にせず、結果にメッセージを残す
+        __flow_file = os.path.join(tmp_path, "broken.tfl")
+        with open(__flow_file, "w") as f:
+            f.write("not a zip")
+        __params = dict(
+            context_mock.params,
+            flow_file=__flow_file,
+            work_dir=os.path.join(tmp_path, "out"),
+        )
+
+        actual = convert_flow(__params)
+
+        assert not actual.is_succeeded
+        assert "zip" in actual.error
+
+    def test__convert_flows(self, tmp_path):
+        __flow_files = [
+            write_flow(os.path.join(tmp_path, "flows", "a.tfl")),
+            write_flow(os.path.join(tmp_path, "flows", "b.tfl")),
+        ]
+        # 各フローの変換でもクリックコンテキストを使うため、モックせずに実際のコンテキストを使う
+        with click.Context(click.Command("convert-batch")) as ctx:
+            ctx.params = dict(
+                context_mock.params,
+                flows=os.path.join(tmp_path, "flows"),
+                work_dir=os.path.join(tmp_path, "out"),
+                graph_backend="networkx",
+                workers=1,
+            )
+            actual = convert_flows(__flow_files, 1)
+
+        assert [flow.flow_file for flow in actual.flows] == __flow_files
+        assert [flow.work_dir for flow in actual.flows] == [
+            os.path.join(tmp_path, "out", "a"),
+            os.path.join(tmp_path, "out", "b"),
+        ]
+        assert all(flow.is_succeeded for flow in actual.flows)
+
+    def test__convert_flows__annotation_columns_cache(self, mocker, tmp_path):
+        __flow_files = [
+            write_flow(os.path.join(tmp_path, "flows", name), FLOW_WITH_ANNOTATION)
+            for name in ["a.tfl", "b.tfl"]
+        ]
+        __spy = mocker.spy(columns_cache, "AnnotationColumnsCache")
+        with click.Context(click.Command("convert-batch")) as ctx:
+            ctx.params = dict(
+                context_mock.params,
+                flows=os.path.join(tmp_path, "flows"),
+                work_dir=os.path.join(tmp_path, "out"),
+                graph_backend="networkx",
+                workers=1,
+            )
+            actual = convert_flows(__flow_files, 1)
+
+        assert all(flow.is_succeeded for flow in actual.flows)
+        # アノテーションのキャッシュは、フローの変換ごとにつくり、フローをまたいで使いまわさない
+        assert __spy.call_count == 2
+        assert columns_cache.ANNOTATION_COLUMNS_CACHE_META_KEY not in ctx.meta
+
+    def test__output_batch_result(self, mocker, tmp_path):
+        __mock = context_mock()
+        __mock.params = dict(__mock.params, work_dir=str(tmp_path))
+        mocker.patch("click.get_current_context", return_value=__mock)
+        in_result = BatchResult(
+            [
+                FlowResult("a.tfl", "out/a", 3, 1, 0, 1.5),
+                FlowResult("b.tfl", "out/b", error="失敗しました"),
+            ]
+        )
+
+        with pytest.raises(BatchConvertFailedException):
+            output_batch_result(in_result)
+
+        with open(os.path.join(tmp_path, "summary.csv"), encoding="UTF-8") as f:
+            actual = f.read().splitlines()
+        assert actual == [
+            "flow_file,work_dir,passed,warning,failed,elapsed,error",
+            "a.tfl,out/a,3,1,0,1.50,",
+            "b.tfl,out/b,0,0,0,0.00,失敗しました",
+        ]
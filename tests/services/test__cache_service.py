@@ -0,0 +1,246 @@
+import copy
+import json
+import os
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.cache_services import (NodeCache, calculate_cache_stats,
+                                     clear_cache, list_cache_entries)
+from prep2dbt.converters.factory import ConverterFactory
+from prep2dbt.core_services import (build_model_name, calculate_columns,
+                                    convert_to_graph)
+from prep2dbt.dbt_services import generate_dbt_models
+from prep2dbt.models.graph import DAG
+from tests.mocks import context_mock
+from tests.services.test__pruning_service import \
+    FLOW_SAMPLE as PUSHDOWN_FLOW_SAMPLE
+
+FLOW_SAMPLE = {
+    "nodes": {
+        "node_1": {
+            "nodeType": ".v1.LoadSql",
+            "name": "orders",
+            "id": "node_1",
+            "baseType": "input",
+            "nextNodes": [
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "node_2",
+                    "nextNamespace": "Default",
+                }
+            ],
+            "connectionAttributes": {"schema": "PUBLIC", "dbname": "DB"},
+            "fields": [
+                {"name": "ID", "type": "integer", "ordinal": 1, "caption": ""},
+            ],
+            "relation": {"type": "table", "table": "[DB].[PUBLIC].[ORDERS]"},
+        },
+        "node_2": {
+            "nodeType": ".v2018_2_3.SuperTransform",
+            "name": "cleaning",
+            "id": "node_2",
+            "baseType": "superNode",
+            "nextNodes": [],
+            "beforeActionAnnotations": [
+                {
+                    "namespace": "Default",
+                    "annotationNode": {
+                        "nodeType": ".v1.AddColumn",
+                        "columnName": "ID_2",
+                        "expression": "[ID] + 1",
+                        "name": "Add ID_2",
+                        "id": "annotation_1",
+                    },
+                }
+            ],
+            "afterActionAnnotations": [],
+        },
+    }
+}
+
+
+def create_graph(flow: dict = FLOW_SAMPLE) -> DAG:
+    graph = convert_to_graph(copy.deepcopy(flow))
+    build_model_name(graph)
+    calculate_columns(graph)
+    return graph
+
+
+def create_node_cache(tmp_path, max_size: int = 1024 * 1024, **options) -> NodeCache:
+    return NodeCache(
+        os.path.join(tmp_path, "cache"),
+        max_size,
+        dict({"dialect": "snowflake"}, **options),
+    )
+
+
+class TestCacheService:
+    def test__key(self, mocker, tmp_path):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __changed = copy.deepcopy(FLOW_SAMPLE)
+        __changed["nodes"]["node_1"]["fields"][0]["type"] = "string"
+        __graph = create_graph()
+        __converter = ConverterFactory.get_converter_by_type(
+            ".v2018_2_3.SuperTransform"
+        )
+        __node_cache = create_node_cache(tmp_path)
+
+        expected = __node_cache.key(__converter, "node_2", __graph)
+
+        # 同じ内容なら、別のグラフでも同じキーになる
+        assert __node_cache.key(__converter, "node_2", create_graph()) == expected
+        # 親のカラム定義や、出力に影響するオプションが変われば、別のキーになる
+        assert (
+            __node_cache.key(__converter, "node_2", create_graph(__changed)) != expected
+        )
+        assert (
+            create_node_cache(tmp_path, dialect="postgre").key(
+                __converter, "node_2", __graph
+            )
+            != expected
+        )
+
+    def test__get_or_generate(self, mocker, tmp_path):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __graph = create_graph()
+        __converter = ConverterFactory.get_converter_by_type(
+            ".v2018_2_3.SuperTransform"
+        )
+        __node_cache = create_node_cache(tmp_path)
+        expected = __converter.generate_dbt_models("node_2", __graph)
+
+        first = __node_cache.get_or_generate(__converter, "node_2", __graph)
+        second = create_node_cache(tmp_path).get_or_generate(
+            __converter, "node_2", __graph
+        )
+
+        assert (__node_cache.hits, __node_cache.misses) == (0, 1)
+        for actual in [first, second]:
+            assert actual.models[0].sql.dbt_sql == expected.models[0].sql.dbt_sql
+            assert str(actual.models[0].yml) == str(expected.models[0].yml)
+            # キャッシュするのは、書き出しに必要なものだけ
+            assert actual.models[0].sql.alchemy_statements is None
+        assert second == first
+
+    def test__get__data_only(self, mocker, tmp_path):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __graph = create_graph()
+        __converter = ConverterFactory.get_converter_by_type(".v1.LoadSql")
+        __node_cache = create_node_cache(tmp_path)
+        __node_cache.get_or_generate(__converter, "node_1", __graph)
+        __key = __node_cache.key(__converter, "node_1", __graph)
+        [(__path, _, _)] = list_cache_entries(__node_cache.cache_dir)
+
+        # エントリは、SQLとYAMLのテキストを保存したJSON
+        with open(__path, encoding="UTF-8") as f:
+            assert (
+                json.load(f)["models"][0]["model_name"]
+                == __graph.get_node_by_id("node_1").model_name.value
+            )
+
+        # JSONでないエントリ（pickleなど）は読み込まず、なかったことにする
+        with open(__path, mode="wb") as f:
+            f.write(b"\x80\x05N.")
+        assert __node_cache.get(__key) is None
+
+    def test__evict(self, mocker, tmp_path):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __graph = create_graph()
+        __node_cache = create_node_cache(tmp_path)
+        for node_id in ["node_1", "node_2"]:
+            __converter = ConverterFactory.get_converter_by_type(
+                __graph.get_node_by_id(node_id).node_type
+            )
+            __node_cache.get_or_generate(__converter, node_id, __graph)
+        __entries = sorted(list_cache_entries(__node_cache.cache_dir))
+        # node_2の変換結果を、最も長く使われていないことにする
+        __oldest = max(__entries, key=lambda entry: entry[2])
+        os.utime(__oldest[0], (0, 0))
+
+        __node_cache.max_size = sum(entry[2] for entry in __entries) - 1
+        assert __node_cache.evict() == 1
+        assert [entry[0] for entry in list_cache_entries(__node_cache.cache_dir)] == [
+            entry[0] for entry in __entries if entry[0] != __oldest[0]
+        ]
+        assert __node_cache.evict() == 0
+
+    def test__calculate_cache_stats__and__clear_cache(self, mocker, tmp_path):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __graph = create_graph()
+        __converter = ConverterFactory.get_converter_by_type(".v1.LoadSql")
+        __node_cache = create_node_cache(tmp_path)
+        __node_cache.get_or_generate(__converter, "node_1", __graph)
+
+        actual = calculate_cache_stats(__node_cache.cache_dir)
+        assert actual.entries == 1
+        assert actual.size > 0
+        assert actual.oldest_used == actual.newest_used
+
+        assert clear_cache(__node_cache.cache_dir) == 1
+        assert calculate_cache_stats(__node_cache.cache_dir).entries == 0
+        assert clear_cache(__node_cache.cache_dir) == 0
+
+    def test__generate_dbt_models__use_cache(self, tmp_path, capsys):
+        with click.Context(click.Command("convert")) as ctx:
+            ctx.params = dict(
+                context_mock.params,
+                use_cache=True,
+                cache_dir=os.path.join(tmp_path, "cache"),
+                cache_max_size=1,
+            )
+            __graph = create_graph()
+            expected = generate_dbt_models(__graph)
+            actual = generate_dbt_models(__graph)
+
+        assert [model.model_name for model in actual] == [
+            model.model_name for model in expected
+        ]
+        assert [str(model.yml) for model in actual] == [
+            str(model.yml) for model in expected
+        ]
+        __out = capsys.readouterr().out
+        assert "0件ヒット、2件ミス" in __out
+        assert "2件ヒット、0件ミス" in __out
+
+    def test__generate_dbt_models__use_cache__stats(self, tmp_path, capsys):
+        for _ in range(2):
+            with click.Context(click.Command("convert")) as ctx:
+                ctx.params = dict(
+                    context_mock.params,
+                    use_cache=True,
+                    cache_dir=os.path.join(tmp_path, "cache"),
+                    cache_max_size=1,
+                    push_down_filters=True,
+                    fuse_projections=True,
+                    max_cte_depth=2,
+                )
+                generate_dbt_models(create_graph(PUSHDOWN_FLOW_SAMPLE))
+
+        __out = capsys.readouterr().out.splitlines()
+        assert "キャッシュ: 0件ヒット、5件ミス、0件を削除しました。" in __out
+        assert "キャッシュ: 5件ヒット、0件ミス、0件を削除しました。" in __out
+        # キャッシュから返したステップも、変換したときに数えた件数を足す
+        for prefix in ["フィルターの押し下げ", "射影の統合", "モデルの分割"]:
+            lines = [line for line in __out if line.startswith(prefix)]
+            assert len(lines) == 2
+            assert lines[0] == lines[1]
+            assert " 0件" not in lines[0]
+
+    def test__generate_dbt_models__use_cache__jobs(self, tmp_path, capsys):
+        __flow = build_synthetic_flow(20, 8, 6)
+        # 順番に計算したカラム定義でキャッシュし、並列に計算したカラム定義で引く
+        for jobs in [1, 3]:
+            with click.Context(click.Command("convert")) as ctx:
+                ctx.params = dict(
+                    context_mock.params,
+                    use_cache=True,
+                    cache_dir=os.path.join(tmp_path, "cache"),
+                    cache_max_size=1,
+                    jobs=jobs,
+                )
+                generate_dbt_models(create_graph(__flow))
+
+        __out = capsys.readouterr().out
+        assert "キャッシュ: 0件ヒット、20件ミス" in __out
+        assert "キャッシュ: 20件ヒット、0件ミス" in __out
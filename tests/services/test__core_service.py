@@ -1,14 +1,84 @@
+import json
+import os
+import zipfile
+
 import pytest
 
-from prep2dbt.core_services import (build_model_name, calculate_columns,
-                                    convert_to_graph)
-from prep2dbt.exceptions import UnknownJsonFormatException
+from prep2dbt.core_services import (before_execute_action, build_model_name,
+                                    calculate_columns, convert_to_graph)
+from prep2dbt.exceptions import (NoFlowFileExistsException,
+                                 UnknownJsonFormatException)
 from prep2dbt.models.graph import DAG
 from prep2dbt.models.node import ModelColumn, ModelColumns, ModelName, Node
 from tests.mocks import context_mock
 
 
 class TestCoreService:
+    def test__before_execute_action(self, mocker, tmp_path):
+        # フローファイルはzipのまま読み込まれ、作業ディレクトリには展開されない
+        __flow_file = os.path.join(tmp_path, "test.tfl")
+        with zipfile.ZipFile(__flow_file, "w") as archive:
+            archive.writestr("flow", json.dumps({"nodes": {}}))
+            archive.writestr("displaySettings", "{}")
+
+        __mock = context_mock()
+        __mock.params = dict(
+            __mock.params, flow_file=__flow_file, work_dir=str(tmp_path)
+        )
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+
+        actual = before_execute_action()
+
+        assert list(actual) == []
+        assert os.path.exists(os.path.join(tmp_path, "outputs"))
+        assert not os.path.exists(os.path.join(tmp_path, "tmp"))
+
+    def test__before_execute_action__packaged_flow(self, mocker, tmp_path, capsys):
+        # .tflxに同梱されたデータファイルは読み込まず、サイズだけ報告される
+        __flow_file = os.path.join(tmp_path, "test.tflx")
+        with zipfile.ZipFile(__flow_file, "w") as archive:
+            archive.writestr("flow", json.dumps({"nodes": {}}))
+            archive.writestr("maestroMetadata", "{}")
+            archive.writestr("Data/orders.csv", "a" * 1024 * 1024)
+
+        __mock = context_mock()
+        __mock.params = dict(
+            __mock.params, flow_file=__flow_file, work_dir=str(tmp_path)
+        )
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+
+        actual = before_execute_action()
+
+        assert list(actual) == []
+        out = capsys.readouterr().out
+        assert "1件（1.0 MB）" in out
+        assert "Data/orders.csv (1.0 MB)" in out
+        assert "maestroMetadata" not in out
+        assert not os.path.exists(os.path.join(tmp_path, "Data"))
+
+    def test__before_execute_action__no_flow(self, mocker, tmp_path):
+        __flow_file = os.path.join(tmp_path, "test.tfl")
+        with zipfile.ZipFile(__flow_file, "w") as archive:
+            archive.writestr("displaySettings", "{}")
+
+        __mock = context_mock()
+        __mock.params = dict(
+            __mock.params, flow_file=__flow_file, work_dir=str(tmp_path)
+        )
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+
+        with pytest.raises(NoFlowFileExistsException):
+            before_execute_action()
+
     def test__convert_to_graph__ng(self):
         in_dict = {}  # nodesがない
         with pytest.raises(UnknownJsonFormatException) as e:
@@ -266,6 +336,92 @@ class TestCoreService:
             == expected_grand_child_columns
         )
 
+    def test__calculate_columns__jobs(self, mocker):
+        # 同じ世代の子を並列に計算しても、直列に計算した結果と同じになる
+        __parent_dict = {
+            "nodeType": ".v1.LoadSql",
+            "name": "test_name",
+            "id": "test_parent_id",
+            "nextNodes": [
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "test_child_id_{}".format(idx),
+                    "nextNamespace": "Default",
+                }
+                for idx in range(3)
+            ],
+            "connectionAttributes": {
+                "schema": "schema",
+                "dbname": "db",
+                "warehouse": "wh",
+            },
+            "fields": [
+                {
+                    "name": "test_column_{}".format(idx),
+                    "type": "string",
+                    "collation": "null",
+                    "caption": "",
+                    "ordinal": idx,
+                    "isGenerated": "false",
+                }
+                for idx in range(3)
+            ],
+            "relation": {"type": "table", "table": "table"},
+        }
+        __child_dicts = [
+            {
+                "nodeType": ".v2018_2_3.SuperTransform",
+                "name": "name",
+                "id": "test_child_id_{}".format(idx),
+                "nextNodes": [],
+                "beforeActionAnnotations": [
+                    {
+                        "namespace": "Default",
+                        "annotationNode": {
+                            "nodeType": ".v1.RenameColumn",
+                            "columnName": "test_column_{}".format(idx),
+                            "rename": "test_column_{}_renamed".format(idx),
+                            "name": "テスト",
+                            "id": "test_annotation_id_{}".format(idx),
+                            "baseType": "transform",
+                            "nextNodes": [],
+                            "serialize": "false",
+                            "description": "null",
+                        },
+                    }
+                ],
+            }
+            for idx in range(3)
+        ]
+        __file_dict = {
+            "nodes": {
+                in_dict["id"]: in_dict for in_dict in [__parent_dict, *__child_dicts]
+            }
+        }
+        serial = convert_to_graph(__file_dict)
+        calculate_columns(serial)
+
+        __mock = context_mock()
+        __mock.params = dict(__mock.params, jobs=2)
+        mocker.patch("click.get_current_context", return_value=__mock)
+        actual = convert_to_graph(__file_dict)
+        calculate_columns(actual)
+
+        for node_id in serial.nodes:
+            assert (
+                actual.get_node_by_id(node_id).model_columns.names_list()
+                == serial.get_node_by_id(node_id).model_columns.names_list()
+            )
+            assert (
+                actual.get_node_by_id(node_id).model_columns
+                == serial.get_node_by_id(node_id).model_columns
+            )
+        assert actual.get_node_by_id("test_child_id_1").model_columns.names_list() == [
+            "test_column_0",
+            "test_column_2",
+            "test_column_1_renamed",
+        ]
+
     def test__calculate_columns__inaplicable_column_definitions(self):
         # 子が不明ノードで、カラム定義計算できない
         # - 親 -> 計算される
@@ -524,6 +680,165 @@ class TestCoreService:
 
         assert actual == expected_names
 
+    def test__build_model_name__numbered_by_id(self, mocker):
+        # 連番は追加された順ではなく、同じ名前のステップの中でのIDの昇順でふられる
+        __mock = context_mock()
+        __mock.params["prefix"] = ""
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+
+        in_graph = DAG()
+        for node_id, name in [("id_c", "集計 1/2"), ("id_a", "集計 1/2"), ("id_b", "x")]:
+            in_graph.add_node(
+                Node(
+                    node_id,
+                    name,
+                    ".v1.LoadSql",
+                    {"nextNodes": []},
+                    ModelName.initialized(),
+                    ModelColumns.initialized(),
+                )
+            )
+
+        build_model_name(in_graph)
+
+        actual = {
+            node_id: in_graph.get_node_by_id(node_id).model_name.value
+            for node_id in in_graph.nodes
+        }
+        assert actual == {"id_c": "集計12_2", "id_a": "集計12_1", "id_b": "x_1"}
+
+    def test__build_model_name__grouped_by_step_name(self, mocker):
+        # 連番は、空白などを取り除く前のステップ名ごとにふる（これまでの出力と同じ）
+        __mock = context_mock()
+        __mock.params["prefix"] = ""
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+
+        in_graph = DAG()
+        for node_id, name in [("id_a", "集計 1/2"), ("id_b", "集計12"), ("id_c", "集計 1/2")]:
+            in_graph.add_node(
+                Node(
+                    node_id,
+                    name,
+                    ".v1.LoadSql",
+                    {"nextNodes": []},
+                    ModelName.initialized(),
+                    ModelColumns.initialized(),
+                )
+            )
+
+        build_model_name(in_graph)
+
+        actual = {
+            node_id: in_graph.get_node_by_id(node_id).model_name.value
+            for node_id in in_graph.nodes
+        }
+        assert actual == {"id_a": "集計12_1", "id_b": "集計12_1", "id_c": "集計12_2"}
+
+    def test__build_model_name__stable(self, mocker, tmp_path):
+        # 前回のモデル名を引き継ぎ、追加されたステップだけに新しい連番をふる
+        __mock = context_mock()
+        __mock.params = dict(
+            __mock.params, prefix="", naming="stable", work_dir=str(tmp_path)
+        )
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+
+        def __graph(nodes: list[tuple[str, str]]) -> DAG:
+            graph = DAG()
+            for node_id, name in nodes:
+                graph.add_node(
+                    Node(
+                        node_id,
+                        name,
+                        ".v1.LoadSql",
+                        {"nextNodes": []},
+                        ModelName.initialized(),
+                        ModelColumns.initialized(),
+                    )
+                )
+            return graph
+
+        def __names(graph: DAG) -> dict[str, str]:
+            return {
+                node_id: graph.get_node_by_id(node_id).model_name.value
+                for node_id in graph.nodes
+            }
+
+        in_graph = __graph([("id_b", "集計"), ("id_c", "集計"), ("id_d", "結合")])
+        build_model_name(in_graph)
+        # 初回は、sequentialと同じ
+        assert __names(in_graph) == {
+            "id_b": "集計_1",
+            "id_c": "集計_2",
+            "id_d": "結合_1",
+        }
+        assert os.path.exists(os.path.join(tmp_path, "model_names.json"))
+
+        # IDの小さいステップを追加し、id_dのステップ名を変える
+        in_graph = __graph(
+            [("id_a", "集計"), ("id_b", "集計"), ("id_c", "集計"), ("id_d", "集計")]
+        )
+        build_model_name(in_graph)
+        assert __names(in_graph) == {
+            "id_a": "集計_3",
+            "id_b": "集計_1",
+            "id_c": "集計_2",
+            "id_d": "集計_4",
+        }
+
+        # id_bを削除すると、空いた連番は新しいステップに使われる
+        in_graph = __graph([("id_a", "集計"), ("id_c", "集計"), ("id_e", "集計")])
+        build_model_name(in_graph)
+        assert __names(in_graph) == {
+            "id_a": "集計_3",
+            "id_c": "集計_2",
+            "id_e": "集計_1",
+        }
+
+    @pytest.mark.parametrize(
+        "content",
+        ["broken", "[]", "null", '"name"'],
+        ids=["broken", "list", "null", "str"],
+    )
+    def test__build_model_name__stable__unreadable_map(
+        self, mocker, tmp_path, capsys, content
+    ):
+        # 前回のモデル名が読めない、またはオブジェクトでなければ、採番しなおす
+        __mock = context_mock()
+        __mock.params = dict(
+            __mock.params, prefix="", naming="stable", work_dir=str(tmp_path)
+        )
+        mocker.patch(
+            "click.get_current_context",
+            return_value=__mock,
+        )
+        with open(os.path.join(tmp_path, "model_names.json"), "w") as f:
+            f.write(content)
+
+        in_graph = DAG()
+        in_graph.add_node(
+            Node(
+                "id_a",
+                "集計",
+                ".v1.LoadSql",
+                {"nextNodes": []},
+                ModelName.initialized(),
+                ModelColumns.initialized(),
+            )
+        )
+        build_model_name(in_graph)
+
+        assert in_graph.get_node_by_id("id_a").model_name.value == "集計_1"
+        assert "モデル名を採番しなおします" in capsys.readouterr().out
+
     def test__build_model_name__with_prefix(self, mocker):
         __mock = context_mock()
         __mock.params["prefix"] = "PREFIX"
@@ -5,6 +5,7 @@ from prep2dbt.describe_services import (calculate_average_degree,
                                         calculate_depth_and_width,
                                         calculate_node_and_edge_count,
                                         calculate_source_and_sink_count)
+from prep2dbt.models.compact_graph import CompactDAG
 from prep2dbt.models.graph import DAG
 
 
@@ -65,3 +66,16 @@ class TestDescribeService:
         actual = calculate_average_degree(in_dag)
         expected = 1.5  # degreeは、1, 3, 1, 1
         assert actual == expected
+
+    def test__compact_dag(self):
+        # 1 -┐
+        #    2 - 4
+        # 3 -┘
+        in_dag = CompactDAG()
+        for from_node_id, to_node_id in [("1", "2"), ("3", "2"), ("2", "4")]:
+            in_dag.add_edge(from_node_id, to_node_id)
+
+        # networkxのグラフを持たないDAGでも、同じように計算する
+        assert calculate_node_and_edge_count(in_dag) == (4, 3)
+        assert calculate_source_and_sink_count(in_dag) == (2, 1)
+        assert calculate_average_degree(in_dag) == 1.5
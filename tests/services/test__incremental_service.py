@@ -0,0 +1,201 @@
+import copy
+import json
+import os
+import zipfile
+
+import click
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.core_services import (before_execute_action, build_model_name,
+                                    convert_nodes_to_graph, convert_to_graph)
+from prep2dbt.incremental_services import (INCREMENTAL_CACHE_FILE_NAME,
+                                           calculate_fingerprints,
+                                           convert_incrementally)
+from prep2dbt.models.incremental_cache import IncrementalCache
+from tests.mocks import context_mock
+from tests.services.test__pruning_service import \
+    FLOW_SAMPLE as PUSHDOWN_FLOW_SAMPLE
+
+FLOW_SAMPLE = {
+    "nodes": {
+        "node_1": {
+            "nodeType": ".v1.LoadSql",
+            "name": "orders",
+            "id": "node_1",
+            "baseType": "input",
+            "nextNodes": [
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "node_2",
+                    "nextNamespace": "Default",
+                }
+            ],
+            "connectionAttributes": {"schema": "PUBLIC", "dbname": "DB"},
+            "fields": [
+                {"name": "ID", "type": "integer", "ordinal": 1, "caption": ""},
+            ],
+            "relation": {"type": "table", "table": "[DB].[PUBLIC].[ORDERS]"},
+        },
+        "node_2": {
+            "nodeType": ".v2018_2_3.SuperTransform",
+            "name": "cleaning",
+            "id": "node_2",
+            "baseType": "superNode",
+            "nextNodes": [],
+            "beforeActionAnnotations": [
+                {
+                    "namespace": "Default",
+                    "annotationNode": {
+                        "nodeType": ".v1.AddColumn",
+                        "columnName": "ID_2",
+                        "expression": "[ID] + 1",
+                        "name": "Add ID_2",
+                        "id": "annotation_1",
+                    },
+                }
+            ],
+            "afterActionAnnotations": [],
+        },
+        "node_3": {
+            "nodeType": ".v1.LoadSql",
+            "name": "customers",
+            "id": "node_3",
+            "baseType": "input",
+            "nextNodes": [],
+            "connectionAttributes": {"schema": "PUBLIC", "dbname": "DB"},
+            "fields": [
+                {"name": "NAME", "type": "string", "ordinal": 1, "caption": ""},
+            ],
+            "relation": {"type": "table", "table": "[DB].[PUBLIC].[CUSTOMERS]"},
+        },
+    }
+}
+
+
+def write_flow(path: str, flow: dict = FLOW_SAMPLE) -> str:
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("flow", json.dumps(flow))
+    return path
+
+
+def read_outputs(work_dir: str) -> dict[str, str]:
+    outputs = os.path.join(work_dir, "outputs")
+    result = {}
+    for file_name in sorted(os.listdir(outputs)):
+        with open(os.path.join(outputs, file_name), encoding="UTF-8") as f:
+            result[file_name] = f.read()
+    return result
+
+
+def convert(tmp_path, flow: dict = FLOW_SAMPLE, **params) -> int:
+    """差分変換を実行し、変換しなおしたdbtモデルの数を返す"""
+    with click.Context(click.Command("convert")) as ctx:
+        ctx.params = dict(
+            context_mock.params,
+            flow_file=write_flow(os.path.join(tmp_path, "test.tfl"), flow),
+            work_dir=os.path.join(tmp_path, "out"),
+            graph_backend="networkx",
+            **params,
+        )
+        os.makedirs(ctx.params["work_dir"], exist_ok=True)
+        graph = convert_nodes_to_graph(before_execute_action())
+        build_model_name(graph)
+        return len(convert_incrementally(graph).models)
+
+
+class TestIncrementalService:
+    def test__calculate_fingerprints(self, mocker):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __changed = copy.deepcopy(FLOW_SAMPLE)
+        __changed["nodes"]["node_1"]["fields"][0]["type"] = "string"
+
+        __graph = convert_to_graph(copy.deepcopy(FLOW_SAMPLE))
+        build_model_name(__graph)
+        __changed_graph = convert_to_graph(__changed)
+        build_model_name(__changed_graph)
+
+        expected = calculate_fingerprints(__graph)
+        actual = calculate_fingerprints(__changed_graph)
+
+        # 変更したステップと、その下流のステップだけハッシュ値が変わる
+        assert actual["node_1"] != expected["node_1"]
+        assert actual["node_2"] != expected["node_2"]
+        assert actual["node_3"] == expected["node_3"]
+        assert calculate_fingerprints(__graph) == expected
+
+    def test__convert_incrementally(self, tmp_path, capsys):
+        # sourceとmodelの2つずつ + SuperTransformのmodel
+        assert convert(tmp_path) == 5
+        expected = read_outputs(os.path.join(tmp_path, "out"))
+
+        assert convert(tmp_path) == 0
+        assert read_outputs(os.path.join(tmp_path, "out")) == expected
+        assert "3件のステップのうち、0件を変換しなおしました" in capsys.readouterr().out
+
+    def test__convert_incrementally__changed_node(self, tmp_path):
+        __changed = copy.deepcopy(FLOW_SAMPLE)
+        __annotation = __changed["nodes"]["node_2"]["beforeActionAnnotations"][0]
+        __annotation["annotationNode"]["expression"] = "[ID] + 2"
+        convert(tmp_path)
+
+        assert convert(tmp_path, __changed) == 1
+        actual = read_outputs(os.path.join(tmp_path, "out"))
+
+        # すべて変換しなおした結果と同じになる
+        os.remove(os.path.join(tmp_path, "out", INCREMENTAL_CACHE_FILE_NAME))
+        assert convert(tmp_path, __changed) == 5
+        assert read_outputs(os.path.join(tmp_path, "out")) == actual
+
+    def test__convert_incrementally__changed_upstream_node(self, tmp_path):
+        __changed = copy.deepcopy(FLOW_SAMPLE)
+        __changed["nodes"]["node_1"]["fields"][0]["type"] = "string"
+        convert(tmp_path)
+
+        # 変更したステップと、その下流のステップを変換しなおす
+        assert convert(tmp_path, __changed) == 3
+
+    def test__convert_incrementally__prune_columns(self, tmp_path):
+        # アノテーションを重ねたカラム定義は、前回の変換結果から復元したものと作られ方が違う
+        __flow = build_synthetic_flow(20, 8, 6)
+        convert(tmp_path, __flow, prune_columns=True)
+
+        # 内容が同じなら、変換しなおさない
+        assert convert(tmp_path, __flow, prune_columns=True) == 0
+
+    def test__convert_incrementally__changed_options(self, tmp_path):
+        convert(tmp_path)
+
+        assert convert(tmp_path, dialect="postgre") == 5
+
+    def test__convert_incrementally__broken_cache(self, tmp_path, capsys):
+        convert(tmp_path)
+        with open(os.path.join(tmp_path, "out", INCREMENTAL_CACHE_FILE_NAME), "w") as f:
+            f.write("broken")
+
+        assert convert(tmp_path) == 5
+        assert "すべてのステップを変換しなおします" in capsys.readouterr().out
+
+    def test__convert_incrementally__saved_cache(self, tmp_path):
+        convert(tmp_path)
+
+        # 前回の変換結果は、データだけのJSONで保存する
+        with open(
+            os.path.join(tmp_path, "out", INCREMENTAL_CACHE_FILE_NAME), encoding="UTF-8"
+        ) as f:
+            data = json.load(f)
+        cache = IncrementalCache.from_dict(data)
+        assert cache.to_dict() == data
+        assert cache.nodes["node_2"].model_columns.names_list() == ["ID", "ID_2"]
+
+    def test__convert_incrementally__stats(self, tmp_path, capsys):
+        params = dict(push_down_filters=True, fuse_projections=True, max_cte_depth=2)
+        convert(tmp_path, PUSHDOWN_FLOW_SAMPLE, **params)
+        assert convert(tmp_path, PUSHDOWN_FLOW_SAMPLE, **params) == 0
+
+        __out = capsys.readouterr().out.splitlines()
+        # 変換しなおさなかったステップも、前回数えた件数を足す
+        for prefix in ["フィルターの押し下げ", "射影の統合", "モデルの分割"]:
+            lines = [line for line in __out if line.startswith(prefix)]
+            assert len(lines) == 2
+            assert lines[0] == lines[1]
+            assert " 0件" not in lines[0]
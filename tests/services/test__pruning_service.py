@@ -0,0 +1,297 @@
+import copy
+import os
+
+import click
+
+from prep2dbt.converters.supertransform.converter import \
+    SuperTransformConverter
+from prep2dbt.core_services import (build_model_name, calculate_columns,
+                                    convert_to_graph)
+from prep2dbt.dbt_services import generate_dbt_models
+from prep2dbt.models.graph import DAG
+from prep2dbt.pruning_services import (PRUNING_RESULT_FILE_NAME,
+                                       calculate_required_columns,
+                                       output_pruning_result,
+                                       prune_unused_columns)
+from tests.mocks import context_mock
+
+
+def load_sql(node_id: str, name: str, fields: list[str], next_nodes: list) -> dict:
+    return {
+        "nodeType": ".v1.LoadSql",
+        "name": name,
+        "id": node_id,
+        "baseType": "input",
+        "nextNodes": next_nodes,
+        "connectionAttributes": {"schema": "PUBLIC", "dbname": "DB"},
+        "fields": [
+            {"name": field, "type": "string", "ordinal": i + 1, "caption": ""}
+            for i, field in enumerate(fields)
+        ],
+        "relation": {"type": "table", "table": "[DB].[PUBLIC].[" + name + "]"},
+    }
+
+
+def next_node(node_id: str, namespace: str = "Default") -> list:
+    return [{"namespace": "Default", "nextNodeId": node_id, "nextNamespace": namespace}]
+
+
+def transform(
+    node_id: str, node_type: str, columns: list[str], next_nodes: list
+) -> dict:
+    return {
+        "nodeType": ".v2018_2_3.SuperTransform",
+        "name": node_id,
+        "id": node_id,
+        "baseType": "superNode",
+        "nextNodes": next_nodes,
+        "beforeActionAnnotations": [
+            {
+                "namespace": "Default",
+                "annotationNode": {
+                    "nodeType": node_type,
+                    "columnNames": columns,
+                    "name": node_id + "_annotation",
+                    "id": node_id + "_annotation",
+                },
+            }
+        ],
+        "afterActionAnnotations": [],
+    }
+
+
+FLOW_SAMPLE = {
+    "nodes": {
+        "node_1": load_sql(
+            "node_1",
+            "orders",
+            ["ID", "CUSTOMER_ID", "AMOUNT", "STATUS", "NOTE"],
+            next_node("node_2"),
+        ),
+        "node_2": {
+            "nodeType": ".v2018_2_3.SuperTransform",
+            "name": "cleaning",
+            "id": "node_2",
+            "baseType": "superNode",
+            "nextNodes": next_node("node_4", "Left"),
+            "beforeActionAnnotations": [
+                {
+                    "namespace": "Default",
+                    "annotationNode": {
+                        "nodeType": ".v1.AddColumn",
+                        "columnName": "DOUBLE",
+                        "expression": "[AMOUNT] * 2",
+                        "name": "double",
+                        "id": "annotation_1",
+                    },
+                },
+                {
+                    "namespace": "Default",
+                    "annotationNode": {
+                        "nodeType": ".v1.FilterOperation",
+                        "filterExpression": "[STATUS] = 'done'",
+                        "name": "filter",
+                        "id": "annotation_2",
+                    },
+                },
+            ],
+            "afterActionAnnotations": [],
+        },
+        "node_3": load_sql(
+            "node_3",
+            "customers",
+            ["ID", "NAME", "ADDRESS"],
+            next_node("node_4", "Right"),
+        ),
+        "node_4": {
+            "nodeType": ".v2018_2_3.SuperJoin",
+            "name": "join",
+            "id": "node_4",
+            "baseType": "superNode",
+            "nextNodes": next_node("node_5"),
+            "beforeActionAnnotations": [],
+            "afterActionAnnotations": [],
+            "actionNode": {
+                "nodeType": ".v1.SimpleJoin",
+                "name": "join",
+                "id": "action_4",
+                "conditions": [
+                    {
+                        "leftExpression": "[CUSTOMER_ID]",
+                        "rightExpression": "[ID]",
+                        "comparator": "==",
+                    }
+                ],
+                "joinType": "inner",
+            },
+        },
+        "node_5": {
+            "nodeType": ".v2018_2_3.SuperAggregate",
+            "name": "aggregate",
+            "id": "node_5",
+            "baseType": "superNode",
+            "nextNodes": [],
+            "beforeActionAnnotations": [],
+            "afterActionAnnotations": [],
+            "actionNode": {
+                "nodeType": ".v1.Aggregate",
+                "name": "aggregate",
+                "id": "action_5",
+                "groupByFields": [
+                    {
+                        "columnName": "NAME",
+                        "function": "GroupBy",
+                        "newColumnName": None,
+                        "specialFieldType": None,
+                    }
+                ],
+                "aggregateFields": [
+                    {
+                        "columnName": "DOUBLE",
+                        "function": "SUM",
+                        "newColumnName": "TOTAL",
+                        "specialFieldType": None,
+                    }
+                ],
+            },
+        },
+    }
+}
+
+
+def create_graph(flow: dict = FLOW_SAMPLE) -> DAG:
+    graph = convert_to_graph(copy.deepcopy(flow))
+    build_model_name(graph)
+    calculate_columns(graph)
+    return graph
+
+
+def column_names(graph: DAG, node_id: str) -> list[str]:
+    return graph.get_node_by_id(node_id).model_columns.names_list()
+
+
+class TestPruningService:
+    def test__calculate_required_columns(self, mocker):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        actual = calculate_required_columns(create_graph())
+
+        assert actual == {
+            # 結合条件の列名は両側で必要とみなすので、IDも残る
+            "node_1": {"ID", "CUSTOMER_ID", "AMOUNT", "STATUS"},
+            "node_2": {"ID", "CUSTOMER_ID", "DOUBLE"},
+            "node_3": {"ID", "NAME"},
+            "node_4": {"NAME", "DOUBLE"},
+            # 出力先のカラムは、すべて必要
+            "node_5": {"NAME", "TOTAL"},
+        }
+
+    def test__prune_unused_columns(self, mocker):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __graph = create_graph()
+
+        actual = prune_unused_columns(__graph)
+
+        assert actual.error == ""
+        assert [(model.node_name, model.pruned_columns) for model in actual.models] == [
+            ("orders", ("NOTE",)),
+            ("customers", ("ADDRESS",)),
+            ("cleaning", ("AMOUNT", "STATUS", "NOTE")),
+            (
+                "join",
+                ("ID", "CUSTOMER_ID", "AMOUNT", "STATUS", "NOTE", "ID-1", "ADDRESS"),
+            ),
+        ]
+        assert actual.pruned_count == 12
+        assert sorted(column_names(__graph, "node_4")) == ["DOUBLE", "NAME"]
+        assert sorted(column_names(__graph, "node_5")) == ["NAME", "TOTAL"]
+
+        __sql = {
+            model.model_name: model.sql.dbt_sql
+            for model in generate_dbt_models(__graph)
+            if model.sql is not None
+        }
+        __cleaning = __sql[__graph.get_node_by_id("node_2").model_name.value]
+        # 親から読まないカラムは参照せず、取り除いたカラムはモデルの出力に含めない
+        assert '"NOTE"' not in __cleaning
+        assert __cleaning.endswith(
+            ' SELECT final."ID", final."CUSTOMER_ID", final."DOUBLE" \nFROM final'
+        )
+
+    def test__prune_unused_columns__keep_output(self, mocker):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __flow = copy.deepcopy(FLOW_SAMPLE)
+        # 出力先にするため、集計をなくす
+        del __flow["nodes"]["node_5"]
+        __flow["nodes"]["node_4"]["nextNodes"] = []
+        __graph = create_graph(__flow)
+        expected = column_names(__graph, "node_4")
+
+        actual = prune_unused_columns(__graph)
+
+        # 出力先のカラムは削減しないので、出力先がすべてのカラムを使う親も削減しない
+        assert column_names(__graph, "node_4") == expected
+        assert actual.models == ()
+
+    def test__prune_unused_columns__unchanged_descendant(self, mocker):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __flow = {
+            "nodes": {
+                "node_1": load_sql(
+                    "node_1", "orders", ["ID", "NOTE", "X"], next_node("node_2")
+                ),
+                "node_2": transform(
+                    "node_2", ".v1.KeepOnlyColumns", ["ID", "X"], next_node("node_3")
+                ),
+                "node_3": transform("node_3", ".v1.KeepOnlyColumns", ["ID", "X"], []),
+            }
+        }
+        __graph = create_graph(__flow)
+        __calculate_node = mocker.patch.object(
+            SuperTransformConverter,
+            "calculate_node",
+            wraps=SuperTransformConverter.calculate_node,
+        )
+
+        actual = prune_unused_columns(__graph)
+
+        assert [(model.node_name, model.pruned_columns) for model in actual.models] == [
+            ("orders", ("NOTE",))
+        ]
+        # node_2のカラムは作り直しても内容が同じなので、node_3は再計算しない
+        assert __calculate_node.call_count == 1
+
+    def test__prune_unused_columns__failed(self, mocker):
+        mocker.patch("click.get_current_context", return_value=context_mock())
+        __graph = create_graph()
+        expected = {
+            node_id: column_names(__graph, node_id) for node_id in __graph.nodes
+        }
+        __required = calculate_required_columns(__graph)
+        # 親のカラムを削減すると計算できないカラムを、必要とするステップがある
+        __required["node_2"].add("NOT_EXISTS")
+        mocker.patch(
+            "prep2dbt.pruning_services.calculate_required_columns",
+            return_value=__required,
+        )
+
+        actual = prune_unused_columns(__graph)
+
+        assert actual.models == ()
+        assert "NOT_EXISTS" in actual.error
+        # 削減をとりやめたら、グラフを元に戻す
+        assert {
+            node_id: column_names(__graph, node_id) for node_id in __graph.nodes
+        } == expected
+
+    def test__output_pruning_result(self, tmp_path, capsys):
+        os.makedirs(os.path.join(tmp_path, "outputs"))
+        with click.Context(click.Command("convert")) as ctx:
+            ctx.params = dict(context_mock.params, work_dir=str(tmp_path))
+            __graph = create_graph()
+            output_pruning_result(prune_unused_columns(__graph))
+
+        assert "4件のモデルから、12件のカラムを取り除きました" in capsys.readouterr().out
+        with open(os.path.join(tmp_path, "outputs", PRUNING_RESULT_FILE_NAME)) as f:
+            __lines = f.read().splitlines()
+        assert __lines[0] == "model_name,name,column_count,pruned_count,pruned_columns"
+        assert len(__lines) == 5
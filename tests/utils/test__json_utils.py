@@ -0,0 +1,243 @@
+import io
+import json
+
+import pytest
+
+from benchmarks.flows import build_synthetic_flow
+from prep2dbt.exceptions import UnknownJsonFormatException
+from prep2dbt.json_utils import (FlowNodeReader, JsonBackendRegistry,
+                                 LazyRawDict, StdlibJsonBackend,
+                                 get_json_backend)
+
+FLOW_SAMPLE = {
+    "parameters": {"parameters": {}},
+    "initialNodes": ["node_1"],
+    "nodes": {
+        "node_1": {
+            "nodeType": ".v1.LoadSql",
+            "name": 'クォート"と{括弧}[を含む]名前😀\\',
+            "id": "node_1",
+            "nextNodes": [
+                {
+                    "namespace": "Default",
+                    "nextNodeId": "node_2",
+                    "nextNamespace": "Default",
+                }
+            ],
+            "fields": [
+                {"name": "ID", "type": "integer", "ordinal": 1, "caption": None},
+                {"name": "AMOUNT", "type": "real", "ordinal": 2.5, "caption": ""},
+            ],
+        },
+        "node_2": {
+            "nodeType": ".v1.Container",
+            "name": "name",
+            "id": "node_2",
+            "nextNodes": [],
+            "loomContainer": {"nodes": {"inner": {"nodeType": ".v1.AddColumn"}}},
+        },
+    },
+    "majorVersion": 1,
+    "minorVersion": 8,
+}
+
+
+class TestFlowNodeReader:
+    @pytest.mark.parametrize(
+        ["chunk_size"],
+        [
+            pytest.param(1, id="1 byte"),
+            pytest.param(7, id="7 bytes"),
+            pytest.param(1024 * 1024, id="whole file"),
+        ],
+    )
+    def test__iter_nodes(self, chunk_size):
+        in_bytes = json.dumps(FLOW_SAMPLE, indent=4, ensure_ascii=False).encode("UTF-8")
+
+        actual = list(FlowNodeReader(io.BytesIO(in_bytes), chunk_size).iter_nodes())
+
+        assert actual == list(FLOW_SAMPLE["nodes"].values())
+
+    def test__iter_raw_nodes(self):
+        in_bytes = b'\xef\xbb\xbf{"nodes": {"a": {"id": "a"}, "b": {"id": "b"}}}'
+
+        actual = list(FlowNodeReader(io.BytesIO(in_bytes), 3).iter_raw_nodes())
+
+        assert actual == [b'{"id": "a"}', b'{"id": "b"}']
+
+    def test__iter_lazy_nodes(self):
+        in_bytes = json.dumps(FLOW_SAMPLE, indent=4, ensure_ascii=False).encode("UTF-8")
+
+        actual = list(FlowNodeReader(io.BytesIO(in_bytes), 7).iter_lazy_nodes())
+
+        assert [dict(node) for node in actual] == list(FLOW_SAMPLE["nodes"].values())
+
+    def test__iter_lazy_nodes__not_decoded(self):
+        in_bytes = json.dumps(FLOW_SAMPLE, indent=4, ensure_ascii=False).encode("UTF-8")
+        reader = FlowNodeReader(io.BytesIO(in_bytes), 7)
+        raw_decode = reader.scanner.raw_decode
+        decoded = []
+
+        def spy(s, idx=0):
+            value, end = raw_decode(s, idx)
+            decoded.append(value)
+            return value, end
+
+        reader.scanner.raw_decode = spy  # type: ignore
+        actual = list(reader.iter_lazy_nodes())
+
+        # オブジェクトや配列は、読み飛ばすだけで、Pythonのオブジェクトにデコードしない
+        assert len(actual) == 2
+        assert not any(isinstance(value, (dict, list)) for value in decoded)
+
+    @pytest.mark.parametrize(
+        ["in_bytes"],
+        [
+            pytest.param(b'{"majorVersion": 1}', id="no nodes"),
+            pytest.param(b'{"nodes": {"a": {"id": ["a"}}}', id="mismatched"),
+            pytest.param(b'{"nodes": {"a": {"id": "a}}}', id="string not closed"),
+            pytest.param(b'{"nodes": {"a": {"id": "a"}', id="not closed"),
+            pytest.param(b"[]", id="not object"),
+        ],
+    )
+    def test__iter_nodes__ng(self, in_bytes):
+        with pytest.raises(UnknownJsonFormatException):
+            list(FlowNodeReader(io.BytesIO(in_bytes), 4).iter_nodes())
+
+
+class TestLazyRawDict:
+    def test__lazy_decode(self):
+        in_dict = FLOW_SAMPLE["nodes"]["node_1"]
+        actual = LazyRawDict.from_bytes(
+            json.dumps(in_dict, ensure_ascii=False).encode("UTF-8")
+        )
+
+        # 文字列などの値はそのまま、配列やオブジェクトはアクセスされるまでデコードしない
+        assert actual.decoded_keys == ["nodeType", "name", "id"]
+        assert list(actual.keys()) == list(in_dict.keys())
+        assert "fields" in actual
+        assert actual.decoded_keys == ["nodeType", "name", "id"]
+
+        assert actual["fields"] == in_dict["fields"]
+        assert actual.decoded_keys == ["nodeType", "name", "id", "fields"]
+        # デコード結果は使いまわす
+        assert actual["fields"] is actual["fields"]
+        assert actual.get("notExists") is None
+
+    def test__to_dict(self):
+        in_dict = FLOW_SAMPLE["nodes"]["node_2"]
+        actual = LazyRawDict.from_bytes(json.dumps(in_dict).encode("UTF-8"))
+
+        assert actual.to_dict() == in_dict
+        # to_dictでは、デコード結果を保持しない
+        assert actual.decoded_keys == ["nodeType", "name", "id"]
+
+    @pytest.mark.parametrize(
+        ["backend"],
+        [
+            pytest.param(backend, id=name)
+            for name, backend in JsonBackendRegistry.backends.items()
+        ],
+    )
+    def test__dumps(self, backend):
+        # LazyRawDictも、辞書と同じようにjsonに変換できる
+        if not backend.is_available():
+            pytest.skip("{} is not installed".format(backend.name))
+        in_dict = FLOW_SAMPLE["nodes"]["node_1"]
+        actual = LazyRawDict.from_bytes(
+            json.dumps(in_dict, ensure_ascii=False).encode("UTF-8")
+        )
+
+        assert backend.dumps(actual, indent=4) == json.dumps(in_dict, indent=4)
+
+
+class TestJsonBackend:
+    @pytest.mark.parametrize(
+        ["backend"],
+        [
+            pytest.param(backend, id=name)
+            for name, backend in JsonBackendRegistry.backends.items()
+        ],
+    )
+    @pytest.mark.parametrize(
+        ["ensure_ascii"], [pytest.param(True), pytest.param(False)]
+    )
+    @pytest.mark.parametrize(["indent"], [pytest.param(2), pytest.param(4)])
+    def test__dumps(self, backend, ensure_ascii, indent):
+        # どのbackendでも、json.dumpsと同じ書式で出力される
+        if not backend.is_available():
+            pytest.skip("{} is not installed".format(backend.name))
+
+        actual = backend.dumps(FLOW_SAMPLE, indent=indent, ensure_ascii=ensure_ascii)
+
+        assert actual == json.dumps(
+            FLOW_SAMPLE, indent=indent, ensure_ascii=ensure_ascii
+        )
+
+    @pytest.mark.parametrize(
+        ["backend"],
+        [
+            pytest.param(backend, id=name)
+            for name, backend in JsonBackendRegistry.backends.items()
+        ],
+    )
+    def test__dumps__flow(self, backend):
+        # 実際のフローと同じ形の合成フローでも、json.dumpsとバイト単位で同じになる（NaNなどと指数表記の小数は含まない）
+        if not backend.is_available():
+            pytest.skip("{} is not installed".format(backend.name))
+        flow = build_synthetic_flow(30)
+        # インデントの置き換えや、エスケープを間違えやすい値
+        flow["nodes"]["node_1"]["tricky"] = {
+            "empty": [{}, [], [[]], {"a": {}}],
+            "text": '改行\n    とタブ\t、"引用符"\\と😀',
+            "numbers": [0, -1, 2**62, 1.5, -0.25, True, False, None],
+        }
+        in_bytes = json.dumps(flow, ensure_ascii=False).encode("UTF-8")
+
+        for ensure_ascii in [True, False]:
+            for indent in [2, 4]:
+                assert backend.dumps(
+                    flow, indent=indent, ensure_ascii=ensure_ascii
+                ) == json.dumps(flow, indent=indent, ensure_ascii=ensure_ascii)
+        # モデルのymlのdescriptionと同じく、読み込んだステップを1つずつ変換する
+        nodes = FlowNodeReader(io.BytesIO(in_bytes), 4096).iter_lazy_nodes()
+        for node, expected in zip(nodes, flow["nodes"].values()):
+            assert backend.dumps(node, indent=4, ensure_ascii=False) == json.dumps(
+                expected, indent=4, ensure_ascii=False
+            )
+
+    @pytest.mark.parametrize(
+        ["backend"],
+        [
+            pytest.param(backend, id=name)
+            for name, backend in JsonBackendRegistry.backends.items()
+        ],
+    )
+    def test__dumps__non_finite(self, backend):
+        # NaNやInfinityも、読み込んだ値ならjson.dumpsと同じく出力される（orjsonではnullにならない）
+        if not backend.is_available():
+            pytest.skip("{} is not installed".format(backend.name))
+        in_bytes = b'{"id": "node_1", "a": NaN, "b": {"c": [Infinity, -Infinity, 1.5]}}'
+        expected = json.dumps(json.loads(in_bytes), indent=4)
+
+        assert backend.dumps(backend.loads(in_bytes), indent=4) == expected
+        node = FlowNodeReader(io.BytesIO(in_bytes)).read_lazy_object()
+        assert backend.dumps(node, indent=4) == expected
+
+    @pytest.mark.parametrize(
+        ["backend"],
+        [
+            pytest.param(backend, id=name)
+            for name, backend in JsonBackendRegistry.backends.items()
+        ],
+    )
+    def test__loads(self, backend):
+        if not backend.is_available():
+            pytest.skip("{} is not installed".format(backend.name))
+
+        in_bytes = json.dumps(FLOW_SAMPLE, ensure_ascii=False).encode("UTF-8")
+
+        assert backend.loads(in_bytes) == FLOW_SAMPLE
+
+    def test__get_json_backend__fallback(self):
+        assert get_json_backend("not_exists") == StdlibJsonBackend
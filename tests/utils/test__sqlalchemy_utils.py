@@ -0,0 +1,66 @@
+import click
+from sqlalchemy import Column, MetaData, String, Table, select
+
+from prep2dbt.sqlalchemy_utils import (SqlCompiler, compile_sql_statements,
+                                       get_sql_compiler)
+from tests.mocks import context_mock
+
+
+def create_statements():
+    table = Table(
+        "test_table", MetaData(), Column("ID", String), Column("NAME", String)
+    )
+    return select(table.c.ID, table.c.NAME).cte("final")
+
+
+class TestSqlCompiler:
+    def test__compile(self):
+        actual = SqlCompiler("snowflake").compile(create_statements())
+
+        assert (
+            actual
+            == """WITH final AS 
+(SELECT test_table."ID" AS "ID", test_table."NAME" AS "NAME" 
+FROM test_table)
+ SELECT final."ID", final."NAME" 
+FROM final"""
+        )
+
+    def test__compile__cte_tags(self):
+        source = create_statements()
+        stmts = select(source.c.ID).where(source.c.NAME == "x").cte("filtered")
+
+        actual = SqlCompiler("snowflake").compile(
+            stmts, cte_tags={source: "{{ ref('split_1') }}"}
+        )
+
+        # 切り出したCTEはWITH句に書き出さず、CTE名を別名にしたタグで参照する
+        assert (
+            actual
+            == """WITH filtered AS 
+(SELECT final."ID" AS "ID" 
+FROM {{ ref('split_1') }} AS final 
+WHERE final."NAME" = %(NAME_1)s)
+ SELECT filtered."ID" 
+FROM filtered"""
+        )
+
+    def test__get_sql_compiler(self):
+        with click.Context(click.Command("convert")) as ctx:
+            ctx.params = dict(context_mock.params)
+            expected = get_sql_compiler()
+
+            # 同じ実行の中では、同じコンパイラを使いまわす
+            assert get_sql_compiler() is expected
+            assert compile_sql_statements(create_statements()) == expected.compile(
+                create_statements()
+            )
+
+            # dialectが変わったら、つくりなおす
+            ctx.params["dialect"] = "postgre"
+            assert get_sql_compiler().dialect_name == "postgre"
+
+        # 実行ごとに、別のコンパイラをつくる
+        with click.Context(click.Command("convert")) as ctx:
+            ctx.params = dict(context_mock.params)
+            assert get_sql_compiler() is not expected